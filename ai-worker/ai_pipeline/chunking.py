@@ -0,0 +1,129 @@
+"""
+Map-reduce support for request texts longer than a block should see at once
+
+The text is split into overlapping chunks, the block runs on each chunk, and
+the per-chunk results are merged field by field. How a field is merged comes
+from its ``x-reduce`` rule in the block's output_schema, or from its type.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rules a schema property can name in "x-reduce"
+REDUCE_RULES = (
+    "concat", "join", "vote", "first", "max", "min", "sum", "mean", "any", "all", "llm"
+)
+
+# Rule used when a property has no "x-reduce"; free text keeps every chunk's part
+DEFAULT_RULES = {
+    "array": "concat",
+    "string": "join",
+    "number": "max",
+    "integer": "max",
+    "boolean": "any",
+}
+
+# Where a chunk may end, best first
+_BREAKS = ("\n\n", "\n", ". ", " ")
+
+
+def split_text(text: str, chunk_chars: int, overlap_chars: int = 0) -> List[str]:
+    """Split ``text`` into chunks of at most ``chunk_chars``, ending on natural breaks"""
+    if len(text) <= chunk_chars:
+        return [text]
+    overlap_chars = max(0, min(overlap_chars, chunk_chars // 2))
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # Prefer a break in the second half of the chunk so chunks stay reasonably full
+            floor = start + chunk_chars // 2
+            for separator in _BREAKS:
+                position = text.rfind(separator, floor, end)
+                if position != -1:
+                    end = position + len(separator)
+                    break
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def reduce_results(results: List[Dict[str, Any]],
+                   schema: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+    """Merge per-chunk results; returns the merged result and fields left for an LLM reduce"""
+    properties = (schema or {}).get("properties") or {}
+    fields = list(properties) or list(dict.fromkeys(key for result in results for key in result))
+
+    merged: Dict[str, Any] = {}
+    llm_fields = []
+    for field in fields:
+        values = [result[field] for result in results if result.get(field) is not None]
+        if not values:
+            continue
+        rule = _rule_for(properties.get(field) or {}, values)
+        if rule == "llm":
+            llm_fields.append(field)
+            merged[field] = values[0]
+        else:
+            merged[field] = _reduce_values(rule, values)
+    return merged, llm_fields
+
+
+def _rule_for(field_schema: Dict[str, Any], values: List[Any]) -> str:
+    rule = field_schema.get("x-reduce")
+    if rule in REDUCE_RULES:
+        return rule
+    if "enum" in field_schema:
+        # A label chosen per chunk, not text: the most common one wins
+        return "vote"
+    field_type = field_schema.get("type")
+    if field_type is None:
+        sample = values[0]
+        if isinstance(sample, bool):
+            field_type = "boolean"
+        elif isinstance(sample, (int, float)):
+            field_type = "number"
+        elif isinstance(sample, list):
+            field_type = "array"
+        elif isinstance(sample, str):
+            field_type = "string"
+    return DEFAULT_RULES.get(field_type, "first")
+
+
+def _reduce_values(rule: str, values: List[Any]) -> Any:
+    if rule == "concat":
+        merged = []
+        seen = set()
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                # Overlapping chunks report the same items twice
+                key = repr(item)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return merged
+    if rule == "join":
+        return "\n\n".join(str(value) for value in values)
+    if rule == "vote":
+        # Most common value; ties go to the earliest chunk
+        counts = Counter(repr(value) for value in values)
+        best = max(counts.values())
+        return next(value for value in values if counts[repr(value)] == best)
+
+    numbers = [value for value in values if isinstance(value, (int, float))]
+    if rule in ("max", "min", "sum", "mean") and numbers:
+        if rule == "max":
+            return max(numbers)
+        if rule == "min":
+            return min(numbers)
+        if rule == "sum":
+            return sum(numbers)
+        return sum(numbers) / len(numbers)
+    if rule == "any":
+        return any(bool(value) for value in values)
+    if rule == "all":
+        return all(bool(value) for value in values)
+    return values[0]
@@ -0,0 +1,192 @@
+"""
+Adaptive (AIMD) concurrency limiter for Ollama calls
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+import ollama
+import structlog
+from prometheus_client import Counter, Gauge
+
+logger = structlog.get_logger()
+
+CONCURRENCY_LIMIT = Gauge(
+    "taskflow_llm_concurrency_limit", "Current adaptive concurrency limit", ["limiter"]
+)
+IN_FLIGHT = Gauge("taskflow_llm_in_flight", "LLM calls currently in flight", ["limiter"])
+BACKOFFS = Counter(
+    "taskflow_llm_concurrency_backoffs_total",
+    "Times the limiter reduced its limit",
+    ["limiter", "reason"],
+)
+
+# How quickly the per-model tokens/sec baseline forgets an old peak
+TPS_BASELINE_DECAY = 0.99
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """Return True if an error means the Ollama server is overloaded or struggling"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500 or error.status_code == 429
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+class Permit:
+    """A granted slot; the caller may attach the Ollama response for feedback"""
+
+    def __init__(self, saturated: bool):
+        self.started = time.monotonic()
+        self.saturated = saturated
+        self.response: Optional[Dict[str, Any]] = None
+
+    def record(self, response: Any):
+        """Attach the raw Ollama response so its timings can drive the limit"""
+        if isinstance(response, dict):
+            self.response = response
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease limiter.
+
+    The limit grows by roughly one slot per round of successful calls while
+    it is fully used, and is cut by ``backoff_ratio`` on timeouts, 5xx/429
+    responses, server-side queueing, or a collapse in generation throughput.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        backoff_ratio: float = 0.7,
+        queue_delay_threshold: float = 1.0,
+        tps_floor_ratio: float = 0.5,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.queue_delay_threshold = queue_delay_threshold
+        self.tps_floor_ratio = tps_floor_ratio
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_backoff = 0.0
+        self._tps_baseline: Dict[str, float] = {}
+
+        CONCURRENCY_LIMIT.labels(limiter=name).set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        """Current integer concurrency limit"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Wait for a slot and report the outcome of the wrapped call"""
+        while self._in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Woken but cancelled before taking the slot: pass the wake on
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_waiters()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self._in_flight += 1
+        IN_FLIGHT.labels(limiter=self.name).set(self._in_flight)
+        permit = Permit(saturated=self._in_flight >= self.limit)
+
+        try:
+            yield permit
+        except Exception as e:
+            if is_overload_error(e):
+                self._backoff(type(e).__name__, time.monotonic() - permit.started)
+            raise
+        else:
+            self._on_success(permit)
+        finally:
+            self._in_flight -= 1
+            IN_FLIGHT.labels(limiter=self.name).set(self._in_flight)
+            self._wake_waiters()
+
+    def _on_success(self, permit: Permit):
+        latency = time.monotonic() - permit.started
+        response = permit.response
+
+        if response:
+            # Ollama reports how long it actually worked on the request; the
+            # rest of the wall time was spent waiting for a free server slot.
+            server_ns = response.get("total_duration")
+            if server_ns:
+                queue_delay = latency - server_ns / 1e9
+                if queue_delay > self.queue_delay_threshold:
+                    self._backoff("queueing", latency)
+                    return
+
+            eval_count = response.get("eval_count")
+            eval_ns = response.get("eval_duration")
+            if eval_count and eval_ns:
+                tps = eval_count / (eval_ns / 1e9)
+                model = response.get("model", "")
+                baseline = max(tps, self._tps_baseline.get(model, tps) * TPS_BASELINE_DECAY)
+                self._tps_baseline[model] = baseline
+                if tps < baseline * self.tps_floor_ratio:
+                    self._backoff("throughput", latency)
+                    return
+
+        # Only grow while the current limit is actually being used
+        if permit.saturated and self._limit < self.max_limit:
+            previous = self.limit
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            if self.limit != previous:
+                logger.info("LLM concurrency limit increased", limiter=self.name, limit=self.limit)
+                CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+                self._wake_waiters()
+
+    def _backoff(self, reason: str, latency: float):
+        now = time.monotonic()
+        # Back off at most once per round trip so a burst of failures from
+        # the same overload does not collapse the limit to the floor.
+        if now - self._last_backoff < latency:
+            return
+        self._last_backoff = now
+
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        BACKOFFS.labels(limiter=self.name, reason=reason).inc()
+        CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+        logger.warning(
+            "LLM concurrency limit reduced",
+            limiter=self.name,
+            reason=reason,
+            previous_limit=previous,
+            limit=self.limit,
+        )
+
+    def _wake_waiters(self):
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
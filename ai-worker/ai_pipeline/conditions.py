@@ -0,0 +1,134 @@
+"""
+Safe evaluation of block conditions
+
+A condition is a small expression over earlier block outputs, such as
+``classify.sensitive == true and len(extract.entities) > 0``. Blocks are named
+the way they are stored in the workflow context (lowercase, spaces as
+underscores). Expressions are parsed with Python's ast module, and only
+literals, field access, comparisons, boolean logic and a few functions are
+allowed, so a workflow definition cannot run arbitrary code.
+
+Missing blocks and fields evaluate to null, and comparisons that cannot be
+made (e.g. null > 3) are false, so a condition on an absent value is simply
+not met.
+"""
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+# Literal names, in both JSON and Python spelling
+_LITERALS = {
+    'true': True, 'false': False, 'null': None,
+    'True': True, 'False': False, 'None': None,
+}
+
+_FUNCTIONS: Dict[str, Callable[[Any], Any]] = {
+    'len': len,
+    'lower': lambda value: str(value).lower(),
+    'upper': lambda value: str(value).upper(),
+}
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.Name, ast.Load, ast.Attribute, ast.Subscript, ast.Constant,
+    ast.List, ast.Tuple, ast.Call,
+) + tuple(_COMPARISONS)
+
+
+class ConditionError(ValueError):
+    """A condition that is not a valid expression"""
+
+
+@lru_cache(maxsize=256)
+def compile_condition(expression: str) -> ast.Expression:
+    """Parse and check ``expression`` once; workflows evaluate the same conditions for every task"""
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ConditionError(f"Invalid condition '{expression}': {e.msg}") from e
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ConditionError(f"'{type(node).__name__}' is not allowed in condition '{expression}'")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords:
+                raise ConditionError(f"Only {', '.join(_FUNCTIONS)} may be called in condition '{expression}'")
+        if isinstance(node, ast.Subscript) and not isinstance(node.slice, ast.Constant):
+            raise ConditionError(f"Only literal indexes are allowed in condition '{expression}'")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (str, int, float, bool, type(None))):
+            raise ConditionError(f"Unsupported literal in condition '{expression}'")
+    return tree
+
+
+def evaluate_condition(expression: str, context: Dict[str, Any]) -> bool:
+    """Whether ``expression`` holds for the block outputs in ``context``"""
+    return bool(_evaluate(compile_condition(expression).body, context))
+
+
+def _evaluate(node: ast.AST, context: Dict[str, Any]) -> Any:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in _LITERALS:
+            return _LITERALS[node.id]
+        if node.id in context:
+            return context[node.id]
+        return context.get(node.id.lower())
+    if isinstance(node, ast.Attribute):
+        value = _evaluate(node.value, context)
+        return value.get(node.attr) if isinstance(value, dict) else None
+    if isinstance(node, ast.Subscript):
+        value = _evaluate(node.value, context)
+        index = node.slice.value
+        if isinstance(value, dict):
+            return value.get(index)
+        if isinstance(value, (list, str)) and isinstance(index, int) and -len(value) <= index < len(value):
+            return value[index]
+        return None
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_evaluate(element, context) for element in node.elts]
+    if isinstance(node, ast.BoolOp):
+        is_and = isinstance(node.op, ast.And)
+        value = None
+        for operand in node.values:
+            value = _evaluate(operand, context)
+            if bool(value) != is_and:
+                break
+        return value
+    if isinstance(node, ast.UnaryOp):
+        value = _evaluate(node.operand, context)
+        if isinstance(node.op, ast.Not):
+            return not value
+        return -value if isinstance(value, (int, float)) else None
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, context)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, context)
+            try:
+                if not _COMPARISONS[type(op)](left, right):
+                    return False
+            except TypeError:
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.Call):
+        args = [_evaluate(arg, context) for arg in node.args]
+        if any(arg is None for arg in args):
+            return None
+        try:
+            return _FUNCTIONS[node.func.id](*args)
+        except TypeError:
+            return None
+    raise ConditionError(f"Unsupported expression '{type(node).__name__}'")
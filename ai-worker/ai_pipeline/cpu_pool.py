@@ -0,0 +1,77 @@
+"""
+Bounded pool for CPU-heavy work that would otherwise stall the event loop
+
+Parsing a long reasoning trace or serializing a large result inline blocks
+every other job's progress events, heartbeats and HTTP calls for as long as it
+runs. ``run_cpu`` hands such work to a small thread pool. json and re still
+hold the GIL while they run, but the interpreter switches threads every few
+milliseconds, so the loop keeps running instead of waiting for the whole step.
+Small inputs stay inline, where a thread hop would cost more than it saves.
+
+``monitor_loop_lag`` measures how late the loop wakes up from a short sleep
+and exports it, which shows whether anything still blocks the loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+from config import settings
+
+logger = structlog.get_logger()
+
+LOOP_LAG = Histogram(
+    "taskflow_event_loop_lag_seconds",
+    "How late the event loop woke up from a timed sleep",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+CPU_TASKS = Counter(
+    "taskflow_cpu_offloaded_total",
+    "CPU-heavy steps run in the worker's CPU pool, by step",
+    ["step"],
+)
+
+# Loop lag above this is logged
+LAG_WARNING_SECONDS = 0.5
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, settings.cpu_pool_size),
+                                       thread_name_prefix="cpu-pool")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., Any], *args: Any, size: int = None, **kwargs: Any) -> Any:
+    """Run ``func`` in the CPU pool, or inline when ``size`` (input length) is below threshold"""
+    if size is not None and size < settings.cpu_offload_min_chars:
+        return func(*args, **kwargs)
+    CPU_TASKS.labels(step=getattr(func, "__name__", "call")).inc()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Record event loop lag until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        LOOP_LAG.observe(lag)
+        if lag > LAG_WARNING_SECONDS:
+            logger.warning("Event loop lag", lag_seconds=round(lag, 3))
+
+
+def shutdown():
+    """Stop the pool's threads (at service shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
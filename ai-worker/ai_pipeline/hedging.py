@@ -0,0 +1,36 @@
+"""
+Request hedging support: rolling per-model latency percentiles
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from prometheus_client import Counter
+
+HEDGED_CALLS = Counter(
+    "taskflow_llm_hedged_calls_total",
+    "LLM calls that were duplicated to another host, by which copy won",
+    ["winner"],
+)
+
+
+class LatencyTracker:
+    """Keeps the last ``window`` latencies per model (cancelled calls add a lower bound)"""
+
+    def __init__(self, window: int = 200, percentile: float = 0.95, min_samples: int = 20):
+        self.window = window
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, latency: float):
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(latency)
+
+    def threshold(self, model: str) -> Optional[float]:
+        """Latency past which a call counts as a straggler, or None until enough samples exist"""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return ordered[index]
@@ -0,0 +1,193 @@
+"""
+Shared Ollama client for the AI worker.
+
+Every LLM and embedding call made by the worker goes through ``llm_client``
+so that cross-cutting policies such as concurrency limiting, model-affinity
+scheduling and keep_alive pinning live in one place.
+"""
+import asyncio
+import contextlib
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import ollama
+import structlog
+
+from config import settings
+from ai_pipeline.circuit_breaker import ollama_breaker
+from ai_pipeline.concurrency import AdaptiveConcurrencyLimiter
+from ai_pipeline.hedging import HEDGED_CALLS, LatencyTracker
+from ai_pipeline.model_affinity import ModelAffinityScheduler
+
+logger = structlog.get_logger()
+
+
+def _parse_keep_alive(value: str) -> Union[int, str]:
+    """Ollama accepts durations ("30m") or seconds (-1 keeps a model loaded forever)"""
+    value = value.strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def _parse_hosts(primary: str, extra: str) -> List[str]:
+    hosts = [primary]
+    for host in extra.split(','):
+        host = host.strip()
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+def _new_limiter(name: str) -> AdaptiveConcurrencyLimiter:
+    return AdaptiveConcurrencyLimiter(
+        name=name,
+        initial_limit=settings.llm_initial_concurrency,
+        min_limit=settings.llm_min_concurrency,
+        max_limit=settings.llm_max_concurrency,
+        queue_delay_threshold=settings.llm_queue_delay_threshold_seconds,
+        tps_floor_ratio=settings.llm_tokens_per_second_floor_ratio,
+    )
+
+
+class LLMClient:
+    """Ollama client wrapper that applies the adaptive concurrency limiter"""
+
+    def __init__(self, host: str = None):
+        self.hosts = _parse_hosts(host or settings.ollama_host, settings.ollama_hosts)
+        self.host = self.hosts[0]
+        self._clients = {h: ollama.AsyncClient(host=h) for h in self.hosts}
+        self._client = self._clients[self.host]
+        # Each host gets its own limiter; the primary keeps the plain "ollama" name
+        self.limiter = _new_limiter("ollama")
+        self._limiters = {self.host: self.limiter}
+        for h in self.hosts[1:]:
+            self._limiters[h] = _new_limiter(f"ollama@{h}")
+        self.scheduler = ModelAffinityScheduler(
+            max_resident_models=settings.max_resident_models,
+            fairness_window=settings.model_affinity_window_seconds,
+        )
+        self.keep_alive = _parse_keep_alive(settings.model_keep_alive)
+
+        self.hedging_enabled = settings.llm_hedging_enabled and len(self.hosts) > 1
+        self.latency = LatencyTracker(
+            percentile=settings.llm_hedge_percentile,
+            min_samples=settings.llm_hedge_min_samples,
+        )
+        self._next_hedge_host = 0
+
+    async def chat(self, validate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                   **kwargs) -> Dict[str, Any]:
+        """Run a chat completion once its model is resident and a slot is available
+
+        With hedging enabled, a call that outlives the model's learned latency
+        percentile is duplicated to another host. The first response accepted
+        by ``validate`` wins and the other call is cancelled.
+        """
+        kwargs.setdefault('keep_alive', self.keep_alive)
+        async with self.scheduler.acquire(kwargs.get('model')):
+            if not self.hedging_enabled:
+                return await self._chat_on(self.host, kwargs)
+            return await self._hedged_chat(kwargs, validate)
+
+    async def embeddings(self, **kwargs) -> Dict[str, Any]:
+        """Generate an embedding once a concurrency slot is available
+
+        Embedding models are small enough to stay loaded next to a chat model,
+        so they bypass the model-affinity scheduler.
+        """
+        kwargs.setdefault('keep_alive', self.keep_alive)
+        async with ollama_breaker.guard(), self.limiter.acquire():
+            return await self._client.embeddings(**kwargs)
+
+    async def generate(self, **kwargs) -> Dict[str, Any]:
+        """Run a raw generate call (also used with an empty prompt to load a model)"""
+        kwargs.setdefault('keep_alive', self.keep_alive)
+        async with self.scheduler.acquire(kwargs.get('model')):
+            async with ollama_breaker.guard(), self.limiter.acquire() as permit:
+                response = await self._client.generate(**kwargs)
+                permit.record(response)
+        return response
+
+    async def list(self) -> Dict[str, Any]:
+        """List models available on the server (metadata call, not limited)"""
+        return await self._client.list()
+
+    async def _chat_on(self, host: str, kwargs: Dict[str, Any], track_latency: bool = True) -> Dict[str, Any]:
+        started = time.monotonic()
+        # Only the primary host is tracked by the shared "ollama" circuit
+        breaker = ollama_breaker.guard() if host == self.host else contextlib.nullcontext()
+        try:
+            async with breaker, self._limiters[host].acquire() as permit:
+                response = await self._clients[host].chat(**kwargs)
+                permit.record(response)
+        except asyncio.CancelledError:
+            # A straggler cut off by its hedge took at least this long; leaving it out
+            # would keep only the fast calls and pull the hedge threshold down
+            if track_latency:
+                self.latency.record(kwargs.get('model', ''), time.monotonic() - started)
+            raise
+        if track_latency:
+            self.latency.record(kwargs.get('model', ''), time.monotonic() - started)
+        return response
+
+    async def _hedged_chat(self, kwargs: Dict[str, Any],
+                           validate: Optional[Callable[[Dict[str, Any]], bool]]) -> Dict[str, Any]:
+        model = kwargs.get('model', '')
+        threshold = self.latency.threshold(model)
+        if threshold is None:
+            # Not enough history yet to tell a straggler from a normal call
+            return await self._chat_on(self.host, kwargs)
+
+        delay = max(threshold, settings.llm_hedge_min_delay_seconds)
+        primary = asyncio.create_task(self._chat_on(self.host, kwargs))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        hedge_host = self._pick_hedge_host()
+        logger.info("Hedging slow LLM call",
+                    model=model, delay=round(delay, 2), hedge_host=hedge_host)
+        # Only primary calls are sampled: a hedge starts late and would add a short latency
+        # for every slow call
+        hedge = asyncio.create_task(self._chat_on(hedge_host, kwargs, track_latency=False))
+        labels = {primary: "primary", hedge: "hedge"}
+
+        pending = {primary, hedge}
+        fallback = None
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    response = task.result()
+                    if validate is None or validate(response):
+                        HEDGED_CALLS.labels(winner=labels[task]).inc()
+                        return response
+                    fallback = fallback or response
+        finally:
+            # Cancelling closes the connection, which makes Ollama stop generating
+            for task in pending:
+                task.cancel()
+
+        HEDGED_CALLS.labels(winner="none").inc()
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def _pick_hedge_host(self) -> str:
+        secondaries = self.hosts[1:]
+        host = secondaries[self._next_hedge_host % len(secondaries)]
+        self._next_hedge_host += 1
+        return host
+
+
+# Global LLM client instance
+llm_client = LLMClient()
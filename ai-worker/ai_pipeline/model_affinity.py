@@ -0,0 +1,181 @@
+"""
+Model-affinity scheduling for Ollama calls
+
+When blocks from concurrent jobs need different models, admitting them in
+arrival order makes Ollama unload and reload weights on every switch. The
+scheduler keeps serving the resident model(s) and only switches once the
+resident model has drained, or has held the GPU past a fairness window while
+another model is waiting.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter, Gauge
+
+logger = structlog.get_logger()
+
+MODEL_ACTIVATIONS = Counter(
+    "taskflow_llm_model_activations_total", "Times a model became resident", ["model"]
+)
+MODELS_WAITING = Gauge(
+    "taskflow_llm_model_waiting_calls",
+    "Calls waiting for their model to become resident",
+    ["model"],
+)
+
+
+class ModelAffinityScheduler:
+    """Admits LLM calls grouped by model, with at most ``max_resident_models`` in use"""
+
+    def __init__(self, max_resident_models: int = 1, fairness_window: float = 30.0):
+        self.max_resident_models = max_resident_models
+        self.fairness_window = fairness_window
+
+        # Resident model -> time it became resident
+        self._resident: Dict[str, float] = {}
+        self._active: Dict[str, int] = {}
+        # Model -> queue of (enqueued_at, future) for calls not yet admitted
+        self._waiters: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_resident_models > 0
+
+    @property
+    def resident_models(self) -> List[str]:
+        return list(self._resident)
+
+    @asynccontextmanager
+    async def acquire(self, model: Optional[str]):
+        """Wait until ``model`` may run, then hold it resident for the wrapped call"""
+        if not self.enabled or not model:
+            yield
+            return
+
+        if not self._try_admit(model):
+            waiter = asyncio.get_running_loop().create_future()
+            queue = self._waiters.setdefault(model, deque())
+            queue.append((time.monotonic(), waiter))
+            MODELS_WAITING.labels(model=model).set(len(queue))
+            try:
+                # Resolved once the model is resident; the slot is already counted for us
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(model)
+                else:
+                    self._remove_waiter(model, waiter)
+                raise
+
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    def _try_admit(self, model: str) -> bool:
+        now = time.monotonic()
+        if model in self._resident:
+            if self._must_yield(model, now):
+                return False
+            self._active[model] += 1
+            return True
+
+        # Queue behind earlier callers for the same model
+        if self._waiters.get(model):
+            return False
+
+        if len(self._resident) >= self.max_resident_models:
+            idle = self._idle_resident_model()
+            if idle is None:
+                return False
+            self._evict(idle)
+
+        self._make_resident(model, now)
+        self._active[model] += 1
+        return True
+
+    def _release(self, model: str):
+        self._active[model] -= 1
+        if self._active[model] == 0:
+            self._on_drained(model)
+
+    def _must_yield(self, model: str, now: float) -> bool:
+        """A resident model stops taking new calls once its window is up and others wait"""
+        return now - self._resident[model] >= self.fairness_window and self._others_waiting()
+
+    def _on_drained(self, model: str):
+        if not self._others_waiting() or (
+            self._waiters.get(model) and not self._must_yield(model, time.monotonic())
+        ):
+            # Keep the model resident and run whatever is queued for it; if every queued
+            # call was cancelled meanwhile, an idle model must not hold back other models
+            if self._wake(model) or not self._others_waiting():
+                return
+
+        self._evict(model)
+        self._promote_waiting_models()
+
+    def _others_waiting(self) -> bool:
+        return any(queue for model, queue in self._waiters.items() if model not in self._resident)
+
+    def _idle_resident_model(self) -> Optional[str]:
+        for model in self._resident:
+            if not self._active[model] and not self._waiters.get(model):
+                return model
+        return None
+
+    def _promote_waiting_models(self):
+        while len(self._resident) < self.max_resident_models:
+            candidates = [
+                (queue[0][0], model)
+                for model, queue in self._waiters.items()
+                if queue and model not in self._resident
+            ]
+            if not candidates:
+                return
+            _, model = min(candidates)
+            self._make_resident(model, time.monotonic())
+            if not self._wake(model):
+                # Every caller gave up while queued; nothing would ever release the model
+                self._evict(model)
+
+    def _make_resident(self, model: str, now: float):
+        MODEL_ACTIVATIONS.labels(model=model).inc()
+        self._resident[model] = now
+        self._active[model] = 0
+        logger.debug("Model resident", model=model, resident=self.resident_models)
+
+    def _evict(self, model: str):
+        del self._resident[model]
+        del self._active[model]
+
+    def _wake(self, model: str) -> int:
+        """Admit every queued call for a resident model in one go; returns how many were admitted"""
+        queue = self._waiters.pop(model, None)
+        if not queue:
+            return 0
+        MODELS_WAITING.labels(model=model).set(0)
+        admitted = 0
+        for _, waiter in queue:
+            # Callers cancelled while queued have a done future and are skipped
+            if not waiter.done():
+                self._active[model] += 1
+                waiter.set_result(None)
+                admitted += 1
+        return admitted
+
+    def _remove_waiter(self, model: str, waiter: asyncio.Future):
+        queue = self._waiters.get(model)
+        if not queue:
+            return
+        for entry in queue:
+            if entry[1] is waiter:
+                queue.remove(entry)
+                break
+        MODELS_WAITING.labels(model=model).set(len(queue))
+        if not queue:
+            del self._waiters[model]
@@ -0,0 +1,120 @@
+"""
+Model residency manager: cached model registry, preloading and keep_alive pinning
+"""
+import asyncio
+import time
+from typing import Awaitable, Iterable, List, Optional, Set
+
+import structlog
+
+from config import settings
+from ai_pipeline.circuit_breaker import backend_client
+from ai_pipeline.llm_client import llm_client
+
+logger = structlog.get_logger()
+
+
+class ModelRegistry:
+    """TTL-cached view of the models available on the Ollama server"""
+
+    def __init__(self, ttl_seconds: float = None):
+        if ttl_seconds is None:
+            ttl_seconds = settings.model_registry_ttl_seconds
+        self.ttl_seconds = ttl_seconds
+        self._models: Optional[List[str]] = None
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    async def list_models(self, force_refresh: bool = False) -> List[str]:
+        """Return available model names, refreshing the cache once per TTL"""
+        if not force_refresh and self._is_fresh():
+            return self._models
+
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not force_refresh and self._is_fresh():
+                return self._models
+
+            response = await llm_client.list()
+            self._models = [model['name'] for model in response.get('models', [])]
+            self._fetched_at = time.monotonic()
+            logger.debug("Refreshed Ollama model registry", models=self._models)
+            return self._models
+
+    async def has_model(self, model_name: str) -> bool:
+        """Check whether a model is available, tolerating a missing ':latest' tag"""
+        models = await self.list_models()
+        if model_name in models:
+            return True
+        return ':' not in model_name and f"{model_name}:latest" in models
+
+    def invalidate(self):
+        """Drop the cached model list so the next lookup hits the server"""
+        self._fetched_at = 0.0
+
+    def schedule_preload(self, model_names: Iterable[str]):
+        """Preload models in the background without blocking the caller"""
+        self._spawn(self.preload(list(model_names)))
+
+    def schedule_preload_active_workflow_models(self):
+        """Preload the models of active workflows in the background"""
+        self._spawn(self.preload_active_workflow_models())
+
+    def _spawn(self, coro: Awaitable[None]):
+        task = asyncio.ensure_future(coro)
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def preload(self, model_names: Iterable[str]):
+        """Load models into memory and pin them with keep_alive"""
+        for model_name in sorted(set(name for name in model_names if name)):
+            try:
+                if not await self.has_model(model_name):
+                    logger.warning("Skipping preload of unknown model", model=model_name)
+                    continue
+                # An empty prompt makes Ollama load the model without generating
+                await llm_client.generate(model=model_name, prompt="")
+                logger.info("Preloaded model",
+                            model=model_name,
+                            keep_alive=settings.model_keep_alive)
+            except Exception as e:
+                logger.warning("Failed to preload model", model=model_name, error=str(e))
+
+    async def preload_active_workflow_models(self):
+        """Preload every model referenced by an active workflow"""
+        try:
+            model_names = await self._get_active_workflow_models()
+        except Exception as e:
+            logger.warning("Could not fetch active workflows for model preload", error=str(e))
+            return
+
+        logger.info("Preloading models for active workflows", models=sorted(model_names))
+        await self.preload(model_names)
+
+    async def _get_active_workflow_models(self) -> Set[str]:
+        model_names: Set[str] = set()
+        page = 1
+        async with backend_client(timeout=30.0) as client:
+            while True:
+                response = await client.get(
+                    f"{settings.backend_api_url}/api/workflows",
+                    params={"status": "ACTIVE", "page": page, "page_size": 100}
+                )
+                response.raise_for_status()
+                data = response.json()
+                for workflow in data.get('workflows', []):
+                    for block in workflow.get('blocks', []):
+                        model_names.add(block.get('model_name') or settings.model_name)
+                if page >= data.get('total_pages', 1):
+                    break
+                page += 1
+        return model_names
+
+    def _is_fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl_seconds
+
+
+# Global model registry instance
+model_registry = ModelRegistry()
@@ -0,0 +1,94 @@
+"""
+Multi-record packing: several short requests answered by one LLM call
+
+Requests for the same packable block that arrive within a short window are
+grouped, handed to a runner as one list, and each caller gets back its own
+result. A result of None tells the caller to process its request on its own.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+import structlog
+from prometheus_client import Counter
+
+from config import settings
+
+logger = structlog.get_logger()
+
+PACKED_RECORDS = Counter(
+    "taskflow_llm_packed_records_total",
+    "Requests submitted for packing, by whether the packed call answered them",
+    ["outcome"],
+)
+
+PackRunner = Callable[[List[Any]], Awaitable[List[Optional[Any]]]]
+
+
+class _Pack:
+    def __init__(self, run: PackRunner):
+        self.run = run
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class RecordPacker:
+    """Groups concurrent submissions per key into packs of up to ``pack_size`` items"""
+
+    def __init__(self, window: float = 0.25):
+        self.window = window
+        self._open: Dict[Hashable, _Pack] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, pack_size: int, item: Any,
+                     run: PackRunner) -> Optional[Any]:
+        """Add ``item`` to the open pack for ``key`` and wait for its result"""
+        loop = asyncio.get_running_loop()
+        pack = self._open.get(key)
+        if pack is None:
+            pack = _Pack(run)
+            pack.timer = loop.call_later(self.window, self._flush, key, pack)
+            self._open[key] = pack
+
+        future = loop.create_future()
+        pack.items.append(item)
+        pack.futures.append(future)
+        if len(pack.items) >= pack_size:
+            self._flush(key, pack)
+        return await future
+
+    def _flush(self, key: Hashable, pack: _Pack):
+        if self._open.get(key) is pack:
+            del self._open[key]
+        if pack.timer:
+            pack.timer.cancel()
+
+        if len(pack.items) == 1:
+            # Nobody else showed up; a pack of one is just a slower single call
+            PACKED_RECORDS.labels(outcome="alone").inc()
+            if not pack.futures[0].done():
+                pack.futures[0].set_result(None)
+            return
+        task = asyncio.create_task(self._run(pack))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pack: _Pack):
+        logger.info("Running packed call", records=len(pack.items))
+        try:
+            results = await pack.run(pack.items)
+        except Exception as e:
+            for future in pack.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # A short answer leaves the missing records to fall back to single calls
+        results = list(results) + [None] * (len(pack.futures) - len(results))
+        for future, result in zip(pack.futures, results):
+            PACKED_RECORDS.labels(outcome="packed" if result is not None else "fallback").inc()
+            if not future.done():
+                future.set_result(result)
+
+
+record_packer = RecordPacker(window=settings.pack_window_seconds)
@@ -0,0 +1,229 @@
+"""
+Compiled validators for block output schemas
+
+A block's output_schema is turned once into a tree of small check functions,
+cached by the schema's content, so validating a result is a walk over the
+result alone. The supported JSON Schema subset is what block schemas use: type,
+enum, const, properties, required, additionalProperties, items, anyOf, and the
+length, size, range and pattern bounds. Other keywords (description, x-reduce,
+...) are ignored.
+
+Errors come back as readable strings with a path, e.g.
+``$.entities[0].name: expected string, got integer``, short enough to send
+back to the model in a repair prompt.
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter
+
+# Stop collecting after this many errors; a repair prompt needs a few, not all
+MAX_ERRORS = 20
+
+_CACHE_SIZE = 256
+
+SCHEMA_REPAIRS = Counter(
+    "taskflow_llm_schema_repairs_total",
+    "Repair calls for block output that did not match its schema, by outcome",
+    ["outcome"],
+)
+
+Check = Callable[[Any, str, List[str]], None]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+class SchemaValidator:
+    """A compiled output schema; ``validate(value)`` returns the list of errors"""
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self._check = _compile(schema)
+
+    def validate(self, value: Any) -> List[str]:
+        errors: List[str] = []
+        self._check(value, "$", errors)
+        return errors[:MAX_ERRORS]
+
+
+_validators: Dict[str, SchemaValidator] = {}
+
+
+def get_validator(schema: Dict[str, Any]) -> SchemaValidator:
+    """Compiled validator for ``schema``, shared by every block with the same schema"""
+    key = json.dumps(schema, sort_keys=True, default=str)
+    validator = _validators.get(key)
+    if validator is None:
+        if len(_validators) >= _CACHE_SIZE:
+            _validators.clear()
+        validator = _validators[key] = SchemaValidator(schema)
+    return validator
+
+
+def _type_name(value: Any) -> str:
+    for name in ("null", "boolean", "integer", "number", "string", "array", "object"):
+        if _TYPE_CHECKS[name](value):
+            return name
+    return type(value).__name__
+
+
+def _compile(schema: Any) -> Check:
+    if not isinstance(schema, dict):
+        return lambda value, path, errors: None
+
+    checks: List[Check] = []
+
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    if types:
+        known = [_TYPE_CHECKS[name] for name in types if name in _TYPE_CHECKS]
+
+        def check_type(value, path, errors, known=known, types=types):
+            if known and not any(is_type(value) for is_type in known):
+                errors.append(f"{path}: expected {' or '.join(types)}, got {_type_name(value)}")
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                shown = json.dumps(value, default=str)
+                errors.append(f"{path}: {shown} is not one of {json.dumps(allowed)}")
+        checks.append(check_enum)
+
+    if "const" in schema:
+        expected = schema["const"]
+
+        def check_const(value, path, errors):
+            if value != expected:
+                errors.append(f"{path}: must be {json.dumps(expected)}")
+        checks.append(check_const)
+
+    checks.extend(_compile_object(schema))
+    checks.extend(_compile_array(schema))
+    checks.extend(_compile_bounds(schema))
+
+    if isinstance(schema.get("anyOf"), list):
+        options = [_compile(option) for option in schema["anyOf"]]
+
+        def check_any_of(value, path, errors):
+            for option in options:
+                option_errors: List[str] = []
+                option(value, path, option_errors)
+                if not option_errors:
+                    return
+            errors.append(f"{path}: does not match any of the allowed shapes")
+        checks.append(check_any_of)
+
+    def check(value, path, errors):
+        for single_check in checks:
+            if len(errors) >= MAX_ERRORS:
+                return
+            single_check(value, path, errors)
+    return check
+
+
+def _compile_object(schema: Dict[str, Any]) -> List[Check]:
+    checks: List[Check] = []
+    properties = {name: _compile(sub) for name, sub in (schema.get("properties") or {}).items()}
+    required = [name for name in schema.get("required") or [] if isinstance(name, str)]
+    additional = schema.get("additionalProperties", True)
+    additional_check = _compile(additional) if isinstance(additional, dict) else None
+
+    if not (properties or required or additional is not True):
+        return checks
+
+    def check_object(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name in required:
+            if name not in value:
+                errors.append(f"{path}: missing required field '{name}'")
+        for name, item in value.items():
+            if name == "_metadata":
+                continue
+            if name in properties:
+                properties[name](item, f"{path}.{name}", errors)
+            elif additional is False:
+                errors.append(f"{path}: unexpected field '{name}'")
+            elif additional_check is not None:
+                additional_check(item, f"{path}.{name}", errors)
+    checks.append(check_object)
+    return checks
+
+
+def _compile_array(schema: Dict[str, Any]) -> List[Check]:
+    checks: List[Check] = []
+    items = schema.get("items")
+    item_check = _compile(items) if isinstance(items, dict) else None
+    min_items = schema.get("minItems")
+    max_items = schema.get("maxItems")
+
+    if item_check is None and min_items is None and max_items is None:
+        return checks
+
+    def check_array(value, path, errors):
+        if not isinstance(value, list):
+            return
+        if min_items is not None and len(value) < min_items:
+            errors.append(f"{path}: needs at least {min_items} items, has {len(value)}")
+        if max_items is not None and len(value) > max_items:
+            errors.append(f"{path}: allows at most {max_items} items, has {len(value)}")
+        if item_check is not None:
+            for index, item in enumerate(value):
+                if len(errors) >= MAX_ERRORS:
+                    return
+                item_check(item, f"{path}[{index}]", errors)
+    checks.append(check_array)
+    return checks
+
+
+def _compile_bounds(schema: Dict[str, Any]) -> List[Check]:
+    checks: List[Check] = []
+    min_length = schema.get("minLength")
+    max_length = schema.get("maxLength")
+    pattern: Optional[re.Pattern] = None
+    if isinstance(schema.get("pattern"), str):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+
+    if min_length is not None or max_length is not None or pattern is not None:
+        def check_string(value, path, errors):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                errors.append(f"{path}: shorter than {min_length} characters")
+            if max_length is not None and len(value) > max_length:
+                errors.append(f"{path}: longer than {max_length} characters")
+            if pattern is not None and not pattern.search(value):
+                errors.append(f"{path}: does not match pattern {pattern.pattern}")
+        checks.append(check_string)
+
+    limits = [(keyword, schema[keyword]) for keyword in
+              ("minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum")
+              if isinstance(schema.get(keyword), (int, float))]
+    if limits:
+        def check_number(value, path, errors):
+            if not _TYPE_CHECKS["number"](value):
+                return
+            for keyword, limit in limits:
+                if ((keyword == "minimum" and value < limit)
+                        or (keyword == "maximum" and value > limit)
+                        or (keyword == "exclusiveMinimum" and value <= limit)
+                        or (keyword == "exclusiveMaximum" and value >= limit)):
+                    errors.append(f"{path}: {value} violates {keyword} {limit}")
+        checks.append(check_number)
+    return checks
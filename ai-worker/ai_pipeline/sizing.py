@@ -0,0 +1,50 @@
+"""
+Per-call sizing of Ollama's context window (num_ctx) and output budget (num_predict)
+
+A prompt that does not fit the model's default context is given the next
+power-of-two context bucket; num_ctx is never set below the default, because
+Ollama reloads a model when num_ctx changes, and the buckets keep the number of
+distinct sizes small. The output ceiling comes from the size of the block's
+output schema and is meant to stop runaway generations, not to trim answers.
+"""
+import math
+from typing import Any, Dict, Optional
+
+# Conservative: most English text is closer to 4 characters per token
+CHARS_PER_TOKEN = 3.0
+
+# Room for the chat template and special tokens
+TEMPLATE_OVERHEAD_TOKENS = 64
+
+# Generous output tokens per schema property, by type: a long summary or list must still fit
+PROPERTY_OUTPUT_TOKENS = {
+    "string": 1024,
+    "array": 1024,
+    "object": 1024,
+    "number": 16,
+    "integer": 16,
+    "boolean": 16,
+}
+UNKNOWN_PROPERTY_OUTPUT_TOKENS = 1024
+JSON_OVERHEAD_TOKENS = 64
+
+
+def estimate_tokens(chars: int) -> int:
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+def estimate_output_tokens(schema: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Output ceiling for a response matching ``schema`` (None when there is nothing to go on)"""
+    if not schema or schema.get('type') != 'object' or not schema.get('properties'):
+        return None
+    tokens = JSON_OVERHEAD_TOKENS
+    for field_schema in schema['properties'].values():
+        field_type = field_schema.get('type') if isinstance(field_schema, dict) else None
+        tokens += PROPERTY_OUTPUT_TOKENS.get(field_type, UNKNOWN_PROPERTY_OUTPUT_TOKENS)
+    return tokens
+
+
+def context_bucket(tokens: int, minimum: int, maximum: int) -> int:
+    """Smallest power of two that holds ``tokens``, kept within [minimum, maximum]"""
+    bucket = 1 << max(0, tokens - 1).bit_length()
+    return max(minimum, min(bucket, maximum))
@@ -1,28 +1,58 @@
 import json
 import asyncio
 from typing import Dict, Any, List, Optional
-import ollama
 import structlog
-import httpx
 import shlex
 from config import settings
+from ai_pipeline.chunking import reduce_results, split_text
+from ai_pipeline.circuit_breaker import CircuitOpenError, backend_client
+from ai_pipeline.conditions import evaluate_condition
+from ai_pipeline.cpu_pool import run_cpu
+from ai_pipeline.llm_client import llm_client
+from ai_pipeline.model_registry import model_registry
+from ai_pipeline.packing import record_packer
+from ai_pipeline.schema_validation import SCHEMA_REPAIRS, get_validator
+from ai_pipeline.sizing import TEMPLATE_OVERHEAD_TOKENS, context_bucket, estimate_output_tokens, estimate_tokens
+from ai_pipeline.templates import compile_template
 
 logger = structlog.get_logger()
 
+# Prompt layouts: "inline" renders request text where the block prompt references it,
+# "shared_prefix" sends it first, identically for every block, so Ollama can reuse the
+# prompt cache for the document and only prefill each block's instructions
+PROMPT_LAYOUT_INLINE = "inline"
+PROMPT_LAYOUT_SHARED_PREFIX = "shared_prefix"
+
+DOCUMENT_PREFIX = "You will be asked to analyze the document below. Follow the instructions that come after it.\n\n<document>\n"
+DOCUMENT_SUFFIX = "\n</document>"
+DOCUMENT_REFERENCE = "(the document above)"
+
+# How block output is checked against its output_schema (SCHEMA_VALIDATION)
+SCHEMA_VALIDATION_OFF = "off"
+SCHEMA_VALIDATION_REPAIR = "repair"
+SCHEMA_VALIDATION_STRICT = "strict"
+
+# Longest invalid output sent back to the model for repair
+REPAIR_MAX_INPUT_CHARS = 8000
+
+# Blocks of this type run their prompt once per item of an upstream list
+BLOCK_TYPE_MAP = "MAP"
+
 class WorkflowProcessor:
     def __init__(self):
-        self.ollama_client = ollama.AsyncClient(host=settings.ollama_host)
+        self.llm_client = llm_client
         self.default_model = settings.model_name
         self.on_step_complete = None  # Callback for step completion
         self.on_progress = None  # Callback for progress updates
         
-    async def execute_workflow(self, workflow_id: int, request_text: str, request_id: int = None) -> Dict[str, Any]:
+    async def execute_workflow(self, workflow_id: int, request_text: str, request_id: int = None, workflow_data: Dict[str, Any] = None) -> Dict[str, Any]:
         """Execute a workflow by processing its blocks in order"""
         logger.info("Starting workflow execution", workflow_id=workflow_id, request_id=request_id)
         
         try:
-            # Get workflow and blocks from backend
-            workflow_data = await self._get_workflow(workflow_id)
+            # Get workflow and blocks from backend (batches fetch it once and pass it in)
+            if workflow_data is None:
+                workflow_data = await self.get_workflow(workflow_id)
             blocks = sorted(workflow_data['blocks'], key=lambda x: x['order'])
             
             # Get custom instructions if request_id is provided
@@ -46,6 +76,9 @@ class WorkflowProcessor:
             # Create a mapping from block ID to block name for input resolution
             block_id_to_name = {block['id']: block['name'] for block in blocks}
             
+            # Batch execution mode: short requests may share one LLM call
+            pack_size = self._get_pack_size(workflow_data, blocks, custom_instructions_map, request_text)
+            
             # Execute each block in order
             total_blocks = len(blocks)
             for idx, block in enumerate(blocks):
@@ -62,32 +95,58 @@ class WorkflowProcessor:
                     )
                 
                 try:
-                    # Process block inputs to prepare context variables
-                    block_context = await self._prepare_block_context(block, context, block_id_to_name)
+                    # Conditional blocks: skip the LLM call when upstream outputs say it is not needed
+                    condition = (block.get('execution_options') or {}).get('condition')
+                    if condition and not evaluate_condition(condition, context):
+                        logger.info("Skipping block, condition not met",
+                                   block_name=block_name,
+                                   condition=condition)
+                        result = {'status': 'skipped', 'condition': condition}
+                    else:
+                        # Process block inputs to prepare context variables
+                        block_context = await self._prepare_block_context(block, context, block_id_to_name)
                     
-                    # Prepare prompt with context variables
-                    prompt = self._prepare_prompt(block['prompt'], block_context)
+                        # Long-input mode: texts over the chunk size are mapped chunk by chunk
+                        chunks = self._split_long_input(block, request_text)
                     
-                    # Debug: Log the actual prompt being sent
-                    logger.info("Prepared prompt for block", 
-                              block_name=block_name, 
-                              prompt=prompt[:200], 
-                              block_context_keys=list(block_context.keys()),
-                              block_inputs=len(block.get('inputs', [])))
+                        # Shared-prefix layout: the prompt refers to the document sent ahead of it
+                        document = None
+                        if chunks is None and self._uses_shared_prefix(block):
+                            document = request_text
+                            for variable in self._request_text_variables(block):
+                                block_context[variable] = DOCUMENT_REFERENCE
                     
-                    # Get model for this block (use block's model_name or default)
-                    model_name = block.get('model_name') or self.default_model
+                        # Prepare prompt with context variables
+                        prompt = self._prepare_prompt(block['prompt'], block_context)
                     
-                    # Get custom instructions for this block
-                    block_custom_instructions = custom_instructions_map.get(block['id'], "")
-                    logger.info("Processing block with custom instructions",
-                               block_name=block_name,
-                               block_id=block['id'],
-                               has_custom_instructions=bool(block_custom_instructions),
-                               custom_instructions=block_custom_instructions)
+                        # Debug: Log the actual prompt being sent
+                        logger.info("Prepared prompt for block", 
+                                  block_name=block_name, 
+                                  prompt=prompt[:200], 
+                                  block_context_keys=list(block_context.keys()),
+                                  block_inputs=len(block.get('inputs', [])))
+                    
+                        # Get model for this block (use block's model_name or default)
+                        model_name = block.get('model_name') or self.default_model
                     
-                    # Execute the block
-                    result = await self._execute_block(prompt, block_name, model_name, block.get('output_schema'), block_custom_instructions, block.get('model_parameters'), block.get('system_prompt'))
+                        # Get custom instructions for this block
+                        block_custom_instructions = custom_instructions_map.get(block['id'], "")
+                        logger.info("Processing block with custom instructions",
+                                   block_name=block_name,
+                                   block_id=block['id'],
+                                   has_custom_instructions=bool(block_custom_instructions),
+                                   custom_instructions=block_custom_instructions)
+                    
+                        # Execute the block, packed together with other requests when possible
+                        result = None
+                        if block.get('block_type') == BLOCK_TYPE_MAP:
+                            result = await self._execute_map_block(block, block_context, context, block_id_to_name, model_name, block_custom_instructions)
+                        if result is None and pack_size:
+                            result = await self._execute_packed(workflow_id, block, model_name, request_text, pack_size)
+                        if result is None and chunks is not None:
+                            result = await self._execute_chunked_block(block, block_context, chunks, model_name, block_custom_instructions)
+                        if result is None:
+                            result = await self._execute_block(prompt, block_name, model_name, block.get('output_schema'), block_custom_instructions, block.get('model_parameters'), block.get('system_prompt'), document)
                     
                     # Store result in context for future blocks
                     context[block_name.lower().replace(' ', '_')] = result
@@ -111,6 +170,9 @@ class WorkflowProcessor:
                                block_name=block_name,
                                result_keys=list(result.keys()) if isinstance(result, dict) else 'non-dict')
                     
+                except CircuitOpenError:
+                    # A dependency is down: fail the whole job fast so it can be retried later
+                    raise
                 except Exception as e:
                     logger.error("Block execution failed", 
                                 block_name=block_name, 
@@ -133,9 +195,9 @@ class WorkflowProcessor:
                         error=str(e))
             raise
     
-    async def _get_workflow(self, workflow_id: int) -> Dict[str, Any]:
+    async def get_workflow(self, workflow_id: int) -> Dict[str, Any]:
         """Get workflow configuration from backend API"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with backend_client(timeout=30.0) as client:
             response = await client.get(
                 f"{settings.backend_api_url}/api/workflows/{workflow_id}"
             )
@@ -144,31 +206,24 @@ class WorkflowProcessor:
     
     def _prepare_prompt(self, prompt_template: str, context: Dict[str, Any]) -> str:
         """Prepare prompt by substituting variables from context"""
-        try:
-            return prompt_template.format(**context)
-        except KeyError as e:
+        template = compile_template(prompt_template)
+        missing = template.missing(context)
+        if missing:
             logger.warning("Missing context variable in prompt", 
-                          variable=str(e), 
+                          variable=missing[0], 
+                          missing=missing,
                           available_keys=list(context.keys()))
             # Return template as-is if variable substitution fails
             return prompt_template
+        return template.render(context)
     
-    async def _execute_block(self, prompt: str, block_name: str, model_name: str, output_schema: Dict[str, Any] = None, custom_instructions: str = "", model_parameters: Dict[str, Any] = None, system_prompt: str = None) -> Dict[str, Any]:
-        """Execute a single workflow block"""
+    async def _execute_block(self, prompt: str, block_name: str, model_name: str, output_schema: Dict[str, Any] = None, custom_instructions: str = "", model_parameters: Dict[str, Any] = None, system_prompt: str = None, document: str = None) -> Dict[str, Any]:
+        """Execute a single workflow block (``document`` is sent as a shared prompt prefix)"""
         
-        # Debug: Check if model exists in Ollama
+        # Check the model exists using the cached registry (no per-block round trip)
         try:
-            available_models = await self.ollama_client.list()
-            model_names = [model['name'] for model in available_models['models']]
-            logger.info("Available Ollama models", models=model_names, requested_model=model_name)
-            print(f"=== OLLAMA MODEL CHECK FOR {block_name} ===")
-            print(f"Requested model: {model_name}")
-            print(f"Available models: {model_names}")
-            print(f"Model exists: {model_name in model_names}")
-            print(f"=== END MODEL CHECK ===")
-            
-            if model_name not in model_names:
-                logger.warning("Requested model not found in Ollama", requested=model_name, available=model_names)
+            if not await model_registry.has_model(model_name):
+                logger.warning("Requested model not found in Ollama", requested=model_name)
         except Exception as e:
             logger.warning("Could not check available models", error=str(e))
         
@@ -212,8 +267,6 @@ Respond with the raw JSON object only."""
             # Log if user should consider adding reasoning instructions
             if system_prompt and 'reasoning' not in system_prompt.lower():
                 logger.info(f"Harmony model {model_name} detected. Consider adding reasoning instructions to system prompt for better quality.")
-                print(f"\n💡 TIP: For better {model_name} performance, add reasoning instructions to your system prompt.")
-                print(f"   Example: 'Use HIGH reasoning effort. Think step-by-step before responding.'")
             
             # Don't modify the user's system prompt - it's their responsibility
             # Just ensure we have a basic one if none provided
@@ -242,41 +295,25 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
 
 {json_instructions}"""
 
-        # Log the full prompt being sent
-        print(f"=== FULL PROMPT FOR {block_name} ===")
-        if system_prompt:
-            print(f"SYSTEM PROMPT: {system_prompt}")
-        print(f"USER PROMPT: {enhanced_prompt}")
-        print(f"=== END PROMPT FOR {block_name} ===")
+        # Log the full prompt being sent (blocking stdout writes, so only when asked for)
+        if settings.log_llm_payloads:
+            print(f"=== FULL PROMPT FOR {block_name} ===")
+            if document is not None:
+                print(f"SHARED DOCUMENT PREFIX: {len(document)} characters")
+            if system_prompt:
+                print(f"SYSTEM PROMPT: {system_prompt}")
+            print(f"USER PROMPT: {enhanced_prompt}")
+            print(f"=== END PROMPT FOR {block_name} ===")
 
         # Prepare options with default values and override with model_parameters if provided
-        options = {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "stop": ["<|endoftext|>"]
-        }
+        options = self._build_options(model_parameters)
         
-        # Override with model_parameters if provided
-        if model_parameters:
-            # Map common parameter names to Ollama's expected names
-            param_mapping = {
-                'max_tokens': 'num_predict',
-                'context_window': 'num_ctx',
-                'num_ctx': 'num_ctx',
-                'temperature': 'temperature',
-                'top_p': 'top_p',
-                'top_k': 'top_k',
-                'repeat_penalty': 'repeat_penalty',
-                'seed': 'seed'
-            }
-            
-            for key, value in model_parameters.items():
-                if key in param_mapping:
-                    ollama_key = param_mapping[key]
-                    options[ollama_key] = value
-                elif key not in ['stop']:  # Don't override stop tokens
-                    # Pass through any other parameters as-is
-                    options[key] = value
+        # Fit the context window to this prompt and cap the output from the schema
+        prompt_chars = len(enhanced_prompt) + len(system_prompt or "")
+        if document is not None:
+            prompt_chars += len(DOCUMENT_PREFIX) + len(document) + len(DOCUMENT_SUFFIX)
+        # Reasoning models spend output tokens on thinking, so their output is not capped
+        sizing = self._size_options(options, prompt_chars, output_schema, cap_output=not (is_reasoning_model or is_harmony_model))
         
         logger.info(f"Using model parameters for {block_name}: {options}")
 
@@ -288,8 +325,10 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                            attempt=attempt + 1,
                            options=options)
                 
-                # Build messages array with optional system prompt
+                # Build messages array with optional shared document prefix and system prompt
                 messages = []
+                if document is not None:
+                    messages.append({"role": "system", "content": DOCUMENT_PREFIX + document + DOCUMENT_SUFFIX})
                 if system_prompt:
                     messages.append({"role": "system", "content": system_prompt})
                 messages.append({"role": "user", "content": enhanced_prompt})
@@ -303,7 +342,7 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                         "options": options,
                         "stream": False
                     }
-                    print(f"Note: Using Harmony model {model_name} - format flag omitted, JSON enforced via prompts")
+                    logger.debug("Harmony model: format flag omitted, JSON enforced via prompts", model_name=model_name)
                 else:
                     request_data = {
                         "model": model_name,
@@ -314,52 +353,56 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                     }
                 
                 # Log the full request for debugging
-                print(f"\n=== OLLAMA REQUEST FOR {block_name} ===")
-                print(f"Model: {model_name}")
-                print(f"Ollama Host: {settings.ollama_host}")
-                print(f"Model Type: {'Harmony (gpt-oss)' if is_harmony_model else 'Standard'}")
-                print(f"Format: {'none (using prompt-based JSON)' if is_harmony_model else 'json'}")
-                print(f"Options: {options}")
-                print(f"System prompt length: {len(system_prompt) if system_prompt else 0} characters")
-                print(f"User prompt length: {len(enhanced_prompt)} characters")
-                print(f"\nFull JSON Request:")
-                print(json.dumps(request_data, indent=2))
+                if settings.log_llm_payloads:
+                    print(f"\n=== OLLAMA REQUEST FOR {block_name} ===")
+                    print(f"Model: {model_name}")
+                    print(f"Ollama Host: {settings.ollama_host}")
+                    print(f"Model Type: {'Harmony (gpt-oss)' if is_harmony_model else 'Standard'}")
+                    print(f"Format: {'none (using prompt-based JSON)' if is_harmony_model else 'json'}")
+                    print(f"Options: {options}")
+                    print(f"System prompt length: {len(system_prompt) if system_prompt else 0} characters")
+                    print(f"User prompt length: {len(enhanced_prompt)} characters")
+                    print(f"\nFull JSON Request:")
+                    print(json.dumps(request_data, indent=2))
                 
-                # Generate curl command for debugging
-                curl_json = json.dumps(request_data)
-                curl_cmd = f"""\ncurl -X POST {settings.ollama_host}/api/chat \\
-  -H "Content-Type: application/json" \\
-  -d {shlex.quote(curl_json)}"""
+                    # Generate curl command for debugging
+                    curl_json = json.dumps(request_data)
+                    curl_cmd = f"""\ncurl -X POST {settings.ollama_host}/api/chat \\
+      -H "Content-Type: application/json" \\
+      -d {shlex.quote(curl_json)}"""
                 
-                print(f"\nEquivalent curl command (copy and run this to debug):")
-                print(curl_cmd)
-                print(f"\n=== END OLLAMA REQUEST ===")
+                    print(f"\nEquivalent curl command (copy and run this to debug):")
+                    print(curl_cmd)
+                    print(f"\n=== END OLLAMA REQUEST ===")
                 
                 # Use native Ollama API for all models
                 try:
                     if is_harmony_model:
                         # Harmony models don't support format flag
-                        response = await self.ollama_client.chat(
+                        response = await self.llm_client.chat(
                             model=model_name,
                             messages=messages,
-                            options=options
+                            options=options,
+                            validate=self._has_valid_json
                         )
                     else:
                         # Standard models can use format flag
-                        response = await self.ollama_client.chat(
+                        response = await self.llm_client.chat(
                             model=model_name,
                             messages=messages,
                             format='json',
-                            options=options
+                            options=options,
+                            validate=self._has_valid_json
                         )
                 except Exception as api_error:
-                    print(f"\n=== OLLAMA API ERROR ===")
-                    print(f"Error type: {type(api_error).__name__}")
-                    print(f"Error message: {str(api_error)}")
-                    print(f"\nTry running the curl command above to debug the issue directly")
-                    print(f"\nAlso check if the model exists:")
-                    print(f"curl {settings.ollama_host}/api/tags")
-                    print(f"=== END ERROR ===")
+                    if settings.log_llm_payloads:
+                        print(f"\n=== OLLAMA API ERROR ===")
+                        print(f"Error type: {type(api_error).__name__}")
+                        print(f"Error message: {str(api_error)}")
+                        print(f"\nTry running the curl command above to debug the issue directly")
+                        print(f"\nAlso check if the model exists:")
+                        print(f"curl {settings.ollama_host}/api/tags")
+                        print(f"=== END ERROR ===")
                     raise
                 
                 logger.info("Ollama API response received",
@@ -368,19 +411,19 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                            message_keys=list(response.get('message', {}).keys()),
                            eval_count=response.get('eval_count'),
                            prompt_eval_count=response.get('prompt_eval_count'),
-                           total_duration=response.get('total_duration'),
-                           full_response_structure=response)
+                           total_duration=response.get('total_duration'))
                 
                 # Debug: Print the full Ollama response structure
-                print(f"=== FULL OLLAMA RESPONSE STRUCTURE FOR {block_name} ===")
-                print(f"Response type: {type(response)}")
-                print(f"Response keys: {list(response.keys()) if isinstance(response, dict) else 'Not a dict'}")
-                if isinstance(response, dict) and 'message' in response:
-                    print(f"Message keys: {list(response['message'].keys())}")
-                    print(f"Message content type: {type(response['message'].get('content'))}")
-                    print(f"Message content length: {len(str(response['message'].get('content', '')))}")
-                print(f"Full response: {response}")
-                print(f"=== END OLLAMA RESPONSE STRUCTURE ===")
+                if settings.log_llm_payloads:
+                    print(f"=== FULL OLLAMA RESPONSE STRUCTURE FOR {block_name} ===")
+                    print(f"Response type: {type(response)}")
+                    print(f"Response keys: {list(response.keys()) if isinstance(response, dict) else 'Not a dict'}")
+                    if isinstance(response, dict) and 'message' in response:
+                        print(f"Message keys: {list(response['message'].keys())}")
+                        print(f"Message content type: {type(response['message'].get('content'))}")
+                        print(f"Message content length: {len(str(response['message'].get('content', '')))}")
+                    print(f"Full response: {response}")
+                    print(f"=== END OLLAMA RESPONSE STRUCTURE ===")
                 
                 # Additional checks for response validity
                 if not isinstance(response, dict):
@@ -397,28 +440,69 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                 
                 # Log the raw LLM response
                 raw_response = response['message']['content']
-                logger.info("RAW LLM RESPONSE", 
-                           block_name=block_name,
-                           raw_response=raw_response)
-                print(f"=== RAW LLM RESPONSE FOR {block_name} ===")
-                print(raw_response)
-                print(f"=== END LLM RESPONSE FOR {block_name} ===")
+                if settings.log_llm_payloads:
+                    logger.info("RAW LLM RESPONSE", 
+                               block_name=block_name,
+                               raw_response=raw_response)
+                    print(f"=== RAW LLM RESPONSE FOR {block_name} ===")
+                    print(raw_response)
+                    print(f"=== END LLM RESPONSE FOR {block_name} ===")
                 
-                result = self._extract_json_from_response(raw_response)
-                logger.info("PARSED JSON RESULT",
-                           block_name=block_name, 
-                           parsed_result=result)
-                print(f"=== PARSED JSON FOR {block_name} ===")
-                print(json.dumps(result, indent=2))
-                print(f"=== END PARSED JSON FOR {block_name} ===")
+                # Validate against the output schema; invalid output is repaired with a
+                # short follow-up call instead of regenerating the whole block
+                parse_error = None
+                try:
+                    # Long reasoning traces are parsed off the event loop
+                    result = await run_cpu(self._extract_json_from_response, raw_response, size=len(raw_response))
+                    schema_errors = self._validate_output(result, output_schema)
+                except json.JSONDecodeError as e:
+                    parse_error = e
+                    result = None
+                    schema_errors = [f"not valid JSON: {e.msg}"]
+                repair_tokens = 0
+                repaired = False
+                # Output cut off by num_predict cannot be repaired within the same budget
+                if schema_errors and settings.schema_validation != SCHEMA_VALIDATION_OFF and response.get('done_reason') != 'length':
+                    invalid_output = raw_response if result is None else json.dumps(result, indent=2)
+                    repaired_result, schema_errors, repair_tokens = await self._repair_output(
+                        block_name, model_name, output_schema, invalid_output, schema_errors, options, is_harmony_model)
+                    if repaired_result is not None:
+                        result = repaired_result
+                        repaired = not schema_errors
+                if not isinstance(result, dict):
+                    if parse_error is not None:
+                        raise parse_error
+                    # e.g. a JSON null or list, which has no fields to hand to later blocks
+                    raise ValueError(f"Block '{block_name}' returned {type(result).__name__} instead of a JSON object")
+                if schema_errors:
+                    if settings.schema_validation == SCHEMA_VALIDATION_STRICT:
+                        raise Exception(f"Output of block '{block_name}' does not match its schema: {'; '.join(schema_errors[:3])}")
+                    logger.warning("Block output does not match its schema",
+                                   block_name=block_name,
+                                   errors=schema_errors)
+                
+                if settings.log_llm_payloads:
+                    logger.info("PARSED JSON RESULT",
+                               block_name=block_name, 
+                               parsed_result=result)
+                    print(f"=== PARSED JSON FOR {block_name} ===")
+                    print(json.dumps(result, indent=2))
+                    print(f"=== END PARSED JSON FOR {block_name} ===")
                 
                 # Add metadata
                 result['_metadata'] = {
                     'model': model_name,
                     'block_name': block_name,
-                    'tokens_used': response.get('eval_count', 0) + response.get('prompt_eval_count', 0),
+                    'tokens_used': response.get('eval_count', 0) + response.get('prompt_eval_count', 0) + repair_tokens,
                     'duration_ms': response.get('total_duration', 0) // 1000000  # Convert to ms
                 }
+                if document is not None:
+                    result['_metadata']['prompt_layout'] = PROMPT_LAYOUT_SHARED_PREFIX
+                if repaired:
+                    result['_metadata']['repaired'] = True
+                if schema_errors and settings.schema_validation != SCHEMA_VALIDATION_OFF:
+                    result['_metadata']['schema_errors'] = schema_errors
+                result['_metadata'].update(sizing)
                 
                 return result
                 
@@ -432,19 +516,24 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                             raw_response_full=raw_response,
                             raw_response_preview=raw_response[:500],
                             raw_response_length=len(raw_response))
-                # Also print to console for immediate visibility
-                print(f"=== JSON DECODE ERROR FOR {block_name} (Attempt {attempt + 1}) ===")
-                print(f"Error: {str(e)}")
-                print(f"Error message: {e.msg}")
-                print(f"Error position: {e.pos}")
-                print(f"Response length: {len(raw_response)} characters")
-                print(f"Full raw response:")
-                print(repr(raw_response))
-                print(f"=== END JSON ERROR DEBUG ===")
+                # Also print to console for immediate visibility (blocking, so only when asked for)
+                if settings.log_llm_payloads:
+                    print(f"=== JSON DECODE ERROR FOR {block_name} (Attempt {attempt + 1}) ===")
+                    print(f"Error: {str(e)}")
+                    print(f"Error message: {e.msg}")
+                    print(f"Error position: {e.pos}")
+                    print(f"Response length: {len(raw_response)} characters")
+                    print(f"Full raw response:")
+                    print(repr(raw_response))
+                    print(f"=== END JSON ERROR DEBUG ===")
                 
                 if attempt == settings.max_retries:
                     raise Exception(f"Failed to get valid JSON from block '{block_name}' after {settings.max_retries + 1} attempts")
                     
+            except CircuitOpenError:
+                # Retrying against an open circuit only burns time
+                raise
+            
             except Exception as e:
                 logger.error("Block execution failed", 
                             attempt=attempt, 
@@ -454,6 +543,441 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                     raise
                 await asyncio.sleep(2 ** attempt)  # Exponential backoff
     
+    def _build_options(self, model_parameters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Ollama options: defaults overridden by the block's model_parameters"""
+        options = {
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "stop": ["<|endoftext|>"]
+        }
+        
+        # Override with model_parameters if provided
+        if model_parameters:
+            # Map common parameter names to Ollama's expected names
+            param_mapping = {
+                'max_tokens': 'num_predict',
+                'context_window': 'num_ctx',
+                'num_ctx': 'num_ctx',
+                'temperature': 'temperature',
+                'top_p': 'top_p',
+                'top_k': 'top_k',
+                'repeat_penalty': 'repeat_penalty',
+                'seed': 'seed'
+            }
+            
+            for key, value in model_parameters.items():
+                if key in param_mapping:
+                    ollama_key = param_mapping[key]
+                    options[ollama_key] = value
+                elif key not in ['stop']:  # Don't override stop tokens
+                    # Pass through any other parameters as-is
+                    options[key] = value
+        
+        return options
+    
+    def _request_text_variables(self, block: Dict[str, Any]) -> List[str]:
+        """Prompt variables that hold the request text for this block"""
+        return ['request_text'] + [
+            block_input['variable_name']
+            for block_input in block.get('inputs', [])
+            if block_input['input_type'] == 'REQUEST_TEXT'
+        ]
+    
+    def _uses_shared_prefix(self, block: Dict[str, Any]) -> bool:
+        """Whether to send the request text as a shared prefix instead of inline"""
+        execution_options = block.get('execution_options') or {}
+        layout = execution_options.get('prompt_layout', settings.prompt_layout)
+        if layout != PROMPT_LAYOUT_SHARED_PREFIX:
+            return False
+        # Blocks that never look at the request text keep their prompt as written
+        return any(f"{{{variable}}}" in block['prompt'] for variable in self._request_text_variables(block))
+    
+    def _split_long_input(self, block: Dict[str, Any], request_text: str) -> Optional[List[str]]:
+        """Chunks for a block in map-reduce long-input mode, or None to run it on the whole text"""
+        execution_options = block.get('execution_options') or {}
+        if execution_options.get('long_input') != 'map_reduce':
+            return None
+        if not any(f"{{{variable}}}" in block['prompt'] for variable in self._request_text_variables(block)):
+            return None
+        chunk_chars = execution_options.get('chunk_chars') or settings.long_input_chunk_chars
+        overlap_chars = execution_options.get('chunk_overlap_chars', settings.long_input_overlap_chars)
+        chunks = split_text(request_text, chunk_chars, overlap_chars)
+        return chunks if len(chunks) > 1 else None
+    
+    async def _execute_chunked_block(self, block: Dict[str, Any], block_context: Dict[str, Any], chunks: List[str], model_name: str, custom_instructions: str = "") -> Dict[str, Any]:
+        """Run a block on each chunk concurrently and merge the results with the schema's reduce rules"""
+        block_name = block['name']
+        output_schema = block.get('output_schema')
+        variables = self._request_text_variables(block)
+        
+        async def run_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            chunk_context = dict(block_context)
+            for variable in variables:
+                chunk_context[variable] = chunk
+            prompt = self._prepare_prompt(block['prompt'], chunk_context)
+            prompt = f"{prompt}\n\n(This text is part {index + 1} of {len(chunks)} of a longer document. Answer for this part only.)"
+            return await self._execute_block(prompt, f"{block_name} [part {index + 1}/{len(chunks)}]", model_name, output_schema, custom_instructions, block.get('model_parameters'), block.get('system_prompt'))
+        
+        logger.info("Running block on chunks", block_name=block_name, chunks=len(chunks))
+        outcomes = await asyncio.gather(*[run_chunk(index, chunk) for index, chunk in enumerate(chunks)], return_exceptions=True)
+        
+        results = []
+        errors = []
+        for outcome in outcomes:
+            if isinstance(outcome, CircuitOpenError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                errors.append(outcome)
+            else:
+                results.append(outcome)
+        if not results:
+            raise errors[0]
+        if errors:
+            logger.warning("Some chunks failed, merging the rest",
+                           block_name=block_name,
+                           failed=len(errors),
+                           error=str(errors[0]))
+        
+        tokens_used = 0
+        duration_ms = 0
+        for result in results:
+            metadata = result.pop('_metadata', {})
+            tokens_used += metadata.get('tokens_used', 0)
+            duration_ms += metadata.get('duration_ms', 0)
+        
+        merged, llm_fields = reduce_results(results, output_schema)
+        if llm_fields:
+            # Fields marked "x-reduce": "llm" are combined by one more call over the partial answers
+            reduce_context = dict(block_context)
+            for variable in variables:
+                reduce_context[variable] = "(the document)"
+            task = self._prepare_prompt(block['prompt'], reduce_context)
+            partials = json.dumps([{field: result.get(field) for field in llm_fields} for result in results], indent=2)
+            reduce_prompt = f"""The task below was carried out separately on {len(results)} consecutive parts of one document.
+
+TASK:
+{task}
+
+Partial results, in document order:
+{partials}
+
+Combine the partial results into a single result for the whole document."""
+            reduce_schema = {
+                "type": "object",
+                "properties": {field: output_schema['properties'][field] for field in llm_fields}
+            }
+            reduced = await self._execute_block(reduce_prompt, f"{block_name} [reduce]", model_name, reduce_schema, "", block.get('model_parameters'), block.get('system_prompt'))
+            metadata = reduced.pop('_metadata', {})
+            tokens_used += metadata.get('tokens_used', 0)
+            duration_ms += metadata.get('duration_ms', 0)
+            merged.update({field: reduced[field] for field in llm_fields if field in reduced})
+        
+        merged['_metadata'] = {
+            'model': model_name,
+            'block_name': block_name,
+            'tokens_used': tokens_used,
+            'duration_ms': duration_ms,
+            'chunks': len(chunks),
+            'failed_chunks': len(errors)
+        }
+        return merged
+    
+    def _map_input(self, block: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The BLOCK_OUTPUT input a map block iterates over: execution_options.map_over, else the first one"""
+        map_over = (block.get('execution_options') or {}).get('map_over')
+        for block_input in block.get('inputs', []):
+            if block_input['input_type'] != 'BLOCK_OUTPUT':
+                continue
+            if map_over is None or block_input['variable_name'] == map_over:
+                return block_input
+        return None
+    
+    async def _execute_map_block(self, block: Dict[str, Any], block_context: Dict[str, Any], context: Dict[str, Any], block_id_to_name: Dict[int, str], model_name: str, custom_instructions: str = "") -> Dict[str, Any]:
+        """Run a block's prompt once per item of an upstream list, a bounded number at a time"""
+        block_name = block['name']
+        map_input = self._map_input(block)
+        if map_input is None:
+            raise ValueError(f"Map block '{block_name}' has no BLOCK_OUTPUT input to map over")
+        items = self._resolve_block_output(map_input, context, block_id_to_name)
+        if items == "":
+            items = []
+        if not isinstance(items, list):
+            raise ValueError(f"Map input '{map_input['variable_name']}' of block '{block_name}' is not a list")
+        
+        max_parallel = (block.get('execution_options') or {}).get('max_parallel')
+        if max_parallel is None:
+            max_parallel = settings.map_max_parallel
+        elif not isinstance(max_parallel, int) or isinstance(max_parallel, bool) or max_parallel < 1:
+            # Workflows saved before the backend checked it
+            raise ValueError(f"max_parallel of map block '{block_name}' must be a positive integer")
+        semaphore = asyncio.Semaphore(max_parallel)
+        
+        async def run_item(index: int, item: Any) -> Dict[str, Any]:
+            item_context = dict(block_context)
+            item_context[map_input['variable_name']] = self._render_value(item)
+            item_context['item_index'] = index
+            prompt = self._prepare_prompt(block['prompt'], item_context)
+            async with semaphore:
+                return await self._execute_block(prompt, f"{block_name} [item {index + 1}/{len(items)}]", model_name, block.get('output_schema'), custom_instructions, block.get('model_parameters'), block.get('system_prompt'))
+        
+        logger.info("Running map block", block_name=block_name, items=len(items), max_parallel=max_parallel)
+        outcomes = await asyncio.gather(*[run_item(index, item) for index, item in enumerate(items)], return_exceptions=True)
+        
+        # Failed items keep their place so results line up with the input list
+        results = []
+        failed = 0
+        tokens_used = 0
+        duration_ms = 0
+        for outcome in outcomes:
+            if isinstance(outcome, CircuitOpenError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                failed += 1
+                results.append({"error": str(outcome), "status": "failed"})
+                continue
+            metadata = outcome.pop('_metadata', {})
+            tokens_used += metadata.get('tokens_used', 0)
+            duration_ms += metadata.get('duration_ms', 0)
+            results.append(outcome)
+        if items and failed == len(items):
+            raise ValueError(f"All {failed} items of map block '{block_name}' failed: {results[0]['error']}")
+        
+        return {
+            'items': results,
+            '_metadata': {
+                'model': model_name,
+                'block_name': block_name,
+                'tokens_used': tokens_used,
+                'duration_ms': duration_ms,
+                'items': len(items),
+                'failed_items': failed
+            }
+        }
+    
+    def _size_options(self, options: Dict[str, Any], prompt_chars: int, output_schema: Dict[str, Any] = None, cap_output: bool = True, records: int = 1) -> Dict[str, Any]:
+        """Set num_ctx and num_predict for one call, never below the block's own settings; returns the chosen values"""
+        if not settings.adaptive_context_enabled:
+            return {}
+        
+        # A num_predict from model_parameters is an upper bound; a num_ctx is the smallest context
+        explicit_num_ctx = options.get('num_ctx')
+        explicit_num_predict = options.get('num_predict')
+        
+        num_predict = explicit_num_predict
+        estimated_output = estimate_output_tokens(output_schema) if cap_output else None
+        if estimated_output:
+            estimated_output *= records
+            num_predict = min(estimated_output, explicit_num_predict) if explicit_num_predict else estimated_output
+        if num_predict:
+            options['num_predict'] = num_predict
+        
+        prompt_tokens = estimate_tokens(prompt_chars)
+        needed = prompt_tokens + (num_predict or settings.default_output_tokens) + TEMPLATE_OVERHEAD_TOKENS
+        # Prompts that fit the default context keep it, so the loaded model is reused
+        floor = explicit_num_ctx or settings.min_num_ctx
+        num_ctx = explicit_num_ctx
+        if needed > floor:
+            num_ctx = context_bucket(needed, floor, max(floor, settings.max_num_ctx))
+            if needed > num_ctx:
+                logger.warning("Prompt may not fit the context window",
+                               estimated_tokens=needed,
+                               num_ctx=num_ctx)
+            options['num_ctx'] = num_ctx
+        
+        return {'num_ctx': num_ctx, 'num_predict': num_predict, 'prompt_tokens_estimate': prompt_tokens}
+    
+    def _get_pack_size(self, workflow_data: Dict[str, Any], blocks: List[Dict[str, Any]], custom_instructions_map: Dict[int, str], request_text: str) -> int:
+        """How many requests may share an LLM call with this one (0 when packing does not apply)"""
+        pack_size = workflow_data.get('pack_size') or 0
+        if pack_size < 2 or len(blocks) != 1:
+            return 0
+        # Per-request instructions and long texts need a prompt of their own
+        if custom_instructions_map or len(request_text) > settings.pack_max_text_chars:
+            return 0
+        return pack_size
+    
+    async def _execute_packed(self, workflow_id: int, block: Dict[str, Any], model_name: str, request_text: str, pack_size: int) -> Optional[Dict[str, Any]]:
+        """Run the block for this request inside a packed call; None means run it on its own"""
+        async def run(texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+            return await self._execute_packed_block(block, model_name, texts)
+        
+        try:
+            return await record_packer.submit((workflow_id, block['id']), pack_size, request_text, run)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.warning("Packed call failed, processing request on its own",
+                           block_name=block['name'],
+                           error=str(e))
+            return None
+    
+    async def _execute_packed_block(self, block: Dict[str, Any], model_name: str, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Answer one block for several request texts with a single LLM call"""
+        block_name = block['name']
+        output_schema = block.get('output_schema')
+        
+        # Render the block prompt once, pointing request text variables at the records
+        placeholder = "(the text of the record being processed)"
+        block_context = await self._prepare_block_context(block, {'request_text': placeholder}, {})
+        instructions = self._prepare_prompt(block['prompt'], block_context)
+        example = self._create_schema_example(output_schema) if output_schema else '{"key": "value"}'
+        
+        records = "\n".join(
+            f"<record index=\"{index}\">\n{text}\n</record>" for index, text in enumerate(texts)
+        )
+        prompt = f"""{instructions}
+
+Apply the instructions above to each of the following {len(texts)} records independently:
+
+{records}
+
+Your response must be a JSON object of the form {{"results": [{{"index": 0, "result": ...}}, ...]}} with exactly one entry per record, in record order. Each "result" must be a JSON object with this structure:
+{example}
+
+Do not return the schema itself - return actual data values that match this structure.
+
+IMPORTANT: You must respond with valid JSON only. Do not include any markdown formatting, code blocks, or additional text."""
+        
+        messages = []
+        if block.get('system_prompt'):
+            messages.append({"role": "system", "content": block['system_prompt']})
+        messages.append({"role": "user", "content": prompt})
+        
+        options = self._build_options(block.get('model_parameters'))
+        if 'num_predict' in options:
+            # The output budget was set for one record
+            options['num_predict'] = options['num_predict'] * len(texts)
+        sizing = self._size_options(options, len(prompt) + len(block.get('system_prompt') or ""), output_schema,
+                                    cap_output='gpt-oss' not in model_name.lower(), records=len(texts))
+        
+        chat_args = {"model": model_name, "messages": messages, "options": options}
+        if 'gpt-oss' not in model_name.lower():
+            chat_args["format"] = 'json'
+        
+        logger.info("Calling Ollama API for packed records",
+                    block_name=block_name,
+                    model_name=model_name,
+                    records=len(texts))
+        response = await self.llm_client.chat(validate=self._has_valid_json, **chat_args)
+        content = response['message']['content']
+        parsed = await run_cpu(self._extract_json_from_response, content, size=len(content))
+        
+        entries = parsed.get('results') if isinstance(parsed, dict) else None
+        if not isinstance(entries, list):
+            raise ValueError("Packed response has no results list")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get('index', position)
+            result = entry.get('result')
+            if (isinstance(index, int) and 0 <= index < len(texts) and results[index] is None
+                    and self._matches_schema(result, output_schema)):
+                results[index] = result
+        
+        # Split the cost of the call across the records it answered
+        answered = sum(1 for result in results if result is not None) or 1
+        tokens_used = response.get('eval_count', 0) + response.get('prompt_eval_count', 0)
+        for result in results:
+            if result is not None:
+                result['_metadata'] = {
+                    'model': model_name,
+                    'block_name': block_name,
+                    'tokens_used': tokens_used // answered,
+                    'duration_ms': response.get('total_duration', 0) // 1000000,
+                    'packed_with': len(texts),
+                    **sizing
+                }
+        
+        logger.info("Packed call completed",
+                    block_name=block_name,
+                    records=len(texts),
+                    answered=answered)
+        return results
+    
+    def _validate_output(self, result: Any, output_schema: Optional[Dict[str, Any]]) -> List[str]:
+        """Errors of a parsed block result against the block's output schema (empty when valid)"""
+        if settings.schema_validation == SCHEMA_VALIDATION_OFF:
+            return []
+        if not isinstance(result, dict):
+            return ["$: expected a JSON object"]
+        if not output_schema:
+            return []
+        return get_validator(output_schema).validate(result)
+    
+    async def _repair_output(self, block_name: str, model_name: str, output_schema: Optional[Dict[str, Any]], invalid_output: str, errors: List[str], options: Dict[str, Any], is_harmony_model: bool):
+        """Ask the model to fix only the invalid output; returns (result or None, remaining errors, tokens used)"""
+        # The repair answer is one result, so it gets the block's output budget at most; num_ctx
+        # stays as sized for the block so the model is not reloaded
+        budget = estimate_output_tokens(output_schema) or settings.schema_repair_max_tokens
+        repair_options = dict(options, temperature=0, num_predict=min(budget, options.get('num_predict') or budget))
+        schema_text = json.dumps(output_schema, indent=2) if output_schema else "a single JSON object"
+        
+        best = None
+        tokens_used = 0
+        for attempt in range(settings.schema_repair_attempts):
+            prompt = f"""The output below was supposed to be JSON matching this schema:
+{schema_text}
+
+It has these problems:
+{chr(10).join(f"- {error}" for error in errors)}
+
+Output:
+{invalid_output[:REPAIR_MAX_INPUT_CHARS]}
+
+Return the corrected JSON only. Keep every value that is already valid and change only what the problems require."""
+            chat_args = {
+                'model': model_name,
+                'messages': [{"role": "user", "content": prompt}],
+                'options': repair_options
+            }
+            if not is_harmony_model:
+                chat_args['format'] = 'json'
+            try:
+                response = await self.llm_client.chat(**chat_args)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logger.warning("Repair call failed", block_name=block_name, error=str(e))
+                break
+            tokens_used += response.get('eval_count', 0) + response.get('prompt_eval_count', 0)
+            content = response.get('message', {}).get('content', '')
+            try:
+                candidate = await run_cpu(self._extract_json_from_response, content, size=len(content))
+            except json.JSONDecodeError as e:
+                errors = [f"not valid JSON: {e.msg}"]
+                invalid_output = content
+                continue
+            errors = self._validate_output(candidate, output_schema)
+            if isinstance(candidate, dict):
+                best = candidate
+            if not errors:
+                logger.info("Repaired block output", block_name=block_name, attempts=attempt + 1, tokens_used=tokens_used)
+                SCHEMA_REPAIRS.labels(outcome="repaired").inc()
+                return candidate, [], tokens_used
+            invalid_output = json.dumps(candidate, indent=2)
+        
+        SCHEMA_REPAIRS.labels(outcome="failed").inc()
+        return best, errors, tokens_used
+    
+    def _matches_schema(self, result: Any, schema: Optional[Dict[str, Any]]) -> bool:
+        """Shallow check that a packed result carries the fields the block's schema asks for"""
+        if not isinstance(result, dict):
+            return False
+        if not schema or schema.get('type') != 'object':
+            return True
+        expected = schema.get('required') or list(schema.get('properties', {}).keys())
+        return all(field in result for field in expected)
+    
+    def _has_valid_json(self, response: Dict[str, Any]) -> bool:
+        """Check whether a chat response carries parseable JSON (decides hedged races)"""
+        try:
+            content = response['message']['content']
+            return isinstance(self._extract_json_from_response(content), dict)
+        except (KeyError, TypeError, ValueError):
+            return False
+
     def _extract_json_from_response(self, content: str) -> Dict[str, Any]:
         """Extract JSON from response content, handling chain-of-thought and reasoning models"""
         content = content.strip()
@@ -617,44 +1141,77 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
                 
             elif input_type == 'BLOCK_OUTPUT':
                 # Get output from a previous block
-                source_block_id = block_input.get('source_block_id')
-                if source_block_id is not None:
-                    # Find the source block name by its ID
-                    source_block_name = block_id_to_name.get(source_block_id)
-                    if source_block_name:
-                        # Try to find the block output in context
-                        # First try the exact name
-                        source_key = source_block_name
-                        if source_key not in global_context:
-                            # Try lowercase with underscores (how we store it)
-                            source_key = source_block_name.lower().replace(' ', '_')
-                        
-                        if source_key in global_context:
-                            source_output = global_context[source_key]
-                            # Convert output to string for use in prompts
-                            if isinstance(source_output, dict):
-                                block_context[variable_name] = json.dumps(source_output, indent=2)
-                            else:
-                                block_context[variable_name] = str(source_output)
-                        else:
-                            logger.warning("Source block output not found in context", 
-                                         source_block_id=source_block_id,
-                                         source_block_name=source_block_name,
-                                         tried_keys=[source_block_name, source_block_name.lower().replace(' ', '_')],
-                                         available_blocks=list(global_context.keys()))
-                            block_context[variable_name] = ""
-                    else:
-                        logger.warning("Source block ID not found in mapping", 
-                                     source_block_id=source_block_id,
-                                     available_block_ids=list(block_id_to_name.keys()))
-                        block_context[variable_name] = ""
-                else:
-                    logger.warning("BLOCK_OUTPUT input missing source_block_id", 
-                                 variable_name=variable_name)
-                    block_context[variable_name] = ""
+                block_context[variable_name] = self._render_value(
+                    self._resolve_block_output(block_input, global_context, block_id_to_name))
         
         return block_context
     
+    def _resolve_block_output(self, block_input: Dict[str, Any], global_context: Dict[str, Any], block_id_to_name: Dict[int, str]) -> Any:
+        """Value a BLOCK_OUTPUT input refers to, before it is rendered into a prompt ("" when missing)"""
+        source_block_id = block_input.get('source_block_id')
+        if source_block_id is None:
+            logger.warning("BLOCK_OUTPUT input missing source_block_id", 
+                         variable_name=block_input['variable_name'])
+            return ""
+        
+        # Find the source block name by its ID
+        source_block_name = block_id_to_name.get(source_block_id)
+        if not source_block_name:
+            logger.warning("Source block ID not found in mapping", 
+                         source_block_id=source_block_id,
+                         available_block_ids=list(block_id_to_name.keys()))
+            return ""
+        
+        # Try to find the block output in context
+        # First try the exact name
+        source_key = source_block_name
+        if source_key not in global_context:
+            # Try lowercase with underscores (how we store it)
+            source_key = source_block_name.lower().replace(' ', '_')
+        
+        if source_key not in global_context:
+            logger.warning("Source block output not found in context", 
+                         source_block_id=source_block_id,
+                         source_block_name=source_block_name,
+                         tried_keys=[source_block_name, source_block_name.lower().replace(' ', '_')],
+                         available_blocks=list(global_context.keys()))
+            return ""
+        
+        source_output = global_context[source_key]
+        source_field = block_input.get('source_field')
+        if source_field:
+            # Only the referenced field reaches the prompt
+            source_output = self._project_output(source_output, source_field)
+            if source_output is None:
+                logger.warning("Source field not found in block output",
+                               source_block_name=source_block_name,
+                               source_field=source_field)
+                return ""
+        elif isinstance(source_output, dict):
+            # Run metadata is never useful to a downstream prompt
+            source_output = {key: value for key, value in source_output.items() if key != '_metadata'}
+        return source_output
+    
+    def _render_value(self, value: Any) -> str:
+        """Convert a value to a string for use in prompts"""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, indent=2)
+        return str(value)
+    
+    def _project_output(self, output: Any, path: str) -> Any:
+        """Value at a dotted path such as "entities.0.name" in a block output, or None"""
+        value = output
+        for segment in path.split('.'):
+            if isinstance(value, dict):
+                value = value.get(segment)
+            elif isinstance(value, list) and segment.isdigit() and int(segment) < len(value):
+                value = value[int(segment)]
+            else:
+                return None
+            if value is None:
+                return None
+        return value
+    
     def _create_schema_example(self, schema: Dict[str, Any]) -> str:
         """Create a simple example structure from a JSON schema"""
         if not schema or schema.get('type') != 'object':
@@ -684,7 +1241,7 @@ IMPORTANT: You must respond with valid JSON only containing actual data values (
     async def _get_custom_instructions(self, request_id: int) -> Dict[int, str]:
         """Get custom instructions for all blocks in a request"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with backend_client(timeout=30.0) as client:
                 response = await client.get(
                     f"{settings.backend_api_url}/api/requests/{request_id}/custom-instructions"
                 )
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark compiled templates (ai_pipeline/templates.py) against the rendering
+they replaced: per-key str.replace for worker embedding text, re.findall plus
+replace for backend embedding templates, and str.format for block prompts
+"""
+
+import re
+import timeit
+
+from ai_pipeline.templates import BRACES, FORMAT, MUSTACHE, compile_template
+
+BLOCKS = 20
+RUNS = 2000
+
+request_text = "The applicant asks for all correspondence about the harbour project. " * 60
+outputs = {f"Block {i}": f"Output of block {i}. " * 20 for i in range(BLOCKS)}
+
+
+def replace_loop(template, context):
+    text = template
+    for key, value in context.items():
+        text = text.replace(f"{{{key}}}", str(value))
+    return text
+
+
+def findall_replace(template, context):
+    text = template
+    for var_match in re.findall(r"\{\{([^}]+)\}\}", text):
+        var_name = var_match.strip()
+        text = text.replace(f"{{{{{var_name}}}}}", str(context.get(var_name, "")))
+    return text
+
+
+def compare(label, old, new):
+    assert old() == new(), label
+    old_time = timeit.timeit(old, number=RUNS)
+    new_time = timeit.timeit(new, number=RUNS)
+    print(f"{label:<28} old {old_time * 1e6 / RUNS:8.1f} us"
+          f"   compiled {new_time * 1e6 / RUNS:8.1f} us   x{old_time / new_time:.1f}")
+
+
+def main():
+    # Worker embedding text: one str.replace pass per context key
+    context = {"request_id": 1, "request_text": request_text}
+    for name, output in outputs.items():
+        context[f"block_{name.replace(' ', '_').lower()}"] = output
+        context[name] = output
+    template = "Request: {request_text}\n\nSummary: {block_block_3}\nTopic: {Block 7}"
+    compare("worker embedding text",
+            lambda: replace_loop(template, context),
+            lambda: compile_template(template, BRACES).render(context))
+
+    # Backend embedding template: {{ }} placeholders
+    context = {"REQUEST_TEXT": request_text}
+    context.update({f"{name}.summary": output for name, output in outputs.items()})
+    template = "{{REQUEST_TEXT}}\n\n" + "\n".join(
+        f"{{{{Block {i}.summary}}}}" for i in range(0, BLOCKS, 2))
+    compare("backend embedding template",
+            lambda: findall_replace(template, context),
+            lambda: compile_template(template, MUSTACHE).render(context))
+
+    # Block prompt: str.format
+    context = {"request_text": request_text, "summary": outputs["Block 1"], "labels": "a, b, c"}
+    template = ("Classify the request below into one of: {labels}.\n\nSummary: {summary}\n\n"
+                "Request:\n{request_text}\n\nReturn JSON like {{\"label\": \"...\"}}")
+    compare("block prompt",
+            lambda: template.format(**context),
+            lambda: compile_template(template, FORMAT).render(context))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,16 @@ class Settings(BaseSettings):
     # Ollama Configuration
     ollama_host: str = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     model_name: str = os.getenv("MODEL_NAME", "gemma3:1b")
+    # Extra Ollama hosts (comma separated) used as targets for hedged calls
+    ollama_hosts: str = os.getenv("OLLAMA_HOSTS", "")
+    
+    # Model residency
+    model_registry_ttl_seconds: float = float(os.getenv("MODEL_REGISTRY_TTL_SECONDS", "60"))
+    model_keep_alive: str = os.getenv("MODEL_KEEP_ALIVE", "30m")
+    preload_models_on_startup: bool = os.getenv("PRELOAD_MODELS_ON_STARTUP", "true").lower() == "true"
+    # Model-affinity scheduling (0 disables); a resident model yields after the window if others wait
+    max_resident_models: int = int(os.getenv("MAX_RESIDENT_MODELS", "1"))
+    model_affinity_window_seconds: float = float(os.getenv("MODEL_AFFINITY_WINDOW_SECONDS", "30"))
     
     # API Configuration
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
@@ -14,10 +24,83 @@ class Settings(BaseSettings):
     # Backend API
     backend_api_url: str = os.getenv("BACKEND_API_URL", "http://taskflow-api:8000")
     
+    # Redis (events and shared circuit breaker state)
+    redis_url: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    
+    # Progress events are queued and published in pipelined batches by a background task;
+    # when the queue is full, progress events are dropped before lifecycle events
+    event_buffer_size: int = int(os.getenv("EVENT_BUFFER_SIZE", "1000"))
+    event_batch_size: int = int(os.getenv("EVENT_BATCH_SIZE", "100"))
+    event_publish_timeout_seconds: float = float(os.getenv("EVENT_PUBLISH_TIMEOUT_SECONDS", "2.0"))
+    # Event results larger than this (encoded bytes) are sent by reference (payload.result_ref)
+    event_inline_max_bytes: int = int(os.getenv("EVENT_INLINE_MAX_BYTES", "16384"))
+    # Per-request event log (Redis Stream) for replay on reconnect: entries kept, and how long
+    # the log outlives the request's last event
+    event_log_max_len: int = int(os.getenv("EVENT_LOG_MAX_LEN", "1000"))
+    event_log_ttl_seconds: int = int(os.getenv("EVENT_LOG_TTL_SECONDS", "86400"))
+    
+    # Circuit breakers (state shared with the backend through Redis)
+    circuit_failure_threshold: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_recovery_seconds: float = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+    
     # Processing Configuration
     timeout_seconds: int = 60
     max_retries: int = 2
     
+    # Adaptive LLM concurrency (AIMD limiter in front of every Ollama call)
+    llm_initial_concurrency: int = int(os.getenv("LLM_INITIAL_CONCURRENCY", "2"))
+    llm_min_concurrency: int = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    llm_queue_delay_threshold_seconds: float = float(os.getenv("LLM_QUEUE_DELAY_THRESHOLD_SECONDS", "1.0"))
+    llm_tokens_per_second_floor_ratio: float = float(os.getenv("LLM_TOKENS_PER_SECOND_FLOOR_RATIO", "0.5"))
+    
+    # Hedged LLM calls (needs OLLAMA_HOSTS)
+    llm_hedging_enabled: bool = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+    llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    llm_hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    llm_hedge_min_delay_seconds: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2.0"))
+    
+    # CPU-heavy parsing and serialization runs in a bounded thread pool, off the event loop;
+    # inputs shorter than CPU_OFFLOAD_MIN_CHARS stay inline
+    cpu_pool_size: int = int(os.getenv("CPU_POOL_SIZE", "4"))
+    cpu_offload_min_chars: int = int(os.getenv("CPU_OFFLOAD_MIN_CHARS", "4000"))
+    # Print full prompts, requests and responses of every LLM call (debugging; blocks on stdout)
+    log_llm_payloads: bool = os.getenv("LOG_LLM_PAYLOADS", "false").lower() == "true"
+    
+    # Check block output against its output_schema: off, repair (fix invalid output with a short
+    # follow-up call, keep it with _metadata.schema_errors if that fails) or strict (fail the attempt)
+    schema_validation: str = os.getenv("SCHEMA_VALIDATION", "repair")
+    schema_repair_attempts: int = int(os.getenv("SCHEMA_REPAIR_ATTEMPTS", "1"))
+    schema_repair_max_tokens: int = int(os.getenv("SCHEMA_REPAIR_MAX_TOKENS", "512"))
+    
+    # Items of a map block running at the same time (execution_options.max_parallel overrides)
+    map_max_parallel: int = int(os.getenv("MAP_MAX_PARALLEL", "4"))
+    
+    # Opt-in per-call num_ctx / num_predict sizing. MIN_NUM_CTX is the context models are loaded
+    # with; a prompt that does not fit gets a power-of-two bucket up to MAX_NUM_CTX. num_ctx never
+    # goes below MIN_NUM_CTX or the block's own num_ctx, since Ollama reloads a model when it changes
+    adaptive_context_enabled: bool = os.getenv("ADAPTIVE_CONTEXT_ENABLED", "false").lower() == "true"
+    min_num_ctx: int = int(os.getenv("MIN_NUM_CTX", "4096"))
+    max_num_ctx: int = int(os.getenv("MAX_NUM_CTX", "32768"))
+    default_output_tokens: int = int(os.getenv("DEFAULT_OUTPUT_TOKENS", "1024"))
+    
+    # Default prompt layout for blocks ("inline" or "shared_prefix"); blocks can override
+    # it with execution_options.prompt_layout
+    prompt_layout: str = os.getenv("PROMPT_LAYOUT", "inline")
+    
+    # Map-reduce long-input mode (execution_options.long_input = "map_reduce"); blocks can
+    # override these with execution_options.chunk_chars / chunk_overlap_chars
+    long_input_chunk_chars: int = int(os.getenv("LONG_INPUT_CHUNK_CHARS", "8000"))
+    long_input_overlap_chars: int = int(os.getenv("LONG_INPUT_OVERLAP_CHARS", "400"))
+    
+    # Requests of one /process/batch call running at the same time (match Ollama's parallel slots)
+    batch_max_in_flight: int = int(os.getenv("BATCH_MAX_IN_FLIGHT", "4"))
+    
+    # Record packing for single-block workflows with pack_size set: requests arriving
+    # within the window are sent to the model together
+    pack_window_seconds: float = float(os.getenv("PACK_WINDOW_SECONDS", "0.25"))
+    pack_max_text_chars: int = int(os.getenv("PACK_MAX_TEXT_CHARS", "1000"))
+    
     # Observability
     prometheus_port: int = 9091
     
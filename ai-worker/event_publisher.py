@@ -1,86 +1,219 @@
 """
 Event publisher for AI worker to send progress updates via Redis
+
+Events are queued and published by a background task, so a job never waits on
+Redis. The queue is bounded: a newer progress event for the same request
+replaces the one still waiting, and under pressure progress events are dropped
+before lifecycle events (started, step completed, completed, failed). Queued
+events go out in pipelined batches: one round trip appends the batch to the
+per-request event logs (capped Redis Streams that reconnecting clients replay
+from), a second publishes it with the log ids.
+
+Delivery is best effort. A batch that fails to publish is not retried: its
+events are lost, both to live subscribers and to the event logs, and only
+counted as taskflow_events_total{outcome="failed"} plus a warning. The same
+goes for events still queued when shutdown's drain times out. Clients recover
+from the job state stored in the database, not from the event stream.
 """
-import json
+import asyncio
+import itertools
 import redis.asyncio as redis
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-import os
 import structlog
+from prometheus_client import Counter, Gauge
+
+from config import settings
+from event_codec import attach_id, encode_event
 
 logger = structlog.get_logger()
 
+# Event types where only the latest event per request matters
+COALESCED_EVENT_TYPES = {"job.progress", "embedding.progress"}
+
+# Pause after a failed publish before trying the next batch
+RETRY_DELAY_SECONDS = 1.0
+
+EVENT_QUEUE_DEPTH = Gauge(
+    "taskflow_event_queue_depth",
+    "Events waiting to be published to Redis",
+)
+EVENTS = Counter(
+    "taskflow_events_total",
+    "Worker events by outcome (published, coalesced, dropped, failed)",
+    ["outcome"],
+)
+
+
 class EventPublisher:
     """Publishes events to Redis for real-time updates"""
-    
-    def __init__(self, redis_url: str = None):
-        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+    def __init__(self, redis_url: str = None, max_pending: int = None):
+        self.redis_url = redis_url or settings.redis_url
+        self.max_pending = max(1, max_pending or settings.event_buffer_size)
         self._redis_client = None
-        
+        # Queued (channel, message) pairs in publish order; progress events are keyed by
+        # (request_id, event_type) so a newer one replaces the queued one
+        self._pending: "OrderedDict[Any, Tuple[str, bytes]]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
     async def connect(self):
         """Connect to Redis"""
         if not self._redis_client:
-            self._redis_client = redis.from_url(self.redis_url)
+            self._redis_client = redis.from_url(
+                self.redis_url,
+                socket_timeout=settings.event_publish_timeout_seconds,
+                socket_connect_timeout=settings.event_publish_timeout_seconds,
+            )
             logger.info("Connected to Redis for event publishing", url=self.redis_url)
-    
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+            if self._pending:
+                self._wakeup.set()
+
     async def disconnect(self):
-        """Disconnect from Redis"""
+        """Publish what is still queued (briefly), then disconnect from Redis"""
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
         if self._redis_client:
+            try:
+                await asyncio.wait_for(self._drain(), timeout=settings.event_publish_timeout_seconds)
+            except asyncio.TimeoutError:
+                logger.warning("Dropped queued events at shutdown", count=len(self._pending))
             await self._redis_client.close()
+            self._redis_client = None
             logger.info("Disconnected from Redis")
-    
+
     async def publish_event(self, request_id: int, event_type: str, payload: Dict[str, Any] = None):
-        """Publish an event for a specific request"""
-        if not self._redis_client:
+        """Queue an event for a specific request; returns without waiting for Redis"""
+        if not self._redis_client or self._flusher is None or self._flusher.done():
             await self.connect()
-        
+
         event = {
             "type": event_type,
             "request_id": request_id,
             "timestamp": datetime.utcnow().isoformat(),
         }
-        
+
         if payload:
             event["payload"] = payload
-        
+
         channel = f"taskflow.request.{request_id}"
-        message = json.dumps(event)
-        
-        await self._redis_client.publish(channel, message)
-        logger.debug("Published event", channel=channel, event_type=event_type)
-    
+        # Encoded now, so later changes to the payload do not leak into the event
+        message = encode_event(event, settings.event_inline_max_bytes)
+        self._enqueue(request_id, event_type, channel, message)
+
+    def _enqueue(self, request_id: int, event_type: str, channel: str, message: bytes):
+        coalesced = event_type in COALESCED_EVENT_TYPES
+        if coalesced:
+            key: Any = (request_id, event_type)
+            if self._pending.pop(key, None) is not None:
+                EVENTS.labels(outcome="coalesced").inc()
+        else:
+            key = next(self._sequence)
+
+        if len(self._pending) >= self.max_pending and not self._make_room(coalesced):
+            EVENTS.labels(outcome="dropped").inc()
+            logger.debug("Dropped event, publish queue full", channel=channel, event_type=event_type)
+            return
+
+        self._pending[key] = (channel, message)
+        EVENT_QUEUE_DEPTH.set(len(self._pending))
+        self._wakeup.set()
+
+    def _make_room(self, coalesced: bool) -> bool:
+        """Evict one queued event for a new one; False when the new event should be dropped"""
+        for key in self._pending:
+            if isinstance(key, tuple):
+                # The oldest queued progress event goes first
+                del self._pending[key]
+                EVENTS.labels(outcome="dropped").inc()
+                return True
+        if coalesced:
+            return False
+        self._pending.popitem(last=False)
+        EVENTS.labels(outcome="dropped").inc()
+        return True
+
+    def _take_batch(self) -> List[Tuple[str, bytes]]:
+        batch = []
+        while self._pending and len(batch) < settings.event_batch_size:
+            batch.append(self._pending.popitem(last=False)[1])
+        EVENT_QUEUE_DEPTH.set(len(self._pending))
+        return batch
+
+    async def _send(self, batch: List[Tuple[str, bytes]]):
+        # Append to each request's event log first; the entry ids go out with the live events
+        pipe = self._redis_client.pipeline(transaction=False)
+        for channel, message in batch:
+            log_key = f"{channel}.log"
+            pipe.xadd(log_key, {"e": message}, maxlen=settings.event_log_max_len, approximate=True)
+            pipe.expire(log_key, settings.event_log_ttl_seconds)
+        results = await asyncio.wait_for(pipe.execute(), timeout=settings.event_publish_timeout_seconds)
+
+        pipe = self._redis_client.pipeline(transaction=False)
+        for (channel, message), event_id in zip(batch, results[::2]):
+            pipe.publish(channel, attach_id(message, event_id.decode()))
+        await asyncio.wait_for(pipe.execute(), timeout=settings.event_publish_timeout_seconds)
+        EVENTS.labels(outcome="published").inc(len(batch))
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch = self._take_batch()
+                try:
+                    await self._send(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Progress events are best effort; clients reconcile from the stored state
+                    EVENTS.labels(outcome="failed").inc(len(batch))
+                    logger.warning("Failed to publish events", count=len(batch), error=str(e))
+                    await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+    async def _drain(self):
+        while self._pending:
+            await self._send(self._take_batch())
+
     # Convenience methods for common events
     async def job_started(self, request_id: int, job_type: str, job_id: str = None):
         await self.publish_event(request_id, "job.started", {
             "job_type": job_type,
             "job_id": job_id
         })
-    
+
     async def job_progress(self, request_id: int, progress: float, message: str = None):
         await self.publish_event(request_id, "job.progress", {
             "progress": progress,
             "message": message
         })
-    
+
     async def job_completed(self, request_id: int, job_type: str, result: Any = None):
         await self.publish_event(request_id, "job.completed", {
             "job_type": job_type,
             "result": result
         })
-    
+
     async def job_failed(self, request_id: int, job_type: str, error: str):
         await self.publish_event(request_id, "job.failed", {
             "job_type": job_type,
             "error": error
         })
-    
+
     async def embedding_progress(self, request_id: int, status: str, progress: float = None, message: str = None):
         await self.publish_event(request_id, "embedding.progress", {
             "status": status,
             "progress": progress,
             "message": message
         })
-    
+
     async def workflow_step_completed(self, request_id: int, step_name: str, result: Any = None):
         await self.publish_event(request_id, "workflow.step.completed", {
             "step_name": step_name,
@@ -88,4 +221,4 @@ class EventPublisher:
         })
 
 # Global event publisher instance
-event_publisher = EventPublisher()
\ No newline at end of file
+event_publisher = EventPublisher()
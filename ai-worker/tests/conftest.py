@@ -0,0 +1,45 @@
+"""
+Shared fixtures for AI worker tests
+"""
+from unittest.mock import AsyncMock
+
+import pytest
+
+from ai_pipeline.workflow_processor import WorkflowProcessor
+
+
+class FakeLLM:
+    """Stands in for llm_client: answers chat calls from a script and records them"""
+
+    def __init__(self, answers=None):
+        self.answers = list(answers or [])
+        self.calls = []
+
+    def answer(self, content, done_reason='stop', eval_count=10, prompt_eval_count=20):
+        self.answers.append({
+            'message': {'role': 'assistant', 'content': content},
+            'done_reason': done_reason,
+            'eval_count': eval_count,
+            'prompt_eval_count': prompt_eval_count,
+            'total_duration': 5_000_000,
+        })
+        return self
+
+    async def chat(self, validate=None, **kwargs):
+        self.calls.append(kwargs)
+        return self.answers.pop(0)
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def processor(llm, monkeypatch):
+    """A WorkflowProcessor on the fake LLM, with no retries and the model always present"""
+    monkeypatch.setattr('ai_pipeline.workflow_processor.model_registry.has_model', AsyncMock(return_value=True))
+    monkeypatch.setattr('ai_pipeline.workflow_processor.settings.max_retries', 0)
+    processor = WorkflowProcessor()
+    processor.llm_client = llm
+    return processor
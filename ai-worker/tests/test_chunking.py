@@ -0,0 +1,194 @@
+"""
+Unit tests for long-input map-reduce
+
+Tests cover:
+- Chunk sizes, natural break points and hard cuts when there is no break
+- Overlap between consecutive chunks, and its clamping to half a chunk
+- Reduce rules from x-reduce, enums, schema types and sampled values
+- Running a block per chunk and merging the results, including a failed chunk
+- The extra LLM call for fields marked "x-reduce": "llm"
+"""
+import json
+
+import pytest
+
+from ai_pipeline.chunking import reduce_results, split_text
+
+PARAGRAPHS = "\n\n".join(f"Paragraph {index} " + "word " * 20 for index in range(10))
+
+
+class TestSplitText:
+    """Test where split_text cuts a text and how chunks overlap."""
+
+    def test_short_text_is_one_chunk(self):
+        """Test that a text within chunk_chars is returned whole."""
+        assert split_text("short text", 100, 20) == ["short text"]
+
+    def test_chunks_cover_the_text_on_breaks(self):
+        """Test that chunks stay within size, end on paragraph breaks and rebuild the text."""
+        chunks = split_text(PARAGRAPHS, 300)
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 300 for chunk in chunks)
+        assert all(chunk.endswith("\n\n") for chunk in chunks[:-1])
+        assert "".join(chunks) == PARAGRAPHS
+
+    def test_break_preference(self):
+        """Test that a sentence end is preferred to a space when there is no newline."""
+        text = "a" * 60 + ". " + "b" * 20 + " " + "c" * 30
+        assert split_text(text, 100)[0] == "a" * 60 + ". "
+
+    def test_breaks_in_the_first_half_are_ignored(self):
+        """Test that chunks are not cut short by a break early in the chunk."""
+        text = "a" * 10 + "\n\n" + "b" * 60 + " " + "c" * 60
+        assert split_text(text, 100)[0] == "a" * 10 + "\n\n" + "b" * 60 + " "
+
+    def test_hard_cut_without_breaks(self):
+        """Test that text with no break point is cut at chunk_chars."""
+        assert split_text("x" * 250, 100) == ["x" * 100, "x" * 100, "x" * 50]
+
+    def test_overlap_repeats_the_end_of_the_previous_chunk(self):
+        """Test that each chunk starts with the last overlap_chars of the one before."""
+        chunks = split_text("x" * 100 + "y" * 100, 100, 30)
+
+        assert chunks[0] == "x" * 100
+        assert chunks[1].startswith("x" * 30 + "y")
+        for previous, chunk in zip(chunks, chunks[1:]):
+            assert chunk.startswith(previous[-30:])
+        assert chunks[-1].endswith("y")
+
+    def test_overlap_is_clamped_to_half_a_chunk(self):
+        """Test that a large overlap still moves forward by half a chunk."""
+        assert split_text("x" * 200, 100, 500) == split_text("x" * 200, 100, 50)
+        assert all(len(chunk) == 100 for chunk in split_text("x" * 200, 100, 50))
+
+
+class TestReduceResults:
+    """Test how reduce_results merges per-chunk results."""
+
+    def test_rules_from_schema_types(self):
+        """Test the default rule for each schema type."""
+        schema = {'type': 'object', 'properties': {
+            'summary': {'type': 'string'},
+            'people': {'type': 'array'},
+            'score': {'type': 'number'},
+            'urgent': {'type': 'boolean'},
+            'meta': {'type': 'object'},
+        }}
+        results = [
+            {'summary': 'first', 'people': ['Ann', 'Bob'], 'score': 0.2, 'urgent': False, 'meta': {'n': 1}},
+            {'summary': 'second', 'people': ['Bob', 'Cy'], 'score': 0.7, 'urgent': True, 'meta': {'n': 2}},
+        ]
+
+        merged, llm_fields = reduce_results(results, schema)
+
+        assert merged == {'summary': 'first\n\nsecond', 'people': ['Ann', 'Bob', 'Cy'], 'score': 0.7,
+                          'urgent': True, 'meta': {'n': 1}}
+        assert llm_fields == []
+
+    def test_enum_votes(self):
+        """Test that an enum field takes the most common label, ties going to the first chunk."""
+        schema = {'properties': {'label': {'type': 'string', 'enum': ['low', 'high']}}}
+
+        assert reduce_results([{'label': 'low'}, {'label': 'high'}, {'label': 'high'}], schema)[0] == {'label': 'high'}
+        assert reduce_results([{'label': 'high'}, {'label': 'low'}], schema)[0] == {'label': 'high'}
+
+    @pytest.mark.parametrize('rule,expected', [
+        ('sum', 6), ('min', 1), ('mean', 2), ('first', 2), ('all', True),
+    ])
+    def test_explicit_rules(self, rule, expected):
+        """Test that x-reduce overrides the type's default rule."""
+        schema = {'properties': {'count': {'type': 'integer', 'x-reduce': rule}}}
+        merged, _ = reduce_results([{'count': 2}, {'count': 1}, {'count': 3}], schema)
+        assert merged['count'] == expected
+
+    def test_missing_values_are_skipped(self):
+        """Test that chunks without a field, or with null, do not take part in its merge."""
+        schema = {'properties': {'score': {'type': 'number', 'x-reduce': 'mean'}, 'note': {'type': 'string'}}}
+
+        merged, _ = reduce_results([{'score': 4}, {'score': None}, {}, {'score': 2}], schema)
+
+        assert merged == {'score': 3}
+
+    def test_rules_without_schema(self):
+        """Test that without properties the fields and rules come from the values."""
+        merged, _ = reduce_results([{'tags': ['a'], 'n': 1, 'ok': False}, {'tags': ['b'], 'n': 5, 'extra': 'x'}], None)
+        assert merged == {'tags': ['a', 'b'], 'n': 5, 'ok': False, 'extra': 'x'}
+
+    def test_llm_fields_are_returned(self):
+        """Test that x-reduce llm fields keep the first value and are listed for a reduce call."""
+        schema = {'properties': {'summary': {'type': 'string', 'x-reduce': 'llm'}}}
+        merged, llm_fields = reduce_results([{'summary': 'one'}, {'summary': 'two'}], schema)
+        assert merged == {'summary': 'one'}
+        assert llm_fields == ['summary']
+
+
+def chunked_block(schema):
+    return {
+        'id': 1,
+        'name': 'Extract',
+        'prompt': 'Extract from: {text}',
+        'inputs': [{'variable_name': 'text', 'input_type': 'REQUEST_TEXT'}],
+        'output_schema': schema,
+        'execution_options': {'long_input': 'map_reduce', 'chunk_chars': 100, 'chunk_overlap_chars': 0},
+    }
+
+
+class TestChunkedBlock:
+    """Test _split_long_input and _execute_chunked_block."""
+
+    def test_only_long_inputs_are_split(self, processor):
+        """Test that chunks are made only in map_reduce mode and for texts over chunk_chars."""
+        block = chunked_block(None)
+
+        assert processor._split_long_input(block, 'x' * 100) is None
+        assert processor._split_long_input(block, 'x' * 150) == ['x' * 100, 'x' * 50]
+        assert processor._split_long_input(dict(block, execution_options={}), 'x' * 150) is None
+
+    @pytest.mark.asyncio
+    async def test_chunk_results_are_merged(self, processor, llm):
+        """Test that each chunk gets its own call and the merge sums their cost."""
+        schema = {'type': 'object', 'properties': {'people': {'type': 'array'}, 'score': {'type': 'number'}}}
+        block = chunked_block(schema)
+        llm.answer('{"people": ["Ann"], "score": 0.4}', eval_count=5, prompt_eval_count=5)
+        llm.answer('{"people": ["Ann", "Bob"], "score": 0.9}', eval_count=5, prompt_eval_count=5)
+
+        result = await processor._execute_chunked_block(block, {}, ['x' * 100, 'y' * 50], 'gemma3:1b')
+
+        assert len(llm.calls) == 2
+        prompts = [call['messages'][-1]['content'] for call in llm.calls]
+        assert any('x' * 100 in prompt and 'part 1 of 2' in prompt for prompt in prompts)
+        assert any('y' * 50 in prompt and 'part 2 of 2' in prompt for prompt in prompts)
+        assert result['people'] == ['Ann', 'Bob']
+        assert result['score'] == 0.9
+        assert result['_metadata']['tokens_used'] == 20
+        assert result['_metadata']['chunks'] == 2
+        assert result['_metadata']['failed_chunks'] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_chunk_is_left_out(self, processor, llm):
+        """Test that the merge uses the chunks that succeeded and counts the failure."""
+        block = chunked_block({'type': 'object', 'properties': {'people': {'type': 'array'}}})
+        llm.answer('{"people": ["Ann"]}').answer('not json')
+
+        result = await processor._execute_chunked_block(block, {}, ['x' * 100, 'y' * 50], 'gemma3:1b')
+
+        assert result['people'] == ['Ann']
+        assert result['_metadata']['failed_chunks'] == 1
+
+    @pytest.mark.asyncio
+    async def test_llm_reduce_combines_partials(self, processor, llm):
+        """Test that x-reduce llm fields are merged by one more call over the partial answers."""
+        schema = {'type': 'object', 'properties': {'summary': {'type': 'string', 'x-reduce': 'llm'}}}
+        block = chunked_block(schema)
+        llm.answer('{"summary": "part one"}').answer('{"summary": "part two"}')
+        llm.answer('{"summary": "whole document"}')
+
+        result = await processor._execute_chunked_block(block, {}, ['x' * 100, 'y' * 50], 'gemma3:1b')
+
+        assert len(llm.calls) == 3
+        reduce_prompt = llm.calls[2]['messages'][-1]['content']
+        assert 'Extract from: (the document)' in reduce_prompt
+        partials = json.loads(reduce_prompt.split('in document order:\n')[1].split('\n\nCombine')[0])
+        assert sorted(partial['summary'] for partial in partials) == ['part one', 'part two']
+        assert result['summary'] == 'whole document'
@@ -0,0 +1,78 @@
+"""
+Unit tests for block condition evaluation
+
+Tests cover:
+- Accepting the allowed expressions: literals, field access, comparisons, boolean logic, len/lower/upper
+- Rejecting other syntax, calls, computed indexes and unsupported literals
+- Treating missing blocks and fields as null, and failed comparisons as not met
+"""
+import pytest
+
+from ai_pipeline.conditions import ConditionError, compile_condition, evaluate_condition
+
+CONTEXT = {
+    'classify': {'sensitive': True, 'label': 'Urgent', 'score': 0.8},
+    'extract': {'entities': ['acme', 'globex'], 'summary': None},
+    'request_text': 'Please review the attached contract',
+}
+
+
+class TestAllowedExpressions:
+    """Test expressions the condition engine accepts."""
+
+    @pytest.mark.parametrize('expression,expected', [
+        ('classify.sensitive == true', True),
+        ('classify.sensitive == True and classify.score >= 0.5', True),
+        ('classify.score > 0.9 or len(extract.entities) == 2', True),
+        ("lower(classify.label) == 'urgent'", True),
+        ("upper(extract.entities[0]) in ['ACME', 'INITECH']", True),
+        ("classify['label'] != 'Low'", True),
+        ("'contract' in request_text", True),
+        ('not classify.sensitive', False),
+        ('-1 < classify.score < 1', True),
+        ('Classify.sensitive', True),
+    ])
+    def test_evaluates(self, expression, expected):
+        """Test that allowed expressions evaluate against block outputs."""
+        assert evaluate_condition(expression, CONTEXT) is expected
+
+
+class TestRejectedExpressions:
+    """Test expressions the condition engine refuses to run."""
+
+    @pytest.mark.parametrize('expression,message', [
+        ('classify.sensitive ==', 'Invalid condition'),
+        ("__import__('os').system('ls')", 'may be called'),
+        ('classify.label.lower() == "x"', 'may be called'),
+        ('len(extract.entities, key=1) > 0', 'may be called'),
+        ('extract.entities[len(extract.entities) - 1]', 'literal indexes'),
+        ('[e for e in extract.entities]', 'is not allowed'),
+        ('classify.score + 1 > 2', 'is not allowed'),
+        ('lambda: 1', 'is not allowed'),
+        ('classify.score > 1j', 'Unsupported literal'),
+    ])
+    def test_rejects(self, expression, message):
+        """Test that anything outside the allowed expressions raises ConditionError."""
+        with pytest.raises(ConditionError, match=message):
+            compile_condition(expression)
+
+
+class TestNullHandling:
+    """Test that absent values make a condition unmet instead of failing."""
+
+    @pytest.mark.parametrize('expression,expected', [
+        ('missing.field == null', True),
+        ('classify.missing == None', True),
+        ('extract.summary == null', True),
+        ('extract.entities[5] == null', True),
+        ('missing.score > 3', False),
+        ('extract.summary > 3', False),
+        ('len(missing.items) > 0', False),
+        ("lower(extract.summary) == 'none'", False),
+        ('len(classify.score) > 0', False),
+        ('missing.flag', False),
+        ('not missing.flag', True),
+    ])
+    def test_absent_values(self, expression, expected):
+        """Test that missing blocks, fields and indexes are null and impossible comparisons are false."""
+        assert evaluate_condition(expression, CONTEXT) is expected
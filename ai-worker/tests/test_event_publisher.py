@@ -0,0 +1,212 @@
+"""
+Unit tests for the event publisher's queue and batched publishing
+
+Tests cover:
+- Coalescing progress events per request and event type
+- Eviction when the queue is full: oldest progress first, lifecycle events last
+- Publishing in batches, each event logged before it is published with its log id
+- Dropping a batch that fails to publish and carrying on with the next one
+- Draining the queue on disconnect
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from event_codec import decode_event
+from event_publisher import EVENTS, EventPublisher
+
+
+def events(outcome):
+    return EVENTS.labels(outcome=outcome)._value.get()
+
+
+class FakePipeline:
+    """Records pipelined commands and applies them to its FakeRedis on execute"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, key, fields, maxlen=None, approximate=False):
+        self.commands.append(('xadd', key, fields['e']))
+
+    def expire(self, key, seconds):
+        self.commands.append(('expire', key, seconds))
+
+    def publish(self, channel, message):
+        self.commands.append(('publish', channel, message))
+
+    async def execute(self):
+        self.redis.executes += 1
+        if self.redis.failures:
+            self.redis.failures -= 1
+            raise ConnectionError("redis unavailable")
+        results = []
+        for command, key, value in self.commands:
+            if command == 'xadd':
+                self.redis.log.append((key, value))
+                results.append(f"{len(self.redis.log)}-0".encode())
+            elif command == 'publish':
+                self.redis.published.append((key, decode_event(value)))
+                results.append(1)
+            else:
+                results.append(True)
+        return results
+
+
+class FakeRedis:
+    """Stands in for the Redis client: event logs, published messages and scripted failures"""
+
+    def __init__(self):
+        self.log = []
+        self.published = []
+        self.executes = 0
+        self.failures = 0
+        self.closed = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        self.closed = True
+
+
+async def until(condition):
+    """Yield to the flusher until ``condition`` holds"""
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0)
+    await asyncio.wait_for(wait(), timeout=1)
+
+
+@pytest.fixture
+def queue():
+    """A publisher with room for three events and no flusher, so the queue can be inspected"""
+    publisher = EventPublisher(redis_url='redis://unused', max_pending=3)
+    publisher._wakeup = asyncio.Event()
+
+    def add(request_id, event_type, message):
+        publisher._enqueue(request_id, event_type, f"taskflow.request.{request_id}", message)
+        return [message for _, message in publisher._pending.values()]
+
+    return add
+
+
+@pytest_asyncio.fixture
+async def publisher(monkeypatch):
+    """A publisher on FakeRedis, with no pause after a failed batch"""
+    monkeypatch.setattr('event_publisher.RETRY_DELAY_SECONDS', 0)
+    publisher = EventPublisher(redis_url='redis://unused')
+    publisher._redis_client = FakeRedis()
+    yield publisher
+    if publisher._redis_client:
+        await publisher.disconnect()
+
+
+class TestQueue:
+    """Test coalescing and eviction in the bounded queue."""
+
+    @pytest.mark.asyncio
+    async def test_progress_is_coalesced_per_request(self, queue):
+        """Test that a newer progress event replaces the queued one and moves to the back."""
+        before = events('coalesced')
+
+        queue(1, 'job.progress', b'p1')
+        queue(2, 'job.progress', b'q1')
+        pending = queue(1, 'job.progress', b'p2')
+
+        assert pending == [b'q1', b'p2']
+        assert events('coalesced') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_event_types_are_coalesced_separately(self, queue):
+        """Test that job and embedding progress of one request do not replace each other."""
+        queue(1, 'job.progress', b'job')
+        assert queue(1, 'embedding.progress', b'embedding') == [b'job', b'embedding']
+
+    @pytest.mark.asyncio
+    async def test_lifecycle_events_are_never_coalesced(self, queue):
+        """Test that every lifecycle event is kept."""
+        queue(1, 'workflow.step.completed', b's1')
+        assert queue(1, 'workflow.step.completed', b's2') == [b's1', b's2']
+
+    @pytest.mark.asyncio
+    async def test_full_queue_evicts_oldest_progress_first(self, queue):
+        """Test that a new event pushes out the oldest progress event, not a lifecycle one."""
+        before = events('dropped')
+        queue(1, 'job.started', b'started')
+        queue(1, 'job.progress', b'p1')
+        queue(2, 'job.progress', b'q1')
+
+        assert queue(3, 'job.started', b'other') == [b'started', b'q1', b'other']
+        assert queue(2, 'job.completed', b'done') == [b'started', b'other', b'done']
+        assert events('dropped') == before + 2
+
+    @pytest.mark.asyncio
+    async def test_progress_is_dropped_when_only_lifecycle_events_are_queued(self, queue):
+        """Test that a progress event never pushes out a lifecycle event."""
+        before = events('dropped')
+        for index in range(3):
+            queue(index, 'job.started', b'started %d' % index)
+
+        assert queue(5, 'job.progress', b'p') == [b'started 0', b'started 1', b'started 2']
+        assert events('dropped') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_lifecycle_event_evicts_the_oldest_when_nothing_else_is_queued(self, queue):
+        """Test that a lifecycle event on a full lifecycle queue replaces the oldest one."""
+        for index in range(3):
+            queue(index, 'job.started', b'started %d' % index)
+
+        assert queue(5, 'job.failed', b'failed') == [b'started 1', b'started 2', b'failed']
+
+
+class TestPublishing:
+    """Test how the background task publishes the queue."""
+
+    @pytest.mark.asyncio
+    async def test_events_are_logged_then_published_in_batches(self, publisher, monkeypatch):
+        """Test that each batch takes two round trips and events carry their log ids in order."""
+        monkeypatch.setattr('event_publisher.settings.event_batch_size', 2)
+        redis = publisher._redis_client
+
+        for step in ['a', 'b', 'c']:
+            await publisher.workflow_step_completed(1, step)
+        await until(lambda: len(redis.published) == 3)
+
+        assert redis.executes == 4
+        assert [key for key, _ in redis.log] == ['taskflow.request.1.log'] * 3
+        assert [event['payload']['step_name'] for _, event in redis.published] == ['a', 'b', 'c']
+        assert [event['id'] for _, event in redis.published] == ['1-0', '2-0', '3-0']
+        assert {channel for channel, _ in redis.published} == {'taskflow.request.1'}
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_dropped(self, publisher, monkeypatch):
+        """Test that a batch that fails is lost, counted, and the next batch still goes out."""
+        monkeypatch.setattr('event_publisher.settings.event_batch_size', 2)
+        redis = publisher._redis_client
+        redis.failures = 1
+        failed = events('failed')
+
+        await publisher.job_started(1, 'WORKFLOW')
+        await publisher.workflow_step_completed(1, 'a')
+        await publisher.job_completed(1, 'WORKFLOW')
+        await until(lambda: len(redis.published) == 1)
+
+        assert events('failed') == failed + 2
+        assert [event['type'] for _, event in redis.published] == ['job.completed']
+        assert redis.log == [('taskflow.request.1.log', redis.log[0][1])]
+        assert not publisher._pending
+
+    @pytest.mark.asyncio
+    async def test_disconnect_drains_the_queue(self, publisher):
+        """Test that events still queued at shutdown are published before closing."""
+        redis = publisher._redis_client
+
+        await publisher.job_progress(1, 0.5)
+        await publisher.job_completed(1, 'WORKFLOW')
+        await publisher.disconnect()
+
+        assert [event['type'] for _, event in redis.published] == ['job.progress', 'job.completed']
+        assert redis.closed
@@ -0,0 +1,200 @@
+"""
+Unit tests for hedged LLM calls
+
+Tests cover:
+- The latency percentile that marks a straggler, once enough samples exist
+- Calling only the primary host without hedging, or without latency history
+- Firing a hedge after the threshold, and the first valid answer winning
+- Cancelling the losing call, and sampling a cancelled primary as a lower bound
+- Falling back when a winner fails validation or both calls fail
+"""
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+from ai_pipeline.hedging import HEDGED_CALLS, LatencyTracker
+from ai_pipeline.llm_client import LLMClient
+
+PRIMARY = 'http://primary:11434'
+SECONDARY = 'http://secondary:11434'
+THRESHOLD = 0.05
+
+
+class FakeHost:
+    """An Ollama host whose chat calls finish when the test releases them"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+        self.error = None
+        self.content = '{"host": "%s"}' % name
+
+    async def chat(self, **kwargs):
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {'message': {'content': self.content}, 'host': self.name}
+
+
+def wins(winner):
+    return HEDGED_CALLS.labels(winner=winner)._value.get()
+
+
+@pytest.fixture
+def hosts(monkeypatch):
+    """An LLMClient over a fake primary and secondary, with THRESHOLD as the learned p95"""
+    monkeypatch.setattr('ai_pipeline.llm_client.settings.ollama_hosts', SECONDARY)
+    monkeypatch.setattr('ai_pipeline.llm_client.settings.llm_hedging_enabled', True)
+    monkeypatch.setattr('ai_pipeline.llm_client.settings.llm_hedge_min_delay_seconds', 0.0)
+    monkeypatch.setattr('ai_pipeline.llm_client.settings.llm_hedge_min_samples', 3)
+    monkeypatch.setattr('ai_pipeline.llm_client.ollama_breaker',
+                        SimpleNamespace(guard=contextlib.nullcontext))
+    client = LLMClient(PRIMARY)
+    primary, secondary = FakeHost('primary'), FakeHost('secondary')
+    client._clients = {PRIMARY: primary, SECONDARY: secondary}
+    for _ in range(3):
+        client.latency.record('m', THRESHOLD)
+    return SimpleNamespace(client=client, primary=primary, secondary=secondary)
+
+
+def has_host(name):
+    return lambda response: response['host'] == name
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestLatencyTracker:
+    """Test the straggler threshold."""
+
+    def test_threshold_needs_min_samples(self):
+        """Test that no threshold exists until min_samples latencies were recorded."""
+        tracker = LatencyTracker(percentile=0.9, min_samples=10)
+        for latency in range(1, 10):
+            tracker.record('m', float(latency))
+        assert tracker.threshold('m') is None
+        tracker.record('m', 10.0)
+        assert tracker.threshold('m') == 9.0
+        assert tracker.threshold('other') is None
+
+    def test_window_keeps_recent_samples(self):
+        """Test that old samples fall out of the window."""
+        tracker = LatencyTracker(window=3, percentile=1.0, min_samples=1)
+        for latency in (9.0, 1.0, 2.0, 3.0):
+            tracker.record('m', latency)
+        assert tracker.threshold('m') == 3.0
+
+
+class TestHedgedChat:
+    """Test LLMClient.chat with two hosts."""
+
+    @pytest.mark.asyncio
+    async def test_single_host_never_hedges(self, hosts, monkeypatch):
+        """Test that with one host every call goes to it, slow or not."""
+        monkeypatch.setattr('ai_pipeline.llm_client.settings.ollama_hosts', '')
+        client = LLMClient(PRIMARY)
+        client._clients = {PRIMARY: hosts.primary}
+        assert client.hedging_enabled is False
+        for _ in range(3):
+            client.latency.record('m', 0.0)
+
+        call = asyncio.create_task(client.chat(model='m'))
+        await asyncio.sleep(THRESHOLD * 2)
+        hosts.primary.release.set()
+        assert (await call)['host'] == 'primary'
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_history(self, hosts):
+        """Test that a model without enough samples is not hedged."""
+        call = asyncio.create_task(hosts.client.chat(model='new-model'))
+        await asyncio.sleep(THRESHOLD * 2)
+        assert not hosts.secondary.started.is_set()
+        hosts.primary.release.set()
+        assert (await call)['host'] == 'primary'
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self, hosts):
+        """Test that a call answering within the threshold never reaches the second host."""
+        hosts.primary.release.set()
+        assert (await hosts.client.chat(model='m'))['host'] == 'primary'
+        assert not hosts.secondary.started.is_set()
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_straggler_is_sampled(self, hosts):
+        """Test that a slow primary is hedged, cancelled when the hedge wins, and sampled."""
+        before = wins('hedge')
+        call = asyncio.create_task(hosts.client.chat(model='m'))
+        await hosts.secondary.started.wait()
+        hosts.secondary.release.set()
+
+        assert (await call)['host'] == 'secondary'
+        await settle()
+        assert hosts.primary.cancelled
+        assert wins('hedge') == before + 1
+        # The cancelled primary ran at least until the hedge fired; the hedge is not sampled
+        samples = list(hosts.client.latency._samples['m'])
+        assert len(samples) == 4
+        assert samples[-1] >= THRESHOLD
+
+    @pytest.mark.asyncio
+    async def test_primary_wins_after_hedging(self, hosts):
+        """Test that the primary can still win, and the hedge is then cancelled."""
+        before = wins('primary')
+        call = asyncio.create_task(hosts.client.chat(model='m'))
+        await hosts.secondary.started.wait()
+        hosts.primary.release.set()
+
+        assert (await call)['host'] == 'primary'
+        await settle()
+        assert hosts.secondary.cancelled
+        assert wins('primary') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_answer_does_not_win(self, hosts):
+        """Test that a first answer rejected by validate waits for the other call."""
+        call = asyncio.create_task(hosts.client.chat(model='m', validate=has_host('primary')))
+        await hosts.secondary.started.wait()
+        hosts.secondary.release.set()
+        await settle()
+        assert not call.done()
+
+        hosts.primary.release.set()
+        assert (await call)['host'] == 'primary'
+
+    @pytest.mark.asyncio
+    async def test_rejected_answers_fall_back(self, hosts):
+        """Test that when no answer passes validate, the first one is returned."""
+        before = wins('none')
+        call = asyncio.create_task(hosts.client.chat(model='m', validate=has_host('nobody')))
+        await hosts.secondary.started.wait()
+        hosts.secondary.release.set()
+        await settle()
+        hosts.primary.release.set()
+
+        assert (await call)['host'] == 'secondary'
+        assert wins('none') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_both_failing_raises(self, hosts):
+        """Test that the first error is raised when both calls fail."""
+        hosts.primary.error = RuntimeError('primary down')
+        hosts.secondary.error = RuntimeError('secondary down')
+        call = asyncio.create_task(hosts.client.chat(model='m'))
+        await hosts.secondary.started.wait()
+        hosts.secondary.release.set()
+        await settle()
+        hosts.primary.release.set()
+
+        with pytest.raises(RuntimeError, match='secondary down'):
+            await call
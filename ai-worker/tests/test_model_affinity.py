@@ -0,0 +1,198 @@
+"""
+Unit tests for model-affinity scheduling
+
+Tests cover:
+- Admitting calls for the resident model at once, and holding back other models
+- Promoting the longest-waiting model once the resident one drains
+- Making a resident model yield after its fairness window when others wait
+- Callers cancelled while queued, including a promoted model whose callers all left
+"""
+import asyncio
+from collections import deque
+
+import pytest
+
+from ai_pipeline.model_affinity import ModelAffinityScheduler
+
+
+class Call:
+    """A call holding its model until ``finish`` is called"""
+
+    def __init__(self, scheduler, model, log):
+        self.admitted = asyncio.Event()
+        self._done = asyncio.Event()
+        self.task = asyncio.create_task(self._run(scheduler, model, log))
+
+    async def _run(self, scheduler, model, log):
+        async with scheduler.acquire(model):
+            log.append(model)
+            self.admitted.set()
+            await self._done.wait()
+
+    async def finish(self):
+        self._done.set()
+        await self.task
+
+
+async def settle():
+    """Let every ready task run until it blocks again"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def log():
+    return []
+
+
+class TestAdmission:
+    """Test which calls are admitted while a model is resident."""
+
+    @pytest.mark.asyncio
+    async def test_same_model_shares_residency(self, log):
+        """Test that calls for the resident model run together and others wait."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1)
+        first, second = Call(scheduler, 'a', log), Call(scheduler, 'a', log)
+        other = Call(scheduler, 'b', log)
+        await settle()
+
+        assert log == ['a', 'a']
+        assert scheduler.resident_models == ['a']
+        assert not other.admitted.is_set()
+
+        await first.finish()
+        await settle()
+        assert not other.admitted.is_set()
+
+        await second.finish()
+        await settle()
+        assert other.admitted.is_set()
+        assert scheduler.resident_models == ['b']
+        await other.finish()
+
+    @pytest.mark.asyncio
+    async def test_disabled_or_unnamed_calls_pass_through(self, log):
+        """Test that no model, or a limit of 0, admits calls without scheduling."""
+        scheduler = ModelAffinityScheduler(max_resident_models=0)
+        calls = [Call(scheduler, 'a', log), Call(scheduler, 'b', log)]
+        unnamed = Call(ModelAffinityScheduler(max_resident_models=1), None, log)
+        await settle()
+
+        assert log == ['a', 'b', None]
+        for call in calls + [unnamed]:
+            await call.finish()
+
+
+class TestPromotion:
+    """Test which waiting model becomes resident when a slot frees up."""
+
+    @pytest.mark.asyncio
+    async def test_longest_waiting_model_goes_first(self, log):
+        """Test that queued models are promoted in order, each with all its calls."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1)
+        running = Call(scheduler, 'a', log)
+        await settle()
+        waiting = [Call(scheduler, 'b', log), Call(scheduler, 'c', log), Call(scheduler, 'b', log)]
+        await settle()
+
+        await running.finish()
+        await settle()
+        assert log == ['a', 'b', 'b']
+        assert scheduler.resident_models == ['b']
+
+        await waiting[0].finish()
+        await waiting[2].finish()
+        await settle()
+        assert log[-1] == 'c'
+        await waiting[1].finish()
+        assert scheduler.resident_models == ['c']
+
+    @pytest.mark.asyncio
+    async def test_fairness_window_stops_starvation(self, log):
+        """Test that once its window is up, the resident model stops taking new calls."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1, fairness_window=0)
+        running = Call(scheduler, 'a', log)
+        await settle()
+        waiting = Call(scheduler, 'b', log)
+        await settle()
+        late = Call(scheduler, 'a', log)
+        await settle()
+
+        assert log == ['a']
+        await running.finish()
+        await settle()
+        assert log == ['a', 'b']
+
+        await waiting.finish()
+        await settle()
+        assert log == ['a', 'b', 'a']
+        await late.finish()
+
+
+class TestCancellation:
+    """Test callers that give up while queued."""
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_the_queue(self, log):
+        """Test that a cancelled waiter is dropped and the next model still runs."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1)
+        running = Call(scheduler, 'a', log)
+        await settle()
+        gone, waiting = Call(scheduler, 'b', log), Call(scheduler, 'c', log)
+        await settle()
+
+        gone.task.cancel()
+        await settle()
+        await running.finish()
+        await settle()
+
+        assert log == ['a', 'c']
+        assert scheduler.resident_models == ['c']
+        await waiting.finish()
+
+    @pytest.mark.asyncio
+    async def test_promoted_model_without_callers_is_evicted(self, log):
+        """Test that a model whose queued callers were all cancelled does not stay resident."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1)
+        running = Call(scheduler, 'a', log)
+        await settle()
+        # b's caller was cancelled, but a drains before the caller's own cleanup runs
+        gone = asyncio.get_running_loop().create_future()
+        scheduler._waiters['b'] = deque([(0.0, gone)])
+        gone.cancel()
+        waiting = Call(scheduler, 'c', log)
+        await settle()
+
+        await running.finish()
+        await settle()
+
+        assert log == ['a', 'c']
+        assert scheduler.resident_models == ['c']
+        await waiting.finish()
+        assert scheduler.resident_models == ['c']
+
+        # Nothing queued: the next model is admitted straight away
+        fresh = Call(scheduler, 'd', log)
+        await settle()
+        assert fresh.admitted.is_set()
+        await fresh.finish()
+
+    @pytest.mark.asyncio
+    async def test_drained_model_whose_own_queue_left_yields(self, log):
+        """Test that a resident model kept for its own queue yields when that queue was cancelled."""
+        scheduler = ModelAffinityScheduler(max_resident_models=1, fairness_window=60)
+        running = Call(scheduler, 'a', log)
+        await settle()
+        waiting = Call(scheduler, 'b', log)
+        await settle()
+        # Queued behind b for the resident model, then cancelled before a drains
+        queued_a = asyncio.get_running_loop().create_future()
+        scheduler._waiters['a'] = deque([(0.0, queued_a)])
+        queued_a.cancel()
+
+        await running.finish()
+        await settle()
+
+        assert log == ['a', 'b']
+        assert scheduler.resident_models == ['b']
+        await waiting.finish()
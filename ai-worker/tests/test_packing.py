@@ -0,0 +1,227 @@
+"""
+Unit tests for multi-record packing
+
+Tests cover:
+- Grouping concurrent submissions per key, flushing at pack_size or after the window
+- A pack of one, a short answer and a failed runner falling back to single calls
+- Packing records into one LLM call and splitting the results back out
+- Dropping entries that are out of range, duplicated or missing schema fields
+- The pack_size bounds that decide whether a request is packed at all
+"""
+import asyncio
+import json
+
+import pytest
+
+from ai_pipeline.packing import PACKED_RECORDS, RecordPacker
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {'label': {'type': 'string'}},
+    'required': ['label'],
+}
+
+BLOCK = {
+    'id': 7,
+    'name': 'Classify',
+    'prompt': 'Classify this text: {text}',
+    'inputs': [{'variable_name': 'text', 'input_type': 'REQUEST_TEXT'}],
+    'output_schema': SCHEMA,
+}
+
+
+def packed(outcome):
+    return PACKED_RECORDS.labels(outcome=outcome)._value.get()
+
+
+class Runner:
+    """A pack runner that records the packs it is given and answers from a function"""
+
+    def __init__(self, answer=None):
+        self.packs = []
+        self.answer = answer or (lambda items: [item.upper() for item in items])
+
+    async def __call__(self, items):
+        self.packs.append(list(items))
+        return self.answer(items)
+
+
+class TestRecordPacker:
+    """Test how RecordPacker groups submissions and hands results back."""
+
+    @pytest.mark.asyncio
+    async def test_window_groups_concurrent_submissions(self):
+        """Test that submissions within the window share one run and get their own results."""
+        packer = RecordPacker(window=0.01)
+        run = Runner()
+
+        results = await asyncio.gather(*[packer.submit('key', 10, item, run) for item in ['a', 'b', 'c']])
+
+        assert results == ['A', 'B', 'C']
+        assert run.packs == [['a', 'b', 'c']]
+
+    @pytest.mark.asyncio
+    async def test_full_pack_flushes_without_waiting(self):
+        """Test that reaching pack_size runs the pack at once and starts a new one."""
+        packer = RecordPacker(window=60)
+        run = Runner()
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*[packer.submit('key', 2, item, run) for item in ['a', 'b', 'c', 'd']]),
+            timeout=1,
+        )
+
+        assert results == ['A', 'B', 'C', 'D']
+        assert run.packs == [['a', 'b'], ['c', 'd']]
+
+    @pytest.mark.asyncio
+    async def test_keys_are_packed_separately(self):
+        """Test that submissions for different keys never share a pack."""
+        packer = RecordPacker(window=0.01)
+        run = Runner()
+
+        await asyncio.gather(packer.submit('x', 10, 'a', run), packer.submit('y', 10, 'b', run),
+                             packer.submit('x', 10, 'c', run), packer.submit('y', 10, 'd', run))
+
+        assert sorted(run.packs) == [['a', 'c'], ['b', 'd']]
+
+    @pytest.mark.asyncio
+    async def test_pack_of_one_is_not_run(self):
+        """Test that a submission nobody joins gets None without calling the runner."""
+        packer = RecordPacker(window=0.01)
+        run = Runner()
+        before = packed('alone')
+
+        assert await packer.submit('key', 10, 'a', run) is None
+        assert run.packs == []
+        assert packed('alone') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_short_answer_falls_back(self):
+        """Test that items the runner did not answer get None."""
+        packer = RecordPacker(window=0.01)
+        run = Runner(lambda items: ['A', None])
+        before = packed('fallback')
+
+        results = await asyncio.gather(*[packer.submit('key', 10, item, run) for item in ['a', 'b', 'c']])
+
+        assert results == ['A', None, None]
+        assert packed('fallback') == before + 2
+
+    @pytest.mark.asyncio
+    async def test_runner_error_reaches_every_caller(self):
+        """Test that a failed pack raises in each submitter."""
+        packer = RecordPacker(window=0.01)
+
+        def fail(items):
+            raise RuntimeError("model unavailable")
+
+        results = await asyncio.gather(*[packer.submit('key', 10, item, Runner(fail)) for item in ['a', 'b']],
+                                       return_exceptions=True)
+
+        assert [str(result) for result in results] == ["model unavailable"] * 2
+
+
+def packed_answer(entries):
+    return json.dumps({'results': entries})
+
+
+class TestPackedBlock:
+    """Test _execute_packed_block's single call and how it splits the answer."""
+
+    @pytest.mark.asyncio
+    async def test_records_share_one_call(self, processor, llm):
+        """Test that all records go into one prompt and each gets its own result."""
+        llm.answer(packed_answer([{'index': 0, 'result': {'label': 'a'}},
+                                  {'index': 1, 'result': {'label': 'b'}}]),
+                   eval_count=30, prompt_eval_count=70)
+
+        results = await processor._execute_packed_block(BLOCK, 'gemma3:1b', ['first text', 'second text'])
+
+        assert len(llm.calls) == 1
+        prompt = llm.calls[0]['messages'][-1]['content']
+        assert '<record index="0">\nfirst text\n</record>' in prompt
+        assert '<record index="1">\nsecond text\n</record>' in prompt
+        assert [result['label'] for result in results] == ['a', 'b']
+        assert results[0]['_metadata']['tokens_used'] == 50
+        assert results[0]['_metadata']['packed_with'] == 2
+
+    @pytest.mark.asyncio
+    async def test_results_follow_their_index(self, processor, llm):
+        """Test that entries are matched by index, not by their position in the answer."""
+        llm.answer(packed_answer([{'index': 1, 'result': {'label': 'b'}},
+                                  {'index': 0, 'result': {'label': 'a'}}]))
+
+        results = await processor._execute_packed_block(BLOCK, 'gemma3:1b', ['x', 'y'])
+
+        assert [result['label'] for result in results] == ['a', 'b']
+
+    @pytest.mark.asyncio
+    async def test_missing_and_invalid_entries_fall_back(self, processor, llm):
+        """Test that unanswered, out-of-range, duplicate or incomplete entries leave None."""
+        llm.answer(packed_answer([
+            {'index': 0, 'result': {'label': 'a'}},
+            {'index': 0, 'result': {'label': 'again'}},
+            {'index': 1, 'result': {'other': 'field'}},
+            {'index': 9, 'result': {'label': 'nobody'}},
+            'not an entry',
+        ]), eval_count=10, prompt_eval_count=10)
+
+        results = await processor._execute_packed_block(BLOCK, 'gemma3:1b', ['x', 'y', 'z'])
+
+        assert results[0]['label'] == 'a'
+        assert results[1:] == [None, None]
+        # The one answered record carries the whole cost of the call
+        assert results[0]['_metadata']['tokens_used'] == 20
+
+    @pytest.mark.asyncio
+    async def test_answer_without_results_list_raises(self, processor, llm):
+        """Test that an answer of the wrong shape fails the whole pack."""
+        llm.answer('{"label": "a"}')
+
+        with pytest.raises(ValueError, match="no results list"):
+            await processor._execute_packed_block(BLOCK, 'gemma3:1b', ['x', 'y'])
+
+    @pytest.mark.asyncio
+    async def test_output_budget_scales_with_records(self, processor, llm):
+        """Test that a block's num_predict is given to each record in the pack."""
+        llm.answer(packed_answer([]))
+        block = dict(BLOCK, model_parameters={'max_tokens': 100})
+
+        await processor._execute_packed_block(block, 'gemma3:1b', ['x', 'y', 'z'])
+
+        assert llm.calls[0]['options']['num_predict'] == 300
+
+    @pytest.mark.asyncio
+    async def test_failed_pack_runs_request_alone(self, processor, llm, monkeypatch):
+        """Test that _execute_packed returns None when the packed call fails."""
+        monkeypatch.setattr('ai_pipeline.workflow_processor.record_packer', RecordPacker(window=0.01))
+        llm.answer('{"label": "a"}')
+
+        results = await asyncio.gather(processor._execute_packed(1, BLOCK, 'gemma3:1b', 'x', 4),
+                                       processor._execute_packed(1, BLOCK, 'gemma3:1b', 'y', 4))
+
+        assert results == [None, None]
+
+
+class TestPackSize:
+    """Test which requests _get_pack_size lets into a pack."""
+
+    @pytest.mark.parametrize('pack_size,expected', [(None, 0), (0, 0), (1, 0), (2, 2), (32, 32)])
+    def test_pack_size_bounds(self, processor, pack_size, expected):
+        """Test that packing needs a pack_size of at least two."""
+        assert processor._get_pack_size({'pack_size': pack_size}, [BLOCK], {}, 'short text') == expected
+
+    def test_multi_block_workflows_are_not_packed(self, processor):
+        """Test that packing only applies to single-block workflows."""
+        assert processor._get_pack_size({'pack_size': 4}, [BLOCK, BLOCK], {}, 'short text') == 0
+
+    def test_custom_instructions_are_not_packed(self, processor):
+        """Test that a request with its own instructions gets its own prompt."""
+        assert processor._get_pack_size({'pack_size': 4}, [BLOCK], {7: 'be brief'}, 'short text') == 0
+
+    def test_long_text_is_not_packed(self, processor, monkeypatch):
+        """Test that texts over PACK_MAX_TEXT_CHARS are not packed."""
+        monkeypatch.setattr('ai_pipeline.workflow_processor.settings.pack_max_text_chars', 10)
+        assert processor._get_pack_size({'pack_size': 4}, [BLOCK], {}, 'x' * 10) == 4
+        assert processor._get_pack_size({'pack_size': 4}, [BLOCK], {}, 'x' * 11) == 0
@@ -0,0 +1,156 @@
+"""
+Unit tests for block output validation and repair
+
+Tests cover:
+- Errors the compiled validator reports, with their paths
+- Repairing invalid output with a follow-up call, in repair mode
+- Failing the block in strict mode, and not checking at all when off
+- Skipping repair for output cut off by num_predict
+- Rejecting a result that is not a JSON object
+"""
+import json
+
+import pytest
+
+from ai_pipeline.schema_validation import MAX_ERRORS, get_validator
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'label': {'type': 'string', 'enum': ['low', 'high']},
+        'score': {'type': 'number', 'minimum': 0, 'maximum': 1},
+        'entities': {
+            'type': 'array',
+            'maxItems': 3,
+            'items': {'type': 'object', 'properties': {'name': {'type': 'string', 'minLength': 1}}, 'required': ['name']},
+        },
+    },
+    'required': ['label'],
+    'additionalProperties': False,
+}
+
+
+class TestSchemaValidator:
+    """Test the errors a compiled validator reports."""
+
+    def test_valid_output(self):
+        """Test that a matching result, with worker metadata, has no errors."""
+        result = {'label': 'low', 'score': 0.2, 'entities': [{'name': 'Acme'}], '_metadata': {}}
+        assert get_validator(SCHEMA).validate(result) == []
+
+    def test_errors_carry_paths(self):
+        """Test that each problem is reported once with the path to it."""
+        result = {'score': 2, 'entities': [{'name': ''}, {}, 'x', {}], 'extra': True}
+        errors = get_validator(SCHEMA).validate(result)
+        assert errors == [
+            "$: missing required field 'label'",
+            '$.score: 2 violates maximum 1',
+            '$.entities: allows at most 3 items, has 4',
+            '$.entities[0].name: shorter than 1 characters',
+            "$.entities[1]: missing required field 'name'",
+            '$.entities[2]: expected object, got string',
+            "$.entities[3]: missing required field 'name'",
+            "$: unexpected field 'extra'",
+        ]
+
+    @pytest.mark.parametrize('value,error', [
+        ({'label': 'medium'}, '$.label: "medium" is not one of ["low", "high"]'),
+        ({'label': 3}, '$.label: expected string, got integer'),
+        ({'label': 'low', 'score': True}, '$.score: expected number, got boolean'),
+    ])
+    def test_type_and_enum(self, value, error):
+        """Test that booleans are not numbers and enums are enforced."""
+        assert error in get_validator(SCHEMA).validate(value)
+
+    def test_any_of_and_error_limit(self):
+        """Test anyOf matching and that errors stop at MAX_ERRORS."""
+        schema = {'type': 'array', 'items': {'anyOf': [{'type': 'string'}, {'type': 'null'}]}}
+        validator = get_validator(schema)
+        assert validator.validate(['a', None]) == []
+        assert len(validator.validate([1] * (MAX_ERRORS + 5))) == MAX_ERRORS
+
+    def test_validators_are_cached_by_content(self):
+        """Test that equal schemas share one compiled validator."""
+        assert get_validator(json.loads(json.dumps(SCHEMA))) is get_validator(SCHEMA)
+
+
+@pytest.fixture
+def mode(monkeypatch):
+    def set_mode(value):
+        monkeypatch.setattr('ai_pipeline.workflow_processor.settings.schema_validation', value)
+    return set_mode
+
+
+class TestBlockRepair:
+    """Test _execute_block's validation and repair of model output."""
+
+    @pytest.mark.asyncio
+    async def test_repair_fixes_invalid_output(self, processor, llm, mode):
+        """Test that one repair call replaces invalid output and its tokens are counted."""
+        mode('repair')
+        llm.answer('{"label": "medium"}').answer('{"label": "high"}', eval_count=4, prompt_eval_count=6)
+
+        result = await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
+
+        assert result['label'] == 'high'
+        assert result['_metadata']['repaired'] is True
+        assert result['_metadata']['tokens_used'] == 30 + 10
+        assert 'schema_errors' not in result['_metadata']
+        repair_prompt = llm.calls[1]['messages'][0]['content']
+        assert '$.label: "medium" is not one of' in repair_prompt
+        assert llm.calls[1]['options']['temperature'] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_repair_keeps_output_with_errors(self, processor, llm, mode):
+        """Test that in repair mode an unrepaired result is returned with its errors."""
+        mode('repair')
+        llm.answer('{"label": "medium"}').answer('not json at all')
+
+        result = await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
+
+        assert result['label'] == 'medium'
+        assert 'repaired' not in result['_metadata']
+        assert result['_metadata']['schema_errors'][0].startswith('not valid JSON')
+
+    @pytest.mark.asyncio
+    async def test_strict_mode_fails_the_block(self, processor, llm, mode):
+        """Test that strict mode raises when repair does not fix the output."""
+        mode('strict')
+        llm.answer('{"label": "medium"}').answer('{"label": "medium"}')
+
+        with pytest.raises(Exception, match="does not match its schema"):
+            await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
+        assert len(llm.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_off_mode_does_not_check(self, processor, llm, mode):
+        """Test that with validation off no errors are reported and no repair is made."""
+        mode('off')
+        llm.answer('{"label": "medium", "extra": 1}')
+
+        result = await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
+
+        assert result['label'] == 'medium'
+        assert 'schema_errors' not in result['_metadata']
+        assert len(llm.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_truncated_output_is_not_repaired(self, processor, llm, mode):
+        """Test that output cut off by num_predict skips the repair call."""
+        mode('repair')
+        llm.answer('{"label": "medium"}', done_reason='length')
+
+        result = await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
+
+        assert len(llm.calls) == 1
+        assert result['_metadata']['schema_errors']
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('validation', ['off', 'repair'])
+    async def test_json_null_is_rejected(self, processor, llm, mode, validation):
+        """Test that a JSON null answer fails with a clear error, not a TypeError."""
+        mode(validation)
+        llm.answer('null').answer('null')
+
+        with pytest.raises(ValueError, match="returned NoneType instead of a JSON object"):
+            await processor._execute_block('Classify', 'classify', 'gemma3:1b', SCHEMA)
@@ -0,0 +1,161 @@
+"""
+Unit tests for per-call num_ctx / num_predict sizing
+
+Tests cover:
+- The output estimate from a block's output schema
+- Power-of-two context buckets and their clamping to MIN_NUM_CTX / MAX_NUM_CTX
+- Keeping the default context for prompts that fit, so the loaded model is reused
+- Never going below the block's own num_ctx, or above its own num_predict
+- Uncapped output for reasoning models, packed records, and sizing switched off
+"""
+import pytest
+
+from ai_pipeline.sizing import (
+    JSON_OVERHEAD_TOKENS,
+    TEMPLATE_OVERHEAD_TOKENS,
+    context_bucket,
+    estimate_output_tokens,
+    estimate_tokens,
+)
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'score': {'type': 'number'},
+        'flagged': {'type': 'boolean'},
+    },
+}
+SCHEMA_OUTPUT = JSON_OVERHEAD_TOKENS + 1024 + 16 + 16
+
+
+class TestEstimates:
+    """Test the token estimates sizing is based on."""
+
+    def test_prompt_tokens_round_up(self):
+        """Test that prompt characters are converted to tokens conservatively."""
+        assert estimate_tokens(0) == 0
+        assert estimate_tokens(10) == 4
+        assert estimate_tokens(3000) == 1000
+
+    def test_output_estimate_from_schema(self):
+        """Test that each property adds the budget for its type to the JSON overhead."""
+        assert estimate_output_tokens(SCHEMA) == SCHEMA_OUTPUT
+
+    def test_untyped_properties_get_the_large_budget(self):
+        """Test that properties of unknown type are budgeted like free text."""
+        schema = {'type': 'object', 'properties': {'a': {}, 'b': {'type': 'null'}, 'c': True}}
+        assert estimate_output_tokens(schema) == JSON_OVERHEAD_TOKENS + 3 * 1024
+
+    @pytest.mark.parametrize('schema', [
+        None, {}, {'type': 'array', 'items': {'type': 'string'}}, {'type': 'object'},
+        {'type': 'object', 'properties': {}},
+    ])
+    def test_no_estimate_without_properties(self, schema):
+        """Test that there is no output ceiling when the schema says nothing about the fields."""
+        assert estimate_output_tokens(schema) is None
+
+    @pytest.mark.parametrize('tokens,expected', [
+        (1, 4096), (4096, 4096), (4097, 8192), (8192, 8192), (20000, 32768), (100000, 32768),
+    ])
+    def test_context_bucket(self, tokens, expected):
+        """Test that buckets are powers of two within the minimum and maximum."""
+        assert context_bucket(tokens, 4096, 32768) == expected
+
+
+@pytest.fixture
+def sizing(monkeypatch):
+    """Sizing switched on with a 4096 default context and a 32768 maximum"""
+    monkeypatch.setattr('ai_pipeline.workflow_processor.settings.adaptive_context_enabled', True)
+    monkeypatch.setattr('ai_pipeline.workflow_processor.settings.min_num_ctx', 4096)
+    monkeypatch.setattr('ai_pipeline.workflow_processor.settings.max_num_ctx', 32768)
+    monkeypatch.setattr('ai_pipeline.workflow_processor.settings.default_output_tokens', 1024)
+
+
+class TestSizeOptions:
+    """Test the num_ctx and num_predict _size_options sets for a call."""
+
+    def test_disabled_by_default(self, processor, monkeypatch):
+        """Test that with sizing off the options are left alone."""
+        monkeypatch.setattr('ai_pipeline.workflow_processor.settings.adaptive_context_enabled', False)
+        options = {'temperature': 0.7}
+
+        assert processor._size_options(options, 100000, SCHEMA) == {}
+        assert options == {'temperature': 0.7}
+
+    def test_prompt_that_fits_keeps_default_context(self, processor, sizing):
+        """Test that a short prompt only gets the schema's output ceiling."""
+        options = {}
+
+        chosen = processor._size_options(options, 3000, SCHEMA)
+
+        assert options == {'num_predict': SCHEMA_OUTPUT}
+        assert chosen == {'num_ctx': None, 'num_predict': SCHEMA_OUTPUT, 'prompt_tokens_estimate': 1000}
+
+    def test_long_prompt_gets_a_bucket(self, processor, sizing):
+        """Test that prompt, output and template overhead together pick the bucket."""
+        options = {}
+        needed = 10000 + SCHEMA_OUTPUT + TEMPLATE_OVERHEAD_TOKENS
+
+        processor._size_options(options, 30000, SCHEMA)
+
+        assert needed > 8192
+        assert options['num_ctx'] == 16384
+
+    def test_context_is_clamped_to_the_maximum(self, processor, sizing):
+        """Test that a prompt too long for any bucket gets MAX_NUM_CTX."""
+        options = {}
+        processor._size_options(options, 300000, SCHEMA)
+        assert options['num_ctx'] == 32768
+
+    def test_default_output_is_assumed_without_schema(self, processor, sizing):
+        """Test that without an estimate DEFAULT_OUTPUT_TOKENS counts toward the context."""
+        options = {}
+        # 3072 prompt tokens + 1024 output + the template overhead is just over 4096
+        processor._size_options(options, 3072 * 3, None)
+        assert options == {'num_ctx': 8192}
+
+    def test_block_num_ctx_is_the_floor(self, processor, sizing):
+        """Test that the block's own num_ctx is kept for short prompts and is the smallest bucket."""
+        options = {'num_ctx': 8192}
+        assert processor._size_options(options, 300, SCHEMA)['num_ctx'] == 8192
+        assert options['num_ctx'] == 8192
+
+        options = {'num_ctx': 65536}
+        processor._size_options(options, 300000, SCHEMA)
+        assert options['num_ctx'] == 65536
+
+    @pytest.mark.parametrize('explicit,expected', [(500, 500), (100000, SCHEMA_OUTPUT)])
+    def test_block_num_predict_is_an_upper_bound(self, processor, sizing, explicit, expected):
+        """Test that num_predict is the smaller of the block's setting and the estimate."""
+        options = {'num_predict': explicit}
+        processor._size_options(options, 300, SCHEMA)
+        assert options['num_predict'] == expected
+
+    def test_reasoning_models_are_not_capped(self, processor, sizing):
+        """Test that without cap_output only the block's own num_predict applies."""
+        options = {}
+        assert processor._size_options(options, 300, SCHEMA, cap_output=False)['num_predict'] is None
+        assert 'num_predict' not in options
+
+        options = {'num_predict': 500}
+        processor._size_options(options, 300, SCHEMA, cap_output=False)
+        assert options['num_predict'] == 500
+
+    def test_packed_records_multiply_the_estimate(self, processor, sizing):
+        """Test that a packed call gets an output ceiling per record."""
+        options = {}
+        processor._size_options(options, 300, SCHEMA, records=3)
+        assert options['num_predict'] == 3 * SCHEMA_OUTPUT
+
+    @pytest.mark.asyncio
+    async def test_block_call_uses_the_sizing(self, processor, llm, sizing):
+        """Test that _execute_block sends the sized options and records them in the metadata."""
+        llm.answer('{"summary": "ok", "score": 0.5, "flagged": false}')
+
+        result = await processor._execute_block('Summarize ' + 'x' * 30000, 'Summarize', 'gemma3:1b', SCHEMA)
+
+        assert llm.calls[0]['options']['num_ctx'] == 16384
+        assert llm.calls[0]['options']['num_predict'] == SCHEMA_OUTPUT
+        assert result['_metadata']['num_ctx'] == 16384
+        assert result['_metadata']['num_predict'] == SCHEMA_OUTPUT
@@ -1,19 +1,24 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from contextlib import asynccontextmanager
 import structlog
 import asyncio
-import httpx
 import json
 from config import settings
 from ai_pipeline.workflow_processor import WorkflowProcessor
 from event_publisher import event_publisher
-import ollama
+from ai_pipeline.circuit_breaker import CircuitOpenError, backend_client, qdrant_breaker
+from ai_pipeline import cpu_pool
+from ai_pipeline.llm_client import llm_client
+from ai_pipeline.model_registry import model_registry
+from ai_pipeline.templates import BRACES, compile_template
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct
 import uuid
 import os
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Configure logging
 structlog.configure(
@@ -41,9 +46,16 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting TaskFlow AI Worker service")
     await event_publisher.connect()
+    lag_monitor = asyncio.create_task(cpu_pool.monitor_loop_lag())
+    if settings.preload_models_on_startup:
+        # Load models for active workflows in the background so the first
+        # task of a batch does not pay the cold model load
+        model_registry.schedule_preload_active_workflow_models()
     yield
     # Shutdown
     logger.info("Shutting down TaskFlow AI Worker service")
+    lag_monitor.cancel()
+    cpu_pool.shutdown()
     await event_publisher.disconnect()
 
 app = FastAPI(
@@ -80,6 +92,13 @@ async def process_request(request: ProcessRequest):
         else:
             raise HTTPException(status_code=400, detail=f"Unknown job type: {request.job_type}")
         
+    except CircuitOpenError as e:
+        # 503 tells the backend to hold the job rather than count a retry
+        logger.warning("Rejected job, dependency circuit open",
+                       request_id=request.request_id,
+                       job_type=request.job_type,
+                       error=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers=circuit_headers(e))
     except Exception as e:
         logger.error("Processing failed", 
                     request_id=request.request_id, 
@@ -88,13 +107,17 @@ async def process_request(request: ProcessRequest):
                     exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def circuit_headers(error: CircuitOpenError) -> Dict[str, str]:
+    """Mark a 503 as a circuit rejection, so the backend holds the job instead of failing it"""
+    return {"X-TaskFlow-Circuit": error.name, "Retry-After": str(int(error.retry_after + 0.999))}
+
 async def process_workflow_job(request: ProcessRequest):
     """Process a workflow job (existing logic)"""
     # Publish job started event
     await event_publisher.job_started(request.request_id, "WORKFLOW", str(request.workflow_id))
     
     # Get request text from backend API
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with backend_client(timeout=30.0) as client:
         response = await client.get(
             f"{settings.backend_api_url}/api/requests/{request.request_id}"
         )
@@ -106,9 +129,27 @@ async def process_workflow_job(request: ProcessRequest):
                request_id=request.request_id, 
                text_length=len(request_text))
     
+    result = await run_workflow(request.request_id, request.workflow_id, request_text)
+    
+    # Save AI output to database; the backend allocates the next version
+    version = await save_ai_output(request.request_id, result)
+    
+    logger.info("Processing completed successfully", 
+               request_id=request.request_id,
+               workflow_id=request.workflow_id,
+               version=version)
+    
+    # Check if embedding should be generated for this workflow
+    should_generate_embedding = await check_workflow_embedding_config(request.workflow_id)
+    await finish_workflow_job(request.request_id, request.workflow_id, version, should_generate_embedding)
+    
+    return {"status": "completed", "version": version}
+
+async def run_workflow(request_id: int, workflow_id: int, request_text: str, workflow_data: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Execute a workflow for one request, publishing progress events as blocks complete"""
     # Publish workflow started event
-    await event_publisher.publish_event(request.request_id, "workflow.started", {
-        "workflow_id": request.workflow_id
+    await event_publisher.publish_event(request_id, "workflow.started", {
+        "workflow_id": workflow_id
     })
     
     # Initialize workflow processor
@@ -116,11 +157,11 @@ async def process_workflow_job(request: ProcessRequest):
     
     # Set up progress callback
     async def on_step_complete(step_name: str, result: Any):
-        await event_publisher.workflow_step_completed(request.request_id, step_name, result)
+        await event_publisher.workflow_step_completed(request_id, step_name, result)
     
     async def on_progress(step_number: int, total_steps: int, current_step: str, progress: float, completed: bool = False):
         await event_publisher.job_progress(
-            request.request_id, 
+            request_id, 
             progress,
             f"Step {step_number}/{total_steps}: {current_step} {'✓' if completed else '...'}"
         )
@@ -128,58 +169,135 @@ async def process_workflow_job(request: ProcessRequest):
     workflow_processor.on_step_complete = on_step_complete
     workflow_processor.on_progress = on_progress
     
-    result = await workflow_processor.execute_workflow(
-        request.workflow_id, 
+    return await workflow_processor.execute_workflow(
+        workflow_id, 
         request_text,
-        request.request_id
+        request_id,
+        workflow_data=workflow_data
     )
-    # Get current version and increment
-    version = await get_next_version(request.request_id)
-    
-    # Save AI output to database
-    await save_ai_output(request.request_id, result, version)
-    
-    logger.info("Processing completed successfully", 
-               request_id=request.request_id,
-               workflow_id=request.workflow_id,
-               version=version)
-    
+
+async def finish_workflow_job(request_id: int, workflow_id: int, version: int, should_generate_embedding: bool):
+    """Announce a saved workflow result and queue its embedding job if the workflow wants one"""
     # Publish workflow completed event
-    await event_publisher.publish_event(request.request_id, "workflow.completed", {
-        "workflow_id": request.workflow_id,
+    await event_publisher.publish_event(request_id, "workflow.completed", {
+        "workflow_id": workflow_id,
         "version": version
     })
     
-    # Check if embedding should be generated for this workflow
-    should_generate_embedding = await check_workflow_embedding_config(request.workflow_id)
-    
     if should_generate_embedding:
         # Create embedding job after successful workflow completion
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with backend_client(timeout=10.0) as client:
                 response = await client.post(
                     f"{settings.backend_api_url}/api/internal/jobs",
                     json={
-                        "request_id": request.request_id,
+                        "request_id": request_id,
                         "job_type": "EMBEDDING"
                     }
                 )
                 if response.status_code == 200:
                     job_data = response.json()
                     logger.info("Created embedding job after workflow completion",
-                               request_id=request.request_id,
+                               request_id=request_id,
                                embedding_job_id=job_data.get("job_id"))
                 else:
                     logger.warning("Failed to create embedding job",
-                                 request_id=request.request_id,
+                                 request_id=request_id,
                                  status_code=response.status_code)
         except Exception as e:
             logger.error("Error creating embedding job after workflow",
-                        request_id=request.request_id,
+                        request_id=request_id,
                         error=str(e))
             # Don't fail the workflow if embedding job creation fails
+
+class ProcessBatchRequest(BaseModel):
+    workflow_id: int
+    request_ids: List[int]
+
+@app.post("/process/batch")
+async def process_batch(request: ProcessBatchRequest):
+    """Process several requests for the same workflow, pipelined through the model"""
     
-    return {"status": "completed", "version": version}
+    logger.info("Received batch processing request",
+                workflow_id=request.workflow_id,
+                size=len(request.request_ids))
+    
+    try:
+        return await process_workflow_batch(request)
+    except CircuitOpenError as e:
+        logger.warning("Rejected batch, dependency circuit open",
+                       workflow_id=request.workflow_id,
+                       error=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers=circuit_headers(e))
+    except Exception as e:
+        logger.error("Batch processing failed",
+                    workflow_id=request.workflow_id,
+                    error=str(e),
+                    exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def process_workflow_batch(request: ProcessBatchRequest):
+    """Run a batch of workflow jobs concurrently and save their outputs in one call
+    
+    Up to BATCH_MAX_IN_FLIGHT requests run at once, each working through the
+    blocks on its own, so one request's later blocks overlap the next one's
+    first block and the model never waits on per-job fetches and saves.
+    """
+    # One round trip each for the request texts, the workflow and its embedding config
+    async with backend_client(timeout=30.0) as client:
+        response = await client.post(
+            f"{settings.backend_api_url}/api/internal/requests/lookup",
+            json={"request_ids": request.request_ids}
+        )
+        response.raise_for_status()
+        request_rows = {row["id"]: row for row in response.json()}
+    
+    workflow_data = await WorkflowProcessor().get_workflow(request.workflow_id)
+    should_generate_embedding = await check_workflow_embedding_config(request.workflow_id)
+    
+    in_flight = asyncio.Semaphore(settings.batch_max_in_flight)
+    
+    async def run_one(request_id: int) -> Dict[str, Any]:
+        row = request_rows.get(request_id)
+        if row is None:
+            return {"request_id": request_id, "status": "failed", "error": "Request not found"}
+        async with in_flight:
+            await event_publisher.job_started(request_id, "WORKFLOW", str(request.workflow_id))
+            try:
+                result = await run_workflow(request_id, request.workflow_id, row["text"], workflow_data)
+            except CircuitOpenError as e:
+                # The backend holds this job until the dependency recovers
+                return {"request_id": request_id, "status": "unavailable", "error": str(e),
+                        "circuit": e.name, "retry_after": e.retry_after}
+            except Exception as e:
+                logger.error("Batch item failed", request_id=request_id, error=str(e))
+                return {"request_id": request_id, "status": "failed", "error": str(e)}
+        return {"request_id": request_id, "status": "completed", "result": result}
+    
+    outcomes = await asyncio.gather(*[run_one(request_id) for request_id in request.request_ids])
+    completed = [outcome for outcome in outcomes if outcome["status"] == "completed"]
+    
+    if completed:
+        # Serializing a batch of results is CPU work; keep it off the event loop
+        versions = await save_ai_outputs_bulk(await cpu_pool.run_cpu(lambda: [
+            build_ai_output(outcome["request_id"], outcome.pop("result"))
+            for outcome in completed
+        ]))
+        # The backend allocates versions under a lock and answers in the order sent
+        for outcome, version in zip(completed, versions):
+            outcome["version"] = version
+        await asyncio.gather(*[
+            finish_workflow_job(outcome["request_id"], request.workflow_id, outcome["version"],
+                                should_generate_embedding)
+            for outcome in completed
+        ])
+    
+    logger.info("Batch processing completed",
+                workflow_id=request.workflow_id,
+                size=len(outcomes),
+                completed=len(completed))
+    
+    return {"results": outcomes}
 
 async def process_embedding_job(request_id: int):
     """Process a single embedding generation job"""
@@ -191,7 +309,7 @@ async def process_embedding_job(request_id: int):
         await event_publisher.embedding_progress(request_id, "PROCESSING", 0.1, "Fetching request data")
         
         # Get request data with workflow output
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with backend_client(timeout=30.0) as client:
             response = await client.get(
                 f"{settings.backend_api_url}/api/requests/{request_id}"
             )
@@ -207,7 +325,7 @@ async def process_embedding_job(request_id: int):
         if not workflow_id:
             raise ValueError("No workflow assigned to request")
             
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with backend_client(timeout=30.0) as client:
             response = await client.get(
                 f"{settings.backend_api_url}/api/workflows/{workflow_id}/embedding-config"
             )
@@ -269,6 +387,9 @@ async def process_embedding_job(request_id: int):
         
         return {"status": "completed", "embedding_id": embedding_id}
         
+    except CircuitOpenError:
+        # Not a failure: the backend holds the job and runs it again once the circuit closes
+        raise
     except Exception as e:
         logger.error("Embedding generation failed", 
                     request_id=request_id, 
@@ -313,8 +434,7 @@ async def generate_and_store_embedding(task_id: int, task_data: Dict[str, Any])
     await event_publisher.embedding_progress(task_id, "PROCESSING", 0.6, "Calling Ollama for embedding generation")
     
     # Generate embedding using Ollama
-    ollama_client = ollama.AsyncClient(host=settings.ollama_host)
-    response = await ollama_client.embeddings(
+    response = await llm_client.embeddings(
         model="nomic-embed-text",
         prompt=text
     )
@@ -328,27 +448,28 @@ async def generate_and_store_embedding(task_id: int, task_data: Dict[str, Any])
     qdrant_client = QdrantClient(url=qdrant_url)
     
     point_id = str(uuid.uuid4())
-    qdrant_client.upsert(
-        collection_name="tasks",
-        points=[
-            PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload={
-                    "task_id": task_id,
-                    "title": task_data.get("title", ""),
-                    "description": task_data.get("description", ""),
-                    "priority": task_data.get("priority", ""),
-                    "status": task_data.get("status", ""),
-                    "tags": task_data.get("tags", []),
-                    "exercise_id": task_data.get("exercise_id"),
-                    "created_at": task_data.get("created_at", ""),
-                    "workflow_output": task_data.get("workflow_output"),  # Store workflow output for RAG search
-                    "embedding_text": text  # Store the text used for embedding
-                }
-            )
-        ]
-    )
+    async with qdrant_breaker.guard():
+        qdrant_client.upsert(
+            collection_name="tasks",
+            points=[
+                PointStruct(
+                    id=point_id,
+                    vector=embedding,
+                    payload={
+                        "task_id": task_id,
+                        "title": task_data.get("title", ""),
+                        "description": task_data.get("description", ""),
+                        "priority": task_data.get("priority", ""),
+                        "status": task_data.get("status", ""),
+                        "tags": task_data.get("tags", []),
+                        "exercise_id": task_data.get("exercise_id"),
+                        "created_at": task_data.get("created_at", ""),
+                        "workflow_output": task_data.get("workflow_output"),  # Store workflow output for RAG search
+                        "embedding_text": text  # Store the text used for embedding
+                    }
+                )
+            ]
+        )
     
     # Update progress
     await event_publisher.embedding_progress(task_id, "PROCESSING", 0.95, "Finalizing embedding storage")
@@ -358,7 +479,7 @@ async def generate_and_store_embedding(task_id: int, task_data: Dict[str, Any])
 async def update_embedding_status(request_id: int, status: str):
     """Update the embedding status for a request"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with backend_client(timeout=10.0) as client:
             response = await client.patch(
                 f"{settings.backend_api_url}/api/internal/requests/{request_id}/embedding-status",
                 json={"embedding_status": status}
@@ -372,7 +493,7 @@ async def update_embedding_status(request_id: int, status: str):
 
 async def notify_embedding_complete(request_id: int, embedding_id: str):
     """Notify backend that embedding is complete"""
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with backend_client(timeout=10.0) as client:
         response = await client.post(
             f"{settings.backend_api_url}/api/internal/callbacks/embedding-complete",
             json={
@@ -383,26 +504,6 @@ async def notify_embedding_complete(request_id: int, embedding_id: str):
         )
         response.raise_for_status()
 
-async def get_next_version(request_id: int) -> int:
-    """Get the next version number for AI output"""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{settings.backend_api_url}/api/requests/{request_id}"
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Get the latest AI output version
-            if data.get("latest_ai_output"):
-                return data["latest_ai_output"]["version"] + 1
-            else:
-                return 1
-                
-    except Exception as e:
-        logger.warning("Failed to get current version, defaulting to 1", error=str(e))
-        return 1
-
 def _format_block_output(block_output):
     """Format block output for human-readable text without JSON syntax"""
     if isinstance(block_output, dict):
@@ -440,26 +541,30 @@ async def generate_embedding_text(request_id: int, request_text: str, workflow_o
         # Default template if none provided
         template = "Request: {request_text}\n\nAnalysis: {workflow_output}"
     
+    compiled = compile_template(template, BRACES)
+    needed = set(compiled.placeholders)
+    
     # Create a context dictionary for template substitution
     context = {
         "request_id": request_id,
-        "request_text": request_text,
-        "workflow_output": _format_workflow_output(workflow_output)
+        "request_text": request_text
     }
+    if "workflow_output" in needed:
+        context["workflow_output"] = _format_workflow_output(workflow_output)
     
-    # Add individual workflow block outputs to context
+    # Add the workflow block outputs the template refers to
     for block_name, block_output in workflow_output.items():
-        safe_name = block_name.replace(" ", "_").lower()
+        safe_name = f"block_{block_name.replace(' ', '_').lower()}"
+        if safe_name not in needed and block_name not in needed:
+            continue
         formatted_output = _format_block_output(block_output)
         
         # Add both formats for compatibility
-        context[f"block_{safe_name}"] = formatted_output
+        context[safe_name] = formatted_output
         context[block_name] = formatted_output  # Also add with original block name
     
-    # Simple template substitution
-    embedding_text = template
-    for key, value in context.items():
-        embedding_text = embedding_text.replace(f"{{{key}}}", str(value))
+    # Single-pass template substitution
+    embedding_text = compiled.render(context)
     
     return embedding_text
 
@@ -469,7 +574,7 @@ async def check_workflow_embedding_config(workflow_id: int) -> bool:
         return False
         
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with backend_client(timeout=10.0) as client:
             response = await client.get(
                 f"{settings.backend_api_url}/api/workflows/{workflow_id}/embedding-config"
             )
@@ -483,8 +588,41 @@ async def check_workflow_embedding_config(workflow_id: int) -> bool:
                       error=str(e))
         return False
 
-async def save_ai_output(request_id: int, result: dict, version: int):
-    """Save AI processing result to database"""
+async def save_ai_output(request_id: int, result: dict) -> int:
+    """Save AI processing result to database and return the version it was given"""
+    
+    ai_output_data = await cpu_pool.run_cpu(build_ai_output, request_id, result)
+    
+    # Save to database via backend API
+    async with backend_client(timeout=30.0) as client:
+        response = await client.post(
+            f"{settings.backend_api_url}/api/internal/ai-outputs",
+            json=ai_output_data
+        )
+        response.raise_for_status()
+        version = response.json()["version"]
+    
+    logger.info("AI output saved successfully", 
+               request_id=request_id, 
+               version=version,
+               tokens_used=ai_output_data["tokens_used"],
+               duration_ms=ai_output_data["duration_ms"])
+    return version
+
+async def save_ai_outputs_bulk(ai_outputs: List[Dict[str, Any]]) -> List[int]:
+    """Save the AI outputs of a whole batch in one request and return their versions in order"""
+    async with backend_client(timeout=30.0) as client:
+        response = await client.post(
+            f"{settings.backend_api_url}/api/internal/ai-outputs/bulk",
+            json={"outputs": ai_outputs}
+        )
+        response.raise_for_status()
+    
+    logger.info("AI outputs saved in bulk", count=len(ai_outputs))
+    return [output["version"] for output in response.json()]
+
+def build_ai_output(request_id: int, result: dict) -> Dict[str, Any]:
+    """Build the AI output record for a workflow result, moving block metadata into totals"""
     
     # Extract metadata
     total_tokens = 0
@@ -500,7 +638,6 @@ async def save_ai_output(request_id: int, result: dict, version: int):
     
     ai_output_data = {
         "request_id": request_id,
-        "version": version,
         "summary": json.dumps(result),  # Store all workflow results
         "topic": None,  # Deprecated field
         "sensitivity_score": None,  # Deprecated field
@@ -510,35 +647,35 @@ async def save_ai_output(request_id: int, result: dict, version: int):
         "tokens_used": total_tokens,
         "duration_ms": total_duration
     }
-    
-    # Save to database via backend API
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            f"{settings.backend_api_url}/api/internal/ai-outputs",
-            json=ai_output_data
-        )
-        response.raise_for_status()
-    
-    logger.info("AI output saved successfully", 
-               request_id=request_id, 
-               version=version,
-               tokens_used=total_tokens,
-               duration_ms=total_duration)
+    return ai_output_data
 
 @app.get("/healthz")
 async def health_check():
     """Health check endpoint"""
     try:
-        # Test Ollama connection
-        import ollama
-        client = ollama.AsyncClient(host=settings.ollama_host)
-        await client.list()
+        # Test Ollama connection (served from the model registry cache within its TTL)
+        await model_registry.list_models()
         
         return {"status": "healthy", "service": "taskflow-ai", "ollama": "connected"}
     except Exception as e:
         logger.error("Health check failed", error=str(e))
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+class PreloadModelsRequest(BaseModel):
+    models: List[str]
+
+@app.post("/models/preload")
+async def preload_models(request: PreloadModelsRequest):
+    """Load models into memory and pin them with keep_alive"""
+    model_registry.invalidate()
+    model_registry.schedule_preload(request.models)
+    return {"status": "accepted", "models": request.models}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 
 if __name__ == "__main__":
     import uvicorn
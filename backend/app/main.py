@@ -28,6 +28,7 @@ from app.routers import (
 )
 from app.routers import settings as settings_router
 from app.routers import user_preferences, webhooks, workflow_embedding, workflows
+from app.services.model_registry import model_registry
 
 try:
     from app.routers import config_api
@@ -66,11 +67,12 @@ REQUEST_DURATION = Histogram("api_request_duration_seconds", "API request durati
 async def check_stuck_jobs():
     """Periodically check for stuck PENDING jobs and retry them"""
     from datetime import datetime, timedelta
+    from typing import cast
 
     from sqlalchemy import and_, select
 
     from app.models.database import get_db_session
-    from app.models.schemas import JobStatus, ProcessingJob
+    from app.models.schemas import JobStatus, JobType, ProcessingJob
     from app.services.job_service import JobService, job_queue_manager
 
     while True:
@@ -115,7 +117,9 @@ async def check_stuck_jobs():
                                 f"(created {job.created_at}, never started)"
                             )
                             await job_queue_manager.add_job(
-                                str(job.id), job_service._process_job(str(job.id))
+                                str(job.id),
+                                job_service._process_job(str(job.id)),
+                                cast(JobType, job.job_type),
                             )
                         else:
                             logger.info(
@@ -145,6 +149,11 @@ async def lifespan(app: FastAPI):
     await event_bus.connect()
     await event_bridge.start()
 
+    # Start sending queued webhook deliveries
+    from app.services.webhook_delivery import webhook_delivery_worker
+
+    await webhook_delivery_worker.start()
+
     # Start background task for checking stuck jobs
     stuck_job_checker = asyncio.create_task(check_stuck_jobs())
 
@@ -158,6 +167,8 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
 
+    await webhook_delivery_worker.stop()
+
     # Stop event bridge and bus
     await event_bridge.stop()
     await event_bus.disconnect()
@@ -227,36 +238,7 @@ async def test_endpoint():
 @app.get("/api/models/ollama")
 async def get_available_models():
     """Get available models from Ollama"""
-    import os
-
-    import httpx
-
-    try:
-        ollama_host = os.getenv("OLLAMA_HOST", "http://ollama-service:11434")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{ollama_host}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = []
-                for model in data.get("models", []):
-                    models.append(
-                        {
-                            "name": model["name"],
-                            "size": model.get("size", 0),
-                            "modified_at": model.get("modified_at"),
-                            "digest": model.get("digest"),
-                            "details": model.get("details", {}),
-                        }
-                    )
-                return {"models": models, "total": len(models)}
-            else:
-                return {
-                    "models": [],
-                    "total": 0,
-                    "error": "Failed to fetch models from Ollama",
-                }
-    except Exception as e:
-        return {"models": [], "total": 0, "error": str(e)}
+    return await model_registry.list_models()
 
 
 # Include routers
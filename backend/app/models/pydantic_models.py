@@ -212,6 +212,20 @@ class BulkRerunResponse(BaseModel):
     errors: List[BulkRerunError]
 
 
+class StreamSubscriptionUpdate(BaseModel):
+    add: List[int] = []
+    remove: List[int] = []
+    # Add every request of this exercise
+    exercise_id: Optional[int] = None
+
+
+class StreamSubscriptionResponse(BaseModel):
+    stream_id: str
+    # False when the stream is held by another API replica and the change was forwarded
+    applied: bool
+    request_ids: Optional[List[int]] = None
+
+
 # AI Pipeline Models
 class BasicMetadata(BaseModel):
     word_count: int
@@ -260,6 +274,8 @@ class WorkflowBlockInputRequest(BaseModel):
     input_type: str  # "REQUEST_TEXT" or "BLOCK_OUTPUT"
     source_block_id: Optional[int] = None
     variable_name: str = Field(..., min_length=1, max_length=64)
+    # Dotted path into the source block's output; only that value reaches the prompt
+    source_field: Optional[str] = Field(None, min_length=1, max_length=256)
 
 
 class WorkflowBlockRequest(BaseModel):
@@ -267,10 +283,11 @@ class WorkflowBlockRequest(BaseModel):
     prompt: str = Field(..., min_length=1)
     system_prompt: Optional[str] = None
     order: int = Field(..., ge=0)
-    block_type: str = "CUSTOM"  # "CORE" or "CUSTOM"
+    block_type: str = "CUSTOM"  # "CORE", "CUSTOM" or "MAP"
     output_schema: Optional[Dict[str, Any]] = None
     model_name: Optional[str] = Field(None, max_length=128)
     model_parameters: Optional[Dict[str, Any]] = None
+    execution_options: Optional[Dict[str, Any]] = None
     inputs: List[WorkflowBlockInputRequest] = []
 
     class Config:
@@ -281,6 +298,7 @@ class CreateWorkflowRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=128)
     description: Optional[str] = None
     is_default: bool = False
+    pack_size: Optional[int] = Field(None, ge=1, le=32)
     blocks: List[WorkflowBlockRequest] = []
 
 
@@ -289,6 +307,7 @@ class UpdateWorkflowRequest(BaseModel):
     description: Optional[str] = None
     status: Optional[str] = None
     is_default: Optional[bool] = None
+    pack_size: Optional[int] = Field(None, ge=1, le=32)
     blocks: Optional[List[WorkflowBlockRequest]] = None
 
 
@@ -297,6 +316,7 @@ class WorkflowBlockInputResponse(BaseModel):
     input_type: str
     source_block_id: Optional[int]
     variable_name: str
+    source_field: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -313,6 +333,7 @@ class WorkflowBlockResponse(BaseModel):
     output_schema: Optional[Dict[str, Any]]
     model_name: Optional[str]
     model_parameters: Optional[Dict[str, Any]]
+    execution_options: Optional[Dict[str, Any]] = None
     inputs: List[WorkflowBlockInputResponse]
     created_at: datetime
     updated_at: datetime
@@ -328,6 +349,7 @@ class WorkflowResponse(BaseModel):
     description: Optional[str]
     status: str
     is_default: bool
+    pack_size: Optional[int] = None
     created_by: int
     blocks: List[WorkflowBlockResponse]
     created_at: datetime
@@ -70,6 +70,7 @@ class EmbeddingStatus(str, enum.Enum):
 class BlockType(str, enum.Enum):
     CORE = "CORE"
     CUSTOM = "CUSTOM"
+    MAP = "MAP"  # Runs its prompt once per item of an upstream list
 
 
 class DashboardLayout(str, enum.Enum):
@@ -216,6 +217,8 @@ class Workflow(Base):
         Enum(WorkflowStatus, name="workflow_status"), default=WorkflowStatus.DRAFT
     )
     is_default = Column(Boolean, default=False, nullable=False)
+    # Requests packed into one LLM call in batch execution mode (NULL disables packing)
+    pack_size = Column(Integer, nullable=True)
     created_by = Column(BigInteger, ForeignKey("users.id"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.current_timestamp())
     updated_at = Column(
@@ -260,6 +263,8 @@ class WorkflowBlock(Base):
     model_parameters = Column(
         JSON, nullable=True
     )  # Model-specific parameters (temperature, max_tokens, etc.)
+    # Worker execution settings (prompt layout, long-input handling, etc.)
+    execution_options = Column(JSON, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.current_timestamp())
     updated_at = Column(
         TIMESTAMP(timezone=True),
@@ -289,6 +294,7 @@ class WorkflowBlockInput(Base):
         BigInteger, ForeignKey("workflow_blocks.id"), nullable=True
     )  # Only for BLOCK_OUTPUT type
     variable_name = Column(String(64), nullable=False)  # Name to use in prompt template
+    source_field = Column(String(256), nullable=True)  # Path into the source block output
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.current_timestamp())
 
     # Relationships
@@ -456,6 +462,9 @@ class WebhookDelivery(Base):
     error_message = Column(Text, nullable=True)
     delivered_at = Column(TIMESTAMP(timezone=True), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.current_timestamp())
+    # Outbox scheduling: when a pending delivery is due, and the lease of the worker sending it
+    next_attempt_at = Column(TIMESTAMP(timezone=True), server_default=func.current_timestamp())
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=True)
 
     # Relationships
     webhook = relationship("Webhook", back_populates="deliveries")
@@ -87,6 +87,7 @@ class WebhookDeliveryResponse(BaseModel):
     error_message: Optional[str]
     delivered_at: Optional[datetime]
     created_at: datetime
+    next_attempt_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
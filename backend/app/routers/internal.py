@@ -1,9 +1,9 @@
-from typing import Optional, cast
+from typing import Dict, List, Optional, cast
 
 import structlog
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import get_db
@@ -16,29 +16,45 @@ router = APIRouter(prefix="/api/internal", tags=["internal"])
 
 
 class CreateAIOutputRequest(BaseModel):
+    # The version is allocated here, so concurrent jobs for a request never share one
     request_id: int
-    version: int
     summary: Optional[str]  # JSON string containing all workflow outputs
     model_name: Optional[str]
     tokens_used: Optional[int]
     duration_ms: Optional[int]
 
 
+async def _allocate_versions(db: AsyncSession, request_ids: List[int]) -> Dict[int, int]:
+    """Next AI output version per request, with the request rows locked until commit"""
+    # Locking in id order keeps concurrent batches from deadlocking on each other
+    found = await db.scalars(
+        select(Request.id)
+        .where(Request.id.in_(set(request_ids)))
+        .order_by(Request.id)
+        .with_for_update()
+    )
+    missing = set(request_ids) - set(found.all())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Requests not found: {sorted(missing)}")
+
+    latest = await db.execute(
+        select(AIOutput.request_id, func.max(AIOutput.version))
+        .where(AIOutput.request_id.in_(set(request_ids)))
+        .group_by(AIOutput.request_id)
+    )
+    return {request_id: (version or 0) + 1 for request_id, version in latest.all()}
+
+
 @router.post("/ai-outputs", response_model=AIOutputResponse)
 async def create_ai_output(ai_output: CreateAIOutputRequest, db: AsyncSession = Depends(get_db)):
-    """Create AI output record (internal API for AI worker)"""
+    """Create AI output record with the request's next version (internal API for AI worker)"""
 
-    # Verify request exists
-    result = await db.execute(select(Request).where(Request.id == ai_output.request_id))
-    request = result.scalar_one_or_none()
-
-    if not request:
-        raise HTTPException(status_code=404, detail="Request not found")
+    versions = await _allocate_versions(db, [ai_output.request_id])
 
     # Create AI output
     output = AIOutput(
         request_id=ai_output.request_id,
-        version=ai_output.version,
+        version=versions.get(ai_output.request_id, 1),
         summary=ai_output.summary,
         model_name=ai_output.model_name,
         tokens_used=ai_output.tokens_used,
@@ -52,13 +68,72 @@ async def create_ai_output(ai_output: CreateAIOutputRequest, db: AsyncSession =
     logger.info(
         "AI output created",
         request_id=ai_output.request_id,
-        version=ai_output.version,
+        version=output.version,
         ai_output_id=output.id,
     )
 
     return AIOutputResponse.from_orm(output)
 
 
+class BulkCreateAIOutputsRequest(BaseModel):
+    outputs: List[CreateAIOutputRequest]
+
+
+@router.post("/ai-outputs/bulk", response_model=List[AIOutputResponse])
+async def create_ai_outputs_bulk(
+    bulk_request: BulkCreateAIOutputsRequest, db: AsyncSession = Depends(get_db)
+):
+    """Create AI output records for a whole batch in one transaction (internal API for AI worker)
+
+    Each output gets its request's next version; results come back in the order sent.
+    """
+
+    versions = await _allocate_versions(
+        db, [ai_output.request_id for ai_output in bulk_request.outputs]
+    )
+    rows = []
+    for ai_output in bulk_request.outputs:
+        version = versions.get(ai_output.request_id, 1)
+        versions[ai_output.request_id] = version + 1
+        rows.append({**ai_output.model_dump(), "version": version})
+
+    # One INSERT ... RETURNING for the whole batch
+    created = await db.scalars(
+        insert(AIOutput).returning(AIOutput, sort_by_parameter_order=True), rows
+    )
+    outputs = created.all()
+    await db.commit()
+
+    logger.info("AI outputs created in bulk", count=len(outputs))
+
+    return [AIOutputResponse.from_orm(output) for output in outputs]
+
+
+class RequestLookupRequest(BaseModel):
+    request_ids: List[int]
+
+
+class RequestLookupItem(BaseModel):
+    id: int
+    text: str
+    workflow_id: Optional[int]
+
+
+@router.post("/requests/lookup", response_model=List[RequestLookupItem])
+async def lookup_requests(lookup: RequestLookupRequest, db: AsyncSession = Depends(get_db)):
+    """Fetch text for many requests (internal API for AI worker)"""
+
+    result = await db.execute(
+        select(Request.id, Request.text, Request.workflow_id).where(
+            Request.id.in_(lookup.request_ids)
+        )
+    )
+
+    return [
+        RequestLookupItem(id=row.id, text=row.text, workflow_id=row.workflow_id) for row in result
+    ]
+
+
 class UpdateEmbeddingStatusRequest(BaseModel):
     embedding_status: str
 
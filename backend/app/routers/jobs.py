@@ -7,13 +7,17 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy import delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.database import get_db
-from app.models.schemas import ProcessingJob
-from app.services.job_service import JobService
+from app.models.database import get_db, get_db_session
+from app.models.schemas import JobStatus, ProcessingJob
+from app.services.job_progress import job_progress_hub
+from app.services.job_service import JobService, job_status_event
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
+# A progress stream with no status event for this long sends a keepalive and re-reads the job
+RESYNC_SECONDS = 30.0
+
 
 @router.get("/{job_id}")
 async def get_job_status(job_id: str, db: AsyncSession = Depends(get_db)):
@@ -29,52 +33,52 @@ async def get_job_status(job_id: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{job_id}/stream")
-async def stream_job_progress(job_id: str, db: AsyncSession = Depends(get_db)):
-    """Stream job progress using Server-Sent Events"""
+async def stream_job_progress(job_id: str):
+    """Stream job progress using Server-Sent Events
 
-    async def event_generator():
-        job_service = JobService(db)
-        last_status = None
+    Sends the job's current state, then each state change as JobService
+    publishes it. The database is read once up front and again only after a
+    quiet interval, instead of polled, and no session is held while streaming.
+    """
 
-        while True:
-            try:
-                job_status = await job_service.get_job_status(job_id)
+    async def read_status():
+        async with get_db_session() as db:
+            job_status = await JobService(db).get_job_status(job_id)
+        return job_status_event(job_status) if job_status else None
 
-                if not job_status:
+    async def event_generator():
+        try:
+            # Watch before reading the snapshot, so no change in between is missed
+            async with job_progress_hub.watch(job_id) as updates:
+                event = await read_status()
+                if not event:
                     yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
-                    break
-
-                # Only send updates when status changes
-                current_status = job_status.status
-                if current_status != last_status:
-                    data = {
-                        "job_id": job_status.job_id,
-                        "request_id": job_status.request_id,
-                        "status": job_status.status.value,
-                        "error_message": job_status.error_message,
-                        "started_at": (
-                            job_status.started_at.isoformat() if job_status.started_at else None
-                        ),
-                        "completed_at": (
-                            job_status.completed_at.isoformat() if job_status.completed_at else None
-                        ),
-                        "created_at": job_status.created_at.isoformat(),
-                    }
-
-                    yield f"data: {json.dumps(data)}\n\n"
-                    last_status = current_status
-
-                # Stop streaming if job is completed or failed
-                if current_status in ["COMPLETED", "FAILED"]:
-                    break
-
-                # Wait before next poll
-                await asyncio.sleep(2)
-
-            except Exception as e:
-                logger.error("Error streaming job progress", job_id=job_id, error=str(e))
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                break
+                    return
+
+                last_status = None
+                while True:
+                    # Only send updates when status changes
+                    if event["status"] != last_status:
+                        yield f"data: {json.dumps(event)}\n\n"
+                        last_status = event["status"]
+
+                    # Stop streaming if job is completed or failed
+                    if last_status in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                        return
+
+                    try:
+                        update = await asyncio.wait_for(updates.get(), timeout=RESYNC_SECONDS)
+                        event = {key: value for key, value in update.items() if key != "type"}
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                        # Re-read in case a status event was lost
+                        event = await read_status() or event
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error streaming job progress", job_id=job_id, error=str(e))
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
     return StreamingResponse(
         event_generator(),
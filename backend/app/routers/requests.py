@@ -4,7 +4,7 @@ from datetime import date, datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional, Union, cast
 
 import pandas as pd
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
 from pydantic import BaseModel
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -33,6 +33,8 @@ from app.models.pydantic_models import (
 )
 from app.models.pydantic_models import RequestStatus as PydanticRequestStatus
 from app.models.pydantic_models import (
+    StreamSubscriptionResponse,
+    StreamSubscriptionUpdate,
     UpdateRequestRequest,
     UpdateRequestStatusRequest,
     UserResponse,
@@ -65,6 +67,15 @@ import json
 
 import structlog
 
+from app.services.request_streams import (
+    StreamSubscriptionError,
+    add_requests,
+    forward_update,
+    keep_stream_registered,
+    register_stream,
+    unregister_stream,
+    update_stream,
+)
 from app.services.sse_manager import create_sse_response, sse_manager
 
 logger = structlog.get_logger()
@@ -533,9 +544,78 @@ async def get_request(request_id: int, db: AsyncSession = Depends(get_db)):
     )
 
 
+@router.get("/events/stream")
+async def multiplexed_request_events(
+    request_ids: List[int] = Query([]),
+    exercise_id: Optional[int] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream real-time updates for many requests over one Server-Sent Events connection
+
+    Events carry their request_id. The first event, ``connected``, carries the
+    stream_id used to change the watched requests with PUT /events/stream/{stream_id}.
+    Events missed since Last-Event-ID (header, or ``last_event_id``) are replayed first.
+    """
+    client = await sse_manager.connect()
+    try:
+        await add_requests(db, client, request_ids, exercise_id)
+        await sse_manager.replay_missed(client, last_event_id_header or last_event_id)
+    except StreamSubscriptionError as e:
+        await sse_manager.disconnect(None, client)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        await sse_manager.disconnect(None, client)
+        raise
+    # Registered before the connected event reaches the browser, so updates can follow at once
+    await register_stream(client.stream_id)
+
+    async def event_generator():
+        refresh = asyncio.create_task(keep_stream_registered(client.stream_id))
+        try:
+            async for event in sse_manager.generate_events(client):
+                yield event
+        finally:
+            refresh.cancel()
+            await unregister_stream(client.stream_id)
+            await sse_manager.disconnect(None, client)
+
+    return create_sse_response(event_generator())
+
+
+@router.put("/events/stream/{stream_id}", response_model=StreamSubscriptionResponse)
+async def update_request_event_stream(
+    stream_id: str, update: StreamSubscriptionUpdate, db: AsyncSession = Depends(get_db)
+):
+    """Add or remove requests on an open multiplexed stream without reconnecting"""
+    client = sse_manager.get_stream(stream_id)
+    if client is None:
+        # The stream may be held by another API replica
+        if not await forward_update(stream_id, update.model_dump()):
+            raise HTTPException(status_code=404, detail="Event stream not found")
+        return StreamSubscriptionResponse(stream_id=stream_id, applied=False)
+
+    try:
+        await update_stream(db, client, update.add, update.remove, update.exercise_id)
+    except StreamSubscriptionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamSubscriptionResponse(
+        stream_id=stream_id, applied=True, request_ids=sorted(client.request_ids)
+    )
+
+
 @router.get("/{request_id}/events")
-async def request_events(request_id: int, db: AsyncSession = Depends(get_db)):
-    """Stream real-time updates for a request using Server-Sent Events"""
+async def request_events(
+    request_id: int,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream real-time updates for a request using Server-Sent Events
+
+    Events missed since Last-Event-ID (header, or ``last_event_id``) are replayed first.
+    """
 
     # Verify request exists
     result = await db.execute(select(Request).where(Request.id == request_id))
@@ -558,6 +638,7 @@ async def request_events(request_id: int, db: AsyncSession = Depends(get_db)):
                     "embedding_status": request.embedding_status.value,
                 },
             )
+            await sse_manager.replay_missed(client, last_event_id_header or last_event_id)
 
             # Generate events from the client's queue
             async for event in sse_manager.generate_events(client):
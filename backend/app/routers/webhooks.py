@@ -18,6 +18,7 @@ from app.models.webhook_models import (
     WebhookTestResponse,
     WebhookUpdate,
 )
+from app.services.webhook_index import announce_webhooks_changed
 from app.services.webhook_service import WebhookService
 
 logger = structlog.get_logger()
@@ -68,6 +69,7 @@ async def create_webhook(
 
     db.add(webhook)
     await db.commit()
+    await announce_webhooks_changed()
     await db.refresh(webhook)
 
     logger.info(f"Created webhook {webhook.id} for user {current_user.id}")
@@ -129,6 +131,7 @@ async def update_webhook(
         setattr(webhook, field, value)
 
     await db.commit()
+    await announce_webhooks_changed()
     await db.refresh(webhook)
 
     logger.info(f"Updated webhook {webhook.id}")
@@ -157,6 +160,7 @@ async def delete_webhook(
 
     await db.delete(webhook)
     await db.commit()
+    await announce_webhooks_changed()
 
     logger.info(f"Deleted webhook {webhook_id}")
 
@@ -1,13 +1,13 @@
 from datetime import datetime
 from typing import Any, Dict, Optional, cast
 
-import httpx
 import structlog
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.config import settings
 from app.models.database import get_db
 from app.models.pydantic_models import (
     CreateWorkflowRequest,
@@ -29,6 +29,8 @@ from app.models.schemas import (
     WorkflowDashboardConfig,
     WorkflowStatus,
 )
+from app.services.model_registry import model_registry
+from app.services.workflow_validation import WorkflowValidationError, validate_blocks
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/api/workflows", tags=["workflows"])
@@ -37,35 +39,7 @@ router = APIRouter(prefix="/api/workflows", tags=["workflows"])
 @router.get("/ollama/models")
 async def get_available_models():
     """Get available models from Ollama"""
-    import os
-
-    try:
-        ollama_host = os.getenv("OLLAMA_HOST", "http://ollama-service:11434")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{ollama_host}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = []
-                for model in data.get("models", []):
-                    models.append(
-                        {
-                            "name": model["name"],
-                            "size": model.get("size", 0),
-                            "modified_at": model.get("modified_at"),
-                            "digest": model.get("digest"),
-                            "details": model.get("details", {}),
-                        }
-                    )
-                return {"models": models, "total": len(models)}
-            else:
-                return {
-                    "models": [],
-                    "total": 0,
-                    "error": "Failed to fetch models from Ollama",
-                }
-    except Exception as e:
-        logger.error("Error fetching Ollama models", error=str(e))
-        return {"models": [], "total": 0, "error": str(e)}
+    return await model_registry.list_models()
 
 
 @router.get("", response_model=WorkflowListResponse)
@@ -122,6 +96,7 @@ async def list_workflows(
                     input_type=inp.input_type.value,
                     source_block_id=inp.source_block_id,
                     variable_name=inp.variable_name,
+                    source_field=cast(Optional[str], inp.source_field),
                 )
                 for inp in block.inputs
             ]
@@ -137,6 +112,7 @@ async def list_workflows(
                     output_schema=block.output_schema,
                     model_name=block.model_name,
                     model_parameters=block.model_parameters,
+                    execution_options=block.execution_options,
                     inputs=inputs,
                     created_at=block.created_at,
                     updated_at=block.updated_at,
@@ -150,6 +126,7 @@ async def list_workflows(
                 description=cast(Optional[str], workflow.description),
                 status=workflow.status.value,
                 is_default=cast(bool, workflow.is_default),
+                pack_size=cast(Optional[int], workflow.pack_size),
                 created_by=cast(int, workflow.created_by),
                 blocks=blocks,
                 created_at=cast(datetime, workflow.created_at),
@@ -193,6 +170,7 @@ async def get_default_workflow(db: AsyncSession = Depends(get_db)):
                 input_type=inp.input_type.value,
                 source_block_id=inp.source_block_id,
                 variable_name=inp.variable_name,
+                source_field=cast(Optional[str], inp.source_field),
             )
             for inp in block.inputs
         ]
@@ -209,6 +187,7 @@ async def get_default_workflow(db: AsyncSession = Depends(get_db)):
                 output_schema=block.output_schema,
                 model_name=block.model_name,
                 model_parameters=block.model_parameters,
+                execution_options=block.execution_options,
                 inputs=inputs,
                 created_at=block.created_at,
                 updated_at=block.updated_at,
@@ -221,6 +200,7 @@ async def get_default_workflow(db: AsyncSession = Depends(get_db)):
         description=cast(Optional[str], workflow.description),
         status=workflow.status.value,
         is_default=cast(bool, workflow.is_default),
+        pack_size=cast(Optional[int], workflow.pack_size),
         created_by=cast(int, workflow.created_by),
         blocks=blocks,
         created_at=cast(datetime, workflow.created_at),
@@ -236,6 +216,11 @@ async def create_workflow(workflow: CreateWorkflowRequest, db: AsyncSession = De
     # In a real implementation, this would come from authentication
     created_by = 1
 
+    try:
+        validate_blocks(workflow.blocks)
+    except WorkflowValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # If setting as default, unset all other default workflows
     if workflow.is_default:
         await db.execute(select(Workflow).where(Workflow.is_default))
@@ -250,6 +235,7 @@ async def create_workflow(workflow: CreateWorkflowRequest, db: AsyncSession = De
         description=workflow.description,
         status=WorkflowStatus.DRAFT,
         is_default=workflow.is_default,
+        pack_size=workflow.pack_size,
         created_by=created_by,
     )
 
@@ -275,6 +261,7 @@ async def create_workflow(workflow: CreateWorkflowRequest, db: AsyncSession = De
             output_schema=block_data.output_schema,
             model_name=block_data.model_name,
             model_parameters=block_data.model_parameters,
+            execution_options=block_data.execution_options,
         )
         db.add(db_block)
         await db.flush()  # Get the block ID
@@ -311,6 +298,7 @@ async def create_workflow(workflow: CreateWorkflowRequest, db: AsyncSession = De
                     input_type=BlockInputType(input_data.input_type),
                     source_block_id=source_block_id,
                     variable_name=input_data.variable_name,
+                    source_field=input_data.source_field,
                 )
                 db.add(db_input)
             except Exception as e:
@@ -330,6 +318,7 @@ async def create_workflow(workflow: CreateWorkflowRequest, db: AsyncSession = De
     created_workflow = result.scalar_one()
 
     logger.info("Created workflow", workflow_id=db_workflow.id, name=workflow.name)
+    _preload_workflow_models(created_workflow)
 
     # Convert to response
     return await _workflow_to_response(created_workflow)
@@ -375,6 +364,12 @@ async def update_workflow(
     if not db_workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
 
+    if workflow_update.blocks is not None:
+        try:
+            validate_blocks(workflow_update.blocks)
+        except WorkflowValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     # Update basic fields
     if workflow_update.name is not None:
         db_workflow.name = workflow_update.name  # type: ignore[assignment]
@@ -393,6 +388,9 @@ async def update_workflow(
             )
             await db.flush()
         db_workflow.is_default = workflow_update.is_default  # type: ignore[assignment]
+    if "pack_size" in workflow_update.model_fields_set:
+        # Explicit null turns batch packing back off
+        db_workflow.pack_size = workflow_update.pack_size  # type: ignore[assignment]
 
     # Update blocks if provided
     if workflow_update.blocks is not None:
@@ -427,6 +425,7 @@ async def update_workflow(
                 output_schema=output_schema,
                 model_name=block_data.model_name,
                 model_parameters=block_data.model_parameters,
+                execution_options=block_data.execution_options,
             )
             db.add(db_block)
             await db.flush()
@@ -462,6 +461,7 @@ async def update_workflow(
                     input_type=BlockInputType(input_data.input_type),
                     source_block_id=source_block_id,
                     variable_name=input_data.variable_name,
+                    source_field=input_data.source_field,
                 )
                 db.add(db_input)
 
@@ -478,6 +478,7 @@ async def update_workflow(
     updated_workflow = result.scalar_one()
 
     logger.info("Updated workflow", workflow_id=workflow_id)
+    _preload_workflow_models(updated_workflow)
 
     return await _workflow_to_response(updated_workflow)
 
@@ -562,6 +563,17 @@ async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_db)):
     return {"message": "Workflow deleted successfully"}
 
 
+def _preload_workflow_models(workflow: Workflow):
+    """Warm the models of a runnable workflow so its first job avoids a cold load"""
+    if workflow.status != WorkflowStatus.ACTIVE and not workflow.is_default:
+        return
+    # Blocks without a model_name run on the worker's default model
+    model_registry.schedule_preload(
+        cast(Optional[str], block.model_name) or settings.default_model_name
+        for block in workflow.blocks
+    )
+
+
 async def _workflow_to_response(workflow: Workflow) -> WorkflowResponse:
     """Convert workflow to response format"""
     blocks = []
@@ -572,6 +584,7 @@ async def _workflow_to_response(workflow: Workflow) -> WorkflowResponse:
                 input_type=inp.input_type.value,
                 source_block_id=inp.source_block_id,
                 variable_name=inp.variable_name,
+                source_field=cast(Optional[str], inp.source_field),
             )
             for inp in block.inputs
         ]
@@ -587,6 +600,7 @@ async def _workflow_to_response(workflow: Workflow) -> WorkflowResponse:
                 output_schema=block.output_schema,
                 model_name=block.model_name,
                 model_parameters=block.model_parameters,
+                execution_options=block.execution_options,
                 inputs=inputs,
                 created_at=block.created_at,
                 updated_at=block.updated_at,
@@ -599,6 +613,7 @@ async def _workflow_to_response(workflow: Workflow) -> WorkflowResponse:
         description=cast(Optional[str], workflow.description),
         status=workflow.status.value,
         is_default=cast(bool, workflow.is_default),
+        pack_size=cast(Optional[int], workflow.pack_size),
         created_by=cast(int, workflow.created_by),
         blocks=blocks,
         created_at=cast(datetime, workflow.created_at),
@@ -0,0 +1,227 @@
+"""
+Circuit breakers for external dependencies (Ollama, Qdrant, AI worker and backend API)
+
+Breaker state is shared through Redis so that the AI worker and the backend
+see the same picture: once either side trips a breaker, both fail fast and
+the job queue stops dispatching work that needs the dependency. The AI
+worker keeps an identical copy of this module in ai_pipeline/circuit_breaker.py.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+import redis.asyncio as redis
+import requests
+import structlog
+from prometheus_client import Counter, Gauge
+from qdrant_client.http.exceptions import ResponseHandlingException
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = Gauge(
+    "taskflow_circuit_breaker_state", "Circuit state (0 closed, 1 half-open, 2 open)", ["breaker"]
+)
+BREAKER_REJECTIONS = Counter(
+    "taskflow_circuit_breaker_rejections_total", "Calls rejected by an open circuit", ["breaker"]
+)
+
+# How long a process trusts its cached copy of the shared state
+REMOTE_REFRESH_SECONDS = 1.0
+# Safety expiry so a breaker tripped by a process that died does not linger
+REMOTE_KEY_TTL_SECONDS = 3600
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Return True for errors that mean the dependency itself is unavailable"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            ConnectionError,
+            httpx.TransportError,
+            requests.ConnectionError,
+            requests.Timeout,
+            ResponseHandlingException,
+        ),
+    ):
+        return True
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        # Short timeouts: a Redis outage must not turn fail-fast into fail-slow
+        _redis_client = redis.from_url(
+            settings.redis_url, socket_connect_timeout=1, socket_timeout=1
+        )
+    return _redis_client
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None,
+        is_failure: Callable[[BaseException], bool] = is_dependency_failure,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.circuit_failure_threshold
+        self.recovery_timeout = recovery_timeout or settings.circuit_recovery_seconds
+        self.is_failure = is_failure
+
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._remote_checked_at = 0.0
+        self._shared = False
+        self._key = f"taskflow:circuit:{name}"
+
+        BREAKER_STATE.labels(breaker=name).set(0)
+
+    async def get_state(self) -> str:
+        """Current state, taking circuits tripped by other processes into account"""
+        await self._refresh_remote()
+        if self._open_until == 0.0:
+            state = CLOSED
+        elif time.time() < self._open_until:
+            state = OPEN
+        else:
+            state = HALF_OPEN
+        BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[state])
+        return state
+
+    async def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead right now"""
+        state = await self.get_state()
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            logger.info("Circuit half-open, probing", breaker=self.name)
+            return
+        BREAKER_REJECTIONS.labels(breaker=self.name).inc()
+        raise CircuitOpenError(self.name, max(0.0, self._open_until - time.time()))
+
+    async def record_success(self):
+        was_tripped = self._open_until != 0.0
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[CLOSED])
+        if was_tripped:
+            logger.info("Circuit closed", breaker=self.name)
+            await self._write_remote(None)
+
+    async def record_failure(self, error: BaseException):
+        if not self.is_failure(error):
+            # The dependency answered, so as far as the circuit goes it is healthy
+            await self.record_success()
+            return
+        self._failures += 1
+        if self._probe_in_flight or self._failures >= self.failure_threshold:
+            await self._trip(error)
+        self._probe_in_flight = False
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Fail fast while open; record the outcome of the wrapped call otherwise"""
+        await self.before_call()
+        try:
+            yield
+        except Exception as e:
+            await self.record_failure(e)
+            raise
+        except BaseException:
+            # Cancelled: the probe never reported, let the next caller try
+            self._probe_in_flight = False
+            raise
+        await self.record_success()
+
+    async def _trip(self, error: BaseException):
+        self._open_until = time.time() + self.recovery_timeout
+        BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[OPEN])
+        logger.warning(
+            "Circuit opened",
+            breaker=self.name,
+            failures=self._failures,
+            recovery_seconds=self.recovery_timeout,
+            error=str(error),
+        )
+        await self._write_remote(self._open_until)
+
+    async def _refresh_remote(self):
+        now = time.monotonic()
+        if now - self._remote_checked_at < REMOTE_REFRESH_SECONDS:
+            return
+        self._remote_checked_at = now
+        try:
+            value = await _get_redis().get(self._key)
+        except Exception as e:
+            logger.debug(
+                "Circuit state unavailable, using local state", breaker=self.name, error=str(e)
+            )
+            return
+        if value is None:
+            if self._shared and not self._probe_in_flight:
+                # Closed elsewhere after a successful probe
+                self._open_until = 0.0
+                self._failures = 0
+                self._shared = False
+        else:
+            self._open_until = max(self._open_until, float(value))
+            self._shared = True
+
+    async def _write_remote(self, open_until: Optional[float]):
+        try:
+            client = _get_redis()
+            if open_until is None:
+                await client.delete(self._key)
+                self._shared = False
+            else:
+                await client.set(self._key, open_until, ex=REMOTE_KEY_TTL_SECONDS)
+                self._shared = True
+        except Exception as e:
+            logger.debug("Could not share circuit state", breaker=self.name, error=str(e))
+
+
+ollama_breaker = CircuitBreaker("ollama")
+qdrant_breaker = CircuitBreaker("qdrant")
+# Tripped by the AI worker when its calls back to this API fail; read here through Redis
+backend_api_breaker = CircuitBreaker("backend_api")
+
+breakers: Dict[str, CircuitBreaker] = {
+    breaker.name: breaker for breaker in (ollama_breaker, qdrant_breaker, backend_api_breaker)
+}
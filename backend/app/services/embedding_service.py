@@ -2,7 +2,6 @@ import asyncio
 import logging
 import os
 import uuid
-from asyncio import Semaphore
 from typing import Any, Dict, List, Optional, cast
 
 import requests
@@ -17,6 +16,10 @@ from qdrant_client.models import (
     VectorParams,
 )
 
+from app.config import settings
+from app.services.circuit_breaker import CircuitOpenError, ollama_breaker, qdrant_breaker
+from app.services.concurrency import AdaptiveConcurrencyLimiter
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,8 +31,12 @@ class EmbeddingService:
         self.collection_name = "tasks"
         self.vector_size = 768  # nomic-embed-text dimension
 
-        # Concurrency control - limit to 2 simultaneous embedding requests
-        self._embedding_semaphore = Semaphore(2)
+        # Adaptive concurrency control for embedding requests to Ollama
+        self._embedding_limiter = AdaptiveConcurrencyLimiter(
+            name="ollama-embeddings",
+            initial_limit=settings.embedding_initial_concurrency,
+            max_limit=settings.embedding_max_concurrency,
+        )
 
         # Create a session for connection pooling
         self.session = requests.Session()
@@ -113,21 +120,19 @@ class EmbeddingService:
     async def generate_embedding(self, text: str, max_retries: int = 3) -> List[float]:
         """Generate embedding for text using Ollama with retry logic and concurrency control."""
 
-        # Use semaphore to limit concurrent requests
-        async with self._embedding_semaphore:
-            logger.info(
-                f"Acquired embedding semaphore, generating embedding for text: '{text[:50]}...'"
-            )
+        logger.info(f"Generating embedding for text: '{text[:50]}...'")
 
-            for attempt in range(max_retries):
-                try:
-                    logger.info(
-                        f"Generating embedding using Ollama at {self.ollama_host} "
-                        f"with model {self.embedding_model} (attempt {attempt + 1})"
-                    )
+        for attempt in range(max_retries):
+            try:
+                logger.info(
+                    f"Generating embedding using Ollama at {self.ollama_host} "
+                    f"with model {self.embedding_model} (attempt {attempt + 1})"
+                )
 
-                    payload = {"model": self.embedding_model, "prompt": text}
+                payload = {"model": self.embedding_model, "prompt": text}
 
+                # Hold a limiter slot only for the request itself, not the backoff
+                async with ollama_breaker.guard(), self._embedding_limiter.acquire():
                     # Run the synchronous request in a thread pool to avoid blocking
                     loop = asyncio.get_event_loop()
 
@@ -143,36 +148,38 @@ class EmbeddingService:
 
                     response.raise_for_status()
 
-                    result = response.json()
-                    embedding = result.get("embedding", [])
+                result = response.json()
+                embedding = result.get("embedding", [])
 
-                    if not embedding:
-                        raise ValueError("No embedding returned from Ollama")
+                if not embedding:
+                    raise ValueError("No embedding returned from Ollama")
 
-                    logger.info(
-                        f"Successfully generated embedding with {len(embedding)} dimensions"
+                logger.info(f"Successfully generated embedding with {len(embedding)} dimensions")
+                return embedding
+
+            except CircuitOpenError as e:
+                # Ollama is known to be down: skip the retries and their backoff
+                logger.warning(f"Embedding generation skipped: {str(e)}")
+                break
+
+            except Exception as e:
+                logger.warning(f"Embedding generation attempt {attempt + 1} failed: {str(e)}")
+
+                if attempt < max_retries - 1:
+                    # Wait with exponential backoff before retry
+                    wait_time = min((2**attempt) + 1, 10)  # Cap at 10 seconds
+                    logger.info(f"Retrying in {wait_time} seconds...")
+                    await asyncio.sleep(wait_time)
+                else:
+                    logger.error(
+                        f"All {max_retries} embedding generation attempts failed "
+                        f"from Ollama at {self.ollama_host}: {str(e)}"
                     )
-                    return embedding
-
-                except Exception as e:
-                    logger.warning(f"Embedding generation attempt {attempt + 1} failed: {str(e)}")
-
-                    if attempt < max_retries - 1:
-                        # Wait with exponential backoff before retry
-                        wait_time = min((2**attempt) + 1, 10)  # Cap at 10 seconds
-                        logger.info(f"Retrying in {wait_time} seconds...")
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(
-                            f"All {max_retries} embedding generation attempts failed "
-                            f"from Ollama at {self.ollama_host}: {str(e)}"
-                        )
-                        # Return a zero vector as fallback to prevent crashes
-                        logger.warning("Returning zero vector as fallback for failed embedding")
-                        return [0.0] * self.vector_size
-            # This should never be reached, but added for mypy completeness
-            logger.error("Unexpected end of embedding generation function")
-            return [0.0] * self.vector_size
+                    # Return a zero vector as fallback to prevent crashes
+                    logger.warning("Returning zero vector as fallback for failed embedding")
+                    return [0.0] * self.vector_size
+        logger.warning("Returning zero vector as fallback for failed embedding")
+        return [0.0] * self.vector_size
 
     async def store_task_embedding(self, task_id: int, task_data: Dict[str, Any]) -> str:
         """Store task embedding in Qdrant."""
@@ -204,25 +211,26 @@ class EmbeddingService:
                 f"collection: {self.collection_name}, point_id: {point_id}"
             )
 
-            self.qdrant_client.upsert(
-                collection_name=self.collection_name,
-                points=[
-                    PointStruct(
-                        id=point_id,
-                        vector=embedding,
-                        payload={
-                            "task_id": task_id,
-                            "title": task_data.get("title", ""),
-                            "description": task_data.get("description", ""),
-                            "priority": task_data.get("priority", ""),
-                            "status": task_data.get("status", ""),
-                            "tags": task_data.get("tags", []),
-                            "exercise_id": task_data.get("exercise_id"),
-                            "created_at": task_data.get("created_at", ""),
-                        },
-                    )
-                ],
-            )
+            async with qdrant_breaker.guard():
+                self.qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=[
+                        PointStruct(
+                            id=point_id,
+                            vector=embedding,
+                            payload={
+                                "task_id": task_id,
+                                "title": task_data.get("title", ""),
+                                "description": task_data.get("description", ""),
+                                "priority": task_data.get("priority", ""),
+                                "status": task_data.get("status", ""),
+                                "tags": task_data.get("tags", []),
+                                "exercise_id": task_data.get("exercise_id"),
+                                "created_at": task_data.get("created_at", ""),
+                            },
+                        )
+                    ],
+                )
 
             logger.info(f"Successfully stored embedding for task {task_id} in Qdrant")
             return point_id
@@ -271,12 +279,13 @@ class EmbeddingService:
             )
             logger.debug(f"Search filters: {filters if filters else 'None'}")
 
-            search_result = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                query_filter=qdrant_filter,
-            )
+            async with qdrant_breaker.guard():
+                search_result = self.qdrant_client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_embedding,
+                    limit=limit,
+                    query_filter=qdrant_filter,
+                )
 
             logger.info(f"Qdrant search returned {len(search_result)} results")
 
@@ -312,13 +321,14 @@ class EmbeddingService:
         """Search for tasks similar to a given task ID."""
         try:
             # First, get the task's embedding from Qdrant
-            search_result = self.qdrant_client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=Filter(
-                    must=[FieldCondition(key="task_id", match=MatchValue(value=task_id))]
-                ),
-                limit=1,
-            )
+            async with qdrant_breaker.guard():
+                search_result = self.qdrant_client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=Filter(
+                        must=[FieldCondition(key="task_id", match=MatchValue(value=task_id))]
+                    ),
+                    limit=1,
+                )
 
             if not search_result[0]:
                 logger.warning(f"No embedding found for task {task_id}")
@@ -327,11 +337,12 @@ class EmbeddingService:
             # Get the point with vector
             task_point = search_result[0][0]
             # Need to retrieve the point with vector included
-            point_result = self.qdrant_client.retrieve(
-                collection_name=self.collection_name,
-                ids=[task_point.id],
-                with_vectors=True,  # Note: with_vectors (plural)
-            )
+            async with qdrant_breaker.guard():
+                point_result = self.qdrant_client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=[task_point.id],
+                    with_vectors=True,  # Note: with_vectors (plural)
+                )
 
             if not point_result:
                 logger.warning(f"Could not retrieve vector for task {task_id}")
@@ -355,12 +366,13 @@ class EmbeddingService:
                     qdrant_filter = Filter(must=cast(List[FieldCondition], conditions))
 
             # Search for similar tasks
-            similar_tasks = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=task_embedding,
-                limit=limit + 1 if exclude_self else limit,
-                query_filter=qdrant_filter,
-            )
+            async with qdrant_breaker.guard():
+                similar_tasks = self.qdrant_client.search(
+                    collection_name=self.collection_name,
+                    query_vector=task_embedding,
+                    limit=limit + 1 if exclude_self else limit,
+                    query_filter=qdrant_filter,
+                )
 
             # Format results and exclude self if requested
             results = []
@@ -393,12 +405,13 @@ class EmbeddingService:
     async def delete_task_embedding(self, task_id: int):
         """Delete task embedding from Qdrant."""
         try:
-            self.qdrant_client.delete(
-                collection_name=self.collection_name,
-                points_selector=Filter(
-                    must=[FieldCondition(key="task_id", match=MatchValue(value=task_id))]
-                ),
-            )
+            async with qdrant_breaker.guard():
+                self.qdrant_client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=Filter(
+                        must=[FieldCondition(key="task_id", match=MatchValue(value=task_id))]
+                    ),
+                )
             logger.info(f"Deleted embedding for task {task_id}")
         except Exception as e:
             logger.error(f"Error deleting task embedding: {str(e)}")
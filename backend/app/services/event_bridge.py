@@ -1,16 +1,33 @@
 """
 Bridge service to connect Redis events to SSE clients
+
+The bridge subscribes only to the channels of requests that have SSE clients on
+this replica, and drops a subscription when the last client leaves, so each
+replica receives and decodes only the events it can deliver.
 """
 
 import asyncio
+from typing import Set
 
 import structlog
+from prometheus_client import Gauge
 
-from app.services.event_bus import event_bus, get_channel_pattern_for_all_requests
+from app.services.event_bus import JOB_CHANNEL_PREFIX, event_bus, get_channel_for_request
+from app.services.job_progress import job_progress_hub
+from app.services.request_streams import STREAM_CONTROL_CHANNEL, apply_control_message
 from app.services.sse_manager import sse_manager
+from app.services.webhook_index import WEBHOOK_CONTROL_CHANNEL, webhook_index
 
 logger = structlog.get_logger()
 
+WATCHED_REQUESTS = Gauge(
+    "taskflow_event_bridge_watched_requests",
+    "Request channels this replica is subscribed to for its SSE clients",
+)
+
+# Pause before resubscribing after the Redis connection failed
+RECONNECT_DELAY_SECONDS = 1.0
+
 
 class EventBridge:
     """Bridges Redis events to SSE clients"""
@@ -18,6 +35,8 @@ class EventBridge:
     def __init__(self):
         self._running = False
         self._task = None
+        self._watched: Set[int] = set()
+        self._watch_lock = asyncio.Lock()
 
     async def start(self):
         """Start the event bridge"""
@@ -25,12 +44,14 @@ class EventBridge:
             return
 
         self._running = True
+        sse_manager.on_clients_changed = self.sync_request
         self._task = asyncio.create_task(self._bridge_events())
         logger.info("Event bridge started")
 
     async def stop(self):
         """Stop the event bridge"""
         self._running = False
+        sse_manager.on_clients_changed = None
         if self._task:
             self._task.cancel()
             try:
@@ -39,46 +60,89 @@ class EventBridge:
                 pass
         logger.info("Event bridge stopped")
 
+    async def sync_request(self, request_id: int):
+        """Subscribe to a request's channel while it has SSE clients here, unsubscribe after"""
+        async with self._watch_lock:
+            wanted = sse_manager.has_clients(request_id)
+            if wanted == (request_id in self._watched):
+                return
+
+            channel = get_channel_for_request(request_id)
+            if wanted:
+                await event_bus.watch(channel)
+                self._watched.add(request_id)
+            else:
+                await event_bus.unwatch(channel)
+                self._watched.discard(request_id)
+            WATCHED_REQUESTS.set(len(self._watched))
+
     async def _bridge_events(self):
-        """Subscribe to Redis events and forward to SSE clients"""
+        """Receive events for watched requests and forward them to SSE clients"""
+        while self._running:
+            try:
+                # Subscription changes for multiplexed streams held by this replica
+                await event_bus.watch(STREAM_CONTROL_CHANNEL)
+                # Webhook changes; any announced while disconnected were missed, so reload
+                await event_bus.watch(WEBHOOK_CONTROL_CHANNEL)
+                webhook_index.invalidate()
+
+                async for message in event_bus.listen():
+                    if not self._running:
+                        break
+                    await self._forward(message)
+
+            except asyncio.CancelledError:
+                logger.info("Event bridge cancelled")
+                raise
+            except Exception as e:
+                # The pubsub connection resubscribes its channels when it reconnects
+                logger.error("Event bridge error", error=str(e))
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _forward(self, message):
+        if message["channel"] == STREAM_CONTROL_CHANNEL:
+            try:
+                await apply_control_message(message["data"])
+            except Exception as e:
+                logger.error("Failed to apply stream update", error=str(e))
+            return
+
+        if message["channel"] == WEBHOOK_CONTROL_CHANNEL:
+            webhook_index.invalidate()
+            return
+
+        if message["channel"].startswith(JOB_CHANNEL_PREFIX):
+            job_id = message["channel"].split(".", 2)[2]
+            job_progress_hub.dispatch(job_id, message["data"])
+            return
+
         try:
-            async for message in event_bus.subscribe(get_channel_pattern_for_all_requests()):
-                if not self._running:
-                    break
-
-                try:
-                    # Extract request_id from channel name
-                    # Channel format: taskflow.request.{request_id}
-                    channel_parts = message["channel"].split(".")
-                    if len(channel_parts) >= 3:
-                        request_id = int(channel_parts[2])
-                        event_data = message["data"]
-
-                        # Forward to SSE clients
-                        await sse_manager.broadcast_to_request(
-                            request_id, event_data.get("type", "update"), event_data
-                        )
-
-                        logger.debug(
-                            "Bridged event to SSE",
-                            request_id=request_id,
-                            event_type=event_data.get("type"),
-                        )
-
-                except (ValueError, IndexError) as e:
-                    logger.error(
-                        "Failed to parse channel",
-                        channel=message["channel"],
-                        error=str(e),
-                    )
-                except Exception as e:
-                    logger.error("Failed to bridge event", error=str(e), message=message)
-
-        except asyncio.CancelledError:
-            logger.info("Event bridge cancelled")
-            raise
+            # Extract request_id from channel name
+            # Channel format: taskflow.request.{request_id}
+            channel_parts = message["channel"].split(".")
+            if len(channel_parts) >= 3:
+                request_id = int(channel_parts[2])
+                event_data = message["data"]
+
+                # Forward to SSE clients
+                await sse_manager.broadcast_to_request(
+                    request_id, event_data.get("type", "update"), event_data
+                )
+
+                logger.debug(
+                    "Bridged event to SSE",
+                    request_id=request_id,
+                    event_type=event_data.get("type"),
+                )
+
+        except (ValueError, IndexError) as e:
+            logger.error(
+                "Failed to parse channel",
+                channel=message["channel"],
+                error=str(e),
+            )
         except Exception as e:
-            logger.error("Event bridge error", error=str(e))
+            logger.error("Failed to bridge event", error=str(e), message=message)
 
 
 # Global event bridge instance
@@ -3,14 +3,14 @@ Event Bus service for real-time communication using Redis Pub/Sub
 """
 
 import asyncio
-import json
 from contextlib import asynccontextmanager
-from typing import Any, AsyncGenerator, Callable, Dict, Optional, Set
+from typing import Any, AsyncGenerator, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 
 import redis.asyncio as redis
 import structlog
 
 from app.config import settings
+from app.services.event_codec import EventDecodeError, attach_id, decode_event, encode_event
 
 logger = structlog.get_logger()
 
@@ -25,18 +25,24 @@ class EventBus:
         self._subscribers: Dict[str, Set[Callable]] = {}
         self._running = False
         self._listener_task = None
+        # Per-channel subscriptions (watch/unwatch), read by listen()
+        self._watch_pubsub = None
+        self._watch_changed = asyncio.Event()
 
     async def connect(self):
         """Connect to Redis"""
         if not self._redis_client:
             self._redis_client = redis.from_url(self.redis_url)
             self._pubsub = self._redis_client.pubsub()
+            self._watch_pubsub = self._redis_client.pubsub()
             logger.info("Connected to Redis event bus", url=self.redis_url)
 
     async def disconnect(self):
         """Disconnect from Redis"""
         if self._pubsub:
             await self._pubsub.close()
+        if self._watch_pubsub:
+            await self._watch_pubsub.close()
         if self._redis_client:
             await self._redis_client.close()
         logger.info("Disconnected from Redis event bus")
@@ -47,26 +53,89 @@ class EventBus:
             await self.connect()
 
         assert self._redis_client is not None
-        message = json.dumps(event)
+        message = encode_event(event, settings.event_inline_max_bytes)
+        if channel.startswith(REQUEST_CHANNEL_PREFIX):
+            # Request events go to the request's event log too, and carry their log id
+            log_key = get_log_key_for_channel(channel)
+            pipe = self._redis_client.pipeline(transaction=False)
+            pipe.xadd(log_key, {"e": message}, maxlen=settings.event_log_max_len, approximate=True)
+            pipe.expire(log_key, settings.event_log_ttl_seconds)
+            event_id, _ = await pipe.execute()
+            message = attach_id(message, event_id.decode())
         await self._redis_client.publish(channel, message)
 
         logger.debug("Published event", channel=channel, event_type=event.get("type"))
 
-        # Trigger webhooks asynchronously
-        asyncio.create_task(self._trigger_webhooks(event))
+        # Trigger webhooks asynchronously, only for event types a webhook subscribes to
+        webhook_ids = await self._webhook_subscribers(event.get("type"))
+        if webhook_ids:
+            asyncio.create_task(self._trigger_webhooks(event, webhook_ids))
 
-    async def _trigger_webhooks(self, event: Dict[str, Any]):
-        """Trigger webhooks for an event"""
+    async def publish_internal(self, channel: str, message: Dict[str, Any]) -> int:
+        """Publish a message only API replicas consume (no webhooks); returns how many got it"""
+        if not self._redis_client:
+            await self.connect()
+
+        assert self._redis_client is not None
+        return int(await self._redis_client.publish(channel, encode_event(message)))
+
+    async def get_redis(self):
+        """The Redis client, connected on first use"""
+        if not self._redis_client:
+            await self.connect()
+
+        assert self._redis_client is not None
+        return self._redis_client
+
+    async def read_log(
+        self, request_ids: List[int], after_id: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Logged events of the requests after ``after_id``, oldest first, at most ``limit``"""
+        if not request_ids:
+            return []
+        if not self._redis_client:
+            await self.connect()
+
+        assert self._redis_client is not None
+        pipe = self._redis_client.pipeline(transaction=False)
+        for request_id in request_ids:
+            pipe.xrange(get_log_key_for_request(request_id), min=f"({after_id}", count=limit)
+
+        events = []
+        for entries in await pipe.execute():
+            for entry_id, fields in entries:
+                try:
+                    event = decode_event(fields[b"e"])
+                except (EventDecodeError, KeyError):
+                    continue
+                event["id"] = entry_id.decode()
+                events.append(event)
+        events.sort(key=lambda event: parse_event_id(event["id"]) or (0, 0))
+        return events[:limit]
+
+    async def _webhook_subscribers(self, event_type: Optional[str]) -> FrozenSet[int]:
+        """Ids of the webhooks subscribed to an event type, from the cached index"""
+        if not event_type:
+            return frozenset()
+        try:
+            # Import here to avoid circular imports
+            from app.services.webhook_index import webhook_index
+
+            return await webhook_index.subscribers(event_type)
+        except Exception as e:
+            logger.error(f"Failed to look up webhooks: {str(e)}")
+            return frozenset()
+
+    async def _trigger_webhooks(self, event: Dict[str, Any], webhook_ids: FrozenSet[int]):
+        """Trigger the subscribed webhooks for an event"""
         try:
             # Import here to avoid circular imports
             from app.models.database import get_db_session
             from app.services.webhook_service import WebhookService
 
-            webhook_event_type = event.get("type")
-            if webhook_event_type:
-                async with get_db_session() as db:
-                    service = WebhookService(db)
-                    await service.trigger_webhooks(webhook_event_type, event)
+            async with get_db_session() as db:
+                service = WebhookService(db)
+                await service.trigger_webhooks(event["type"], event, webhook_ids)
         except Exception as e:
             logger.error(f"Failed to trigger webhooks: {str(e)}")
 
@@ -83,22 +152,66 @@ class EventBus:
             async for message in self._pubsub.listen():
                 if message["type"] == "pmessage":
                     try:
-                        data = json.loads(message["data"])
+                        data = decode_event(message["data"])
                         yield {
                             "channel": message["channel"].decode(),
                             "pattern": message["pattern"].decode(),
                             "data": data,
                         }
-                    except json.JSONDecodeError:
+                    except EventDecodeError as e:
                         logger.error(
                             "Failed to decode message",
                             channel=message["channel"],
-                            data=message["data"],
+                            error=str(e),
                         )
         finally:
             if self._pubsub:
                 await self._pubsub.punsubscribe(pattern)
 
+    async def watch(self, channel: str):
+        """Start receiving events published to one channel through listen()"""
+        if not self._watch_pubsub:
+            await self.connect()
+
+        assert self._watch_pubsub is not None
+        await self._watch_pubsub.subscribe(channel)
+        self._watch_changed.set()
+        logger.debug("Watching channel", channel=channel)
+
+    async def unwatch(self, channel: str):
+        """Stop receiving events published to a channel"""
+        if self._watch_pubsub:
+            await self._watch_pubsub.unsubscribe(channel)
+            logger.debug("Stopped watching channel", channel=channel)
+
+    async def listen(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield events from watched channels; idles while no channel is watched"""
+        if not self._watch_pubsub:
+            await self.connect()
+
+        assert self._watch_pubsub is not None
+        while True:
+            if not self._watch_pubsub.subscribed:
+                self._watch_changed.clear()
+                await self._watch_changed.wait()
+                continue
+
+            message = await self._watch_pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=1.0
+            )
+            if not message or message["type"] != "message":
+                continue
+            try:
+                data = decode_event(message["data"])
+            except EventDecodeError as e:
+                logger.error("Failed to decode message", channel=message["channel"], error=str(e))
+                continue
+            yield {"channel": message["channel"].decode(), "data": data}
+
+
+REQUEST_CHANNEL_PREFIX = "taskflow.request."
+JOB_CHANNEL_PREFIX = "taskflow.job."
+
 
 # Event types for type safety
 class EventType:
@@ -107,6 +220,7 @@ class EventType:
     JOB_PROGRESS = "job.progress"
     JOB_COMPLETED = "job.completed"
     JOB_FAILED = "job.failed"
+    JOB_STATUS = "job.status"
 
     # Embedding events
     EMBEDDING_STARTED = "embedding.started"
@@ -149,7 +263,32 @@ def create_event(
 
 def get_channel_for_request(request_id: int) -> str:
     """Get the Redis channel name for a specific request"""
-    return f"taskflow.request.{request_id}"
+    return f"{REQUEST_CHANNEL_PREFIX}{request_id}"
+
+
+def get_log_key_for_channel(channel: str) -> str:
+    """Get the Redis Stream key holding the replayable events of a request channel"""
+    return f"{channel}.log"
+
+
+def get_log_key_for_request(request_id: int) -> str:
+    """Get the Redis Stream key holding a request's replayable events"""
+    return get_log_key_for_channel(get_channel_for_request(request_id))
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse an event log id ("<ms>-<seq>") for comparison; None when it is not one"""
+    if not value:
+        return None
+    milliseconds, _, sequence = value.strip().partition("-")
+    if not milliseconds.isdigit() or not (sequence or "0").isdigit():
+        return None
+    return int(milliseconds), int(sequence or 0)
+
+
+def get_channel_for_job(job_id: str) -> str:
+    """Get the Redis channel name for a processing job's status changes"""
+    return f"{JOB_CHANNEL_PREFIX}{job_id}"
 
 
 def get_channel_pattern_for_all_requests() -> str:
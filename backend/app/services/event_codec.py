@@ -0,0 +1,87 @@
+"""
+Wire format for events on the Redis hop
+
+Events travel between the AI worker and every API replica as a msgpack map:
+the event's own fields (type, request_id, timestamp, payload) plus ``v``, the
+envelope version. msgpack is smaller than JSON and cheaper to decode, which
+matters because the event is decoded again on every replica that delivers it.
+
+Each event is also appended to a capped per-request Redis Stream, the event
+log, and the live message carries the entry id as ``id``. SSE sends it as the
+event id, so a reconnecting client can ask for what it missed (Last-Event-ID).
+
+A result too large to inline (``workflow.step.completed`` carries the whole
+block output) is replaced by ``result_ref``: the request, step and size. The
+stored result is fetched from the API once ``workflow.completed`` names its
+version.
+
+JSON-encoded events are still accepted, so publishers and subscribers can be
+upgraded in any order. The AI worker has a copy of this module
+(ai-worker/event_codec.py); keep them in step.
+"""
+
+import json
+from typing import Any, Dict, Union
+
+import msgpack
+
+EVENT_FORMAT_VERSION = 1
+
+
+class EventDecodeError(ValueError):
+    """A message that is not an event this version understands"""
+
+
+def encode_event(event: Dict[str, Any], max_inline_bytes: int = 0) -> bytes:
+    """Encode ``event``, sending its payload result by reference when larger than the limit"""
+    envelope = dict(event)
+    envelope["v"] = EVENT_FORMAT_VERSION
+    message = _pack(envelope)
+    payload = envelope.get("payload")
+    if (
+        max_inline_bytes
+        and len(message) > max_inline_bytes
+        and isinstance(payload, dict)
+        and payload.get("result") is not None
+    ):
+        size = len(_pack(payload["result"]))
+        payload = {key: value for key, value in payload.items() if key != "result"}
+        payload["result_ref"] = {
+            "request_id": envelope.get("request_id"),
+            "step_name": payload.get("step_name"),
+            "size_bytes": size,
+        }
+        envelope["payload"] = payload
+        message = _pack(envelope)
+    return message
+
+
+def attach_id(message: bytes, event_id: str) -> bytes:
+    """Add the event's log id (its Redis Stream entry id) to an encoded event"""
+    envelope = msgpack.unpackb(message, raw=False, strict_map_key=False)
+    envelope["id"] = event_id
+    return _pack(envelope)
+
+
+def decode_event(data: Union[bytes, str]) -> Dict[str, Any]:
+    """Decode a message from Redis (msgpack envelope or legacy JSON) into an event dict"""
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        if data[:1] == b"{":
+            event = json.loads(data)
+        else:
+            event = msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except ValueError as e:
+        raise EventDecodeError(f"Undecodable event: {e}") from e
+
+    if not isinstance(event, dict):
+        raise EventDecodeError("Event is not a map")
+    version = event.pop("v", EVENT_FORMAT_VERSION)
+    if not isinstance(version, int) or version > EVENT_FORMAT_VERSION:
+        raise EventDecodeError(f"Unsupported event format version {version}")
+    return event
+
+
+def _pack(value: Any) -> bytes:
+    return msgpack.packb(value, use_bin_type=True, default=str)
@@ -0,0 +1,60 @@
+"""
+Pushed job status for job progress streams
+
+JobService publishes a ``job.status`` event on the job's Redis channel after
+every status change. Streams watching a job register here; the event bridge
+subscribes to a job's channel while at least one stream on this replica
+watches it, and hands its events to those streams.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Set
+
+import structlog
+
+from app.services.event_bus import event_bus, get_channel_for_job
+
+logger = structlog.get_logger()
+
+# Status events kept per stream; only the latest matters, so older ones are dropped
+WATCHER_QUEUE_SIZE = 8
+
+
+class JobProgressHub:
+    """Fans job status events out to the streams watching each job"""
+
+    def __init__(self):
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @asynccontextmanager
+    async def watch(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Receive the job's status events on a queue for the duration of the block"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WATCHER_QUEUE_SIZE)
+        first = job_id not in self._watchers
+        self._watchers.setdefault(job_id, set()).add(queue)
+        try:
+            if first:
+                await event_bus.watch(get_channel_for_job(job_id))
+            yield queue
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._watchers[job_id]
+                    try:
+                        await event_bus.unwatch(get_channel_for_job(job_id))
+                    except Exception as e:
+                        logger.warning("Failed to unwatch job", job_id=job_id, error=str(e))
+
+    def dispatch(self, job_id: str, event: Dict[str, Any]):
+        """Hand a status event to every stream watching the job"""
+        for queue in self._watchers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+# Global job progress hub instance
+job_progress_hub = JobProgressHub()
@@ -1,9 +1,9 @@
 import asyncio
 import json
-import re
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, Set, cast
+from typing import Dict, List, Optional, Set, Tuple, cast
 
 import httpx
 import structlog
@@ -21,9 +21,29 @@ from app.models.schemas import (
     Request,
     WorkflowEmbeddingConfig,
 )
+from app.services.circuit_breaker import HALF_OPEN, OPEN, breakers
+from app.services.event_bus import EventType, event_bus, get_channel_for_job
+from app.services.templates import MUSTACHE, compile_template
+from app.services.worker_batcher import BatchItemError, worker_batcher
 
 logger = structlog.get_logger()
 
+# Dependencies each job type needs; dispatch pauses while any of their circuits is open.
+# Every job calls back into this API from the worker (backend_api).
+JOB_TYPE_DEPENDENCIES: Dict[JobType, Tuple[str, ...]] = {
+    JobType.STANDARD: ("ollama", "backend_api"),
+    JobType.CUSTOM: ("ollama", "backend_api"),
+    JobType.WORKFLOW: ("ollama", "backend_api"),
+    JobType.EMBEDDING: ("ollama", "qdrant", "backend_api"),
+    JobType.BULK_EMBEDDING: ("ollama", "qdrant", "backend_api"),
+}
+
+# Response header naming the worker circuit that rejected a job
+CIRCUIT_HEADER = "X-TaskFlow-Circuit"
+
+# How often held jobs are re-checked while the queue is otherwise idle
+HELD_JOB_RECHECK_SECONDS = 1.0
+
 
 # Global job queue manager
 class JobQueueManager:
@@ -32,6 +52,14 @@ class JobQueueManager:
         self.running_jobs: Set[str] = set()
         self.job_queue: asyncio.Queue = asyncio.Queue()
         self.queue_processor_task: Optional[asyncio.Task] = None
+        # Jobs whose dependencies are down, in arrival order
+        self.held_jobs: List[Tuple[str, object]] = []
+        self.job_types: Dict[str, JobType] = {}
+        # Breaker name -> job dispatched as its half-open probe
+        self.probe_jobs: Dict[str, str] = {}
+        # Deferred jobs: earliest dispatch time (monotonic), and how often each was deferred
+        self.not_before: Dict[str, float] = {}
+        self.deferrals: Dict[str, int] = {}
 
     async def start(self):
         """Start the queue processor if not already running"""
@@ -39,18 +67,27 @@ class JobQueueManager:
             self.queue_processor_task = asyncio.create_task(self._process_queue())
             logger.info("Started job queue processor")
 
-    async def add_job(self, job_id: str, job_coro):
+    async def add_job(self, job_id: str, job_coro, job_type: Optional[JobType] = None):
         """Add a job to the queue"""
+        if job_type is not None:
+            self.job_types[job_id] = job_type
         await self.job_queue.put((job_id, job_coro))
         logger.info(f"Added job {job_id} to queue. Queue size: {self.job_queue.qsize()}")
 
+    def hold_job(self, job_id: str, job_coro, job_type: JobType, retry_after: float):
+        """Hold back a job a worker circuit rejected until ``retry_after`` seconds have passed"""
+        self.job_types[job_id] = job_type
+        self.not_before[job_id] = time.monotonic() + retry_after
+        self.deferrals[job_id] = self.deferrals.get(job_id, 0) + 1
+        self.held_jobs.append((job_id, job_coro))
+
     def get_queue_position(self, job_id: str) -> int:
         """Get the position of a job in the queue (0-based, -1 if not found or running)"""
         if job_id in self.running_jobs:
             return -1  # Job is already running
 
-        # Convert queue to list to find position
-        queue_items = list(self.job_queue._queue)  # type: ignore[attr-defined]
+        # Held jobs are dispatched first once their dependencies recover
+        queue_items = self.held_jobs + list(self.job_queue._queue)  # type: ignore[attr-defined]
         for i, (queued_job_id, _) in enumerate(queue_items):
             if queued_job_id == job_id:
                 return i
@@ -65,8 +102,8 @@ class JobQueueManager:
                 while len(self.running_jobs) >= self.max_concurrent_jobs:
                     await asyncio.sleep(0.5)
 
-                # Get next job from queue
-                job_id, job_coro = await self.job_queue.get()
+                # Get next job whose dependencies are available
+                job_id, job_coro = await self._next_dispatchable_job()
 
                 # Start the job
                 self.running_jobs.add(job_id)
@@ -79,17 +116,100 @@ class JobQueueManager:
                 logger.error(f"Error in queue processor: {str(e)}")
                 await asyncio.sleep(1)  # Prevent tight loop on error
 
+    async def _next_dispatchable_job(self) -> Tuple[str, object]:
+        """Return the next job to run, holding back jobs whose dependencies are down"""
+        while True:
+            for index, held_job in enumerate(self.held_jobs):
+                if await self._can_dispatch(held_job[0]):
+                    del self.held_jobs[index]
+                    logger.info(f"Resuming held job {held_job[0]}")
+                    return held_job
+
+            try:
+                # Time-limited even with nothing held: a running job may hold itself back
+                job = await asyncio.wait_for(self.job_queue.get(), timeout=HELD_JOB_RECHECK_SECONDS)
+            except asyncio.TimeoutError:
+                continue
+
+            if await self._can_dispatch(job[0]):
+                return job
+            self.held_jobs.append(job)
+            logger.warning(f"Holding job {job[0]}: a dependency circuit is open")
+
+    async def _can_dispatch(self, job_id: str) -> bool:
+        """Check the circuits a job depends on; a half-open circuit admits one probe job"""
+        if time.monotonic() < self.not_before.get(job_id, 0.0):
+            return False
+        job_type = self.job_types.get(job_id)
+        probing = []
+        for name in JOB_TYPE_DEPENDENCIES.get(job_type, ()) if job_type else ():
+            if name not in breakers:
+                continue
+            state = await breakers[name].get_state()
+            if state == OPEN:
+                return False
+            if state == HALF_OPEN:
+                if self.probe_jobs.get(name, job_id) != job_id:
+                    return False
+                probing.append(name)
+        for name in probing:
+            self.probe_jobs[name] = job_id
+        return True
+
     async def _run_job(self, job_id: str, job_coro):
         """Run a job and clean up when done"""
+        # Dispatched: the job re-registers its type if it queues or holds itself again
+        self.job_types.pop(job_id, None)
+        self.not_before.pop(job_id, None)
         try:
             await job_coro
         finally:
             self.running_jobs.discard(job_id)
+            if job_id not in self.job_types:
+                # Finished for good (not queued or held again)
+                self.deferrals.pop(job_id, None)
+            for name, probe_job_id in list(self.probe_jobs.items()):
+                if probe_job_id == job_id:
+                    del self.probe_jobs[name]
             logger.info(f"Completed job {job_id}. Running jobs: {len(self.running_jobs)}")
 
 
 # Initialize global job queue manager
-job_queue_manager = JobQueueManager(max_concurrent_jobs=4)
+job_queue_manager = JobQueueManager(max_concurrent_jobs=settings.max_concurrent_jobs)
+
+
+def _circuit_rejection(error: Exception) -> Optional[Tuple[str, float]]:
+    """(circuit, retry_after) when the AI worker rejected a job because a circuit is open
+
+    Only rejections the worker marks with the circuit's name count; any other 503
+    (e.g. from a proxy while the worker restarts) is an ordinary failure.
+    """
+    if isinstance(error, BatchItemError):
+        if error.status_code == 503 and error.circuit:
+            return error.circuit, error.retry_after
+        return None
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 503:
+        circuit = error.response.headers.get(CIRCUIT_HEADER)
+        if circuit:
+            try:
+                retry_after = float(error.response.headers.get("Retry-After", "0"))
+            except ValueError:
+                retry_after = 0.0
+            return circuit, retry_after
+    return None
+
+
+def job_status_event(job_status: JobProgressResponse) -> Dict:
+    """The state of a job as sent to job progress streams"""
+    return {
+        "job_id": job_status.job_id,
+        "request_id": job_status.request_id,
+        "status": job_status.status.value,
+        "error_message": job_status.error_message,
+        "started_at": job_status.started_at.isoformat() if job_status.started_at else None,
+        "completed_at": job_status.completed_at.isoformat() if job_status.completed_at else None,
+        "created_at": job_status.created_at.isoformat(),
+    }
 
 
 class JobService:
@@ -122,7 +242,7 @@ class JobService:
         await job_queue_manager.start()
 
         # Add job to queue instead of starting immediately
-        await job_queue_manager.add_job(str(job_id), self._process_job(str(job_id)))
+        await job_queue_manager.add_job(str(job_id), self._process_job(str(job_id)), job_type)
 
         return str(job_id)
 
@@ -144,6 +264,18 @@ class JobService:
             created_at=cast(datetime, job.created_at),
         )
 
+    async def _publish_status(self, db: AsyncSession, job_id: str):
+        """Push the job's new state to the streams watching it (best effort)"""
+        try:
+            job_status = await JobService(db).get_job_status(job_id)
+            if job_status:
+                await event_bus.publish_internal(
+                    get_channel_for_job(job_id),
+                    {"type": EventType.JOB_STATUS, **job_status_event(job_status)},
+                )
+        except Exception as e:
+            logger.warning("Failed to publish job status", job_id=job_id, error=str(e))
+
     def _get_max_retries(self, job_type: JobType) -> int:
         """Get maximum retry count based on job type"""
         if job_type == JobType.EMBEDDING:
@@ -198,6 +330,7 @@ class JobService:
                         f"Job {job_id} status changed during update, skipping processing"
                     )
                     return
+                await self._publish_status(db, job_id)
 
                 # Get job details
                 result = await db.execute(select(ProcessingJob).where(ProcessingJob.id == job_id))
@@ -214,27 +347,22 @@ class JobService:
                     workflow_id=job.workflow_id,
                 )
 
-                # Call AI worker
-                async with httpx.AsyncClient(
-                    timeout=600.0
-                ) as client:  # 10 minutes timeout for long-running jobs
-                    payload = {
-                        "request_id": job.request_id,
-                        "job_type": job.job_type.value,
-                        "custom_instructions": job.custom_instructions,
-                        "workflow_id": job.workflow_id,
-                    }
-
-                    logger.info(
-                        "Sending request to AI worker",
-                        ai_worker_url=settings.ai_worker_url,
-                        payload=payload,
+                # Plain workflow jobs share a pipelined batch call with their neighbours
+                batched = None
+                if (
+                    worker_batcher.enabled
+                    and job.job_type == JobType.WORKFLOW
+                    and job.workflow_id
+                    and not job.custom_instructions
+                ):
+                    batched = await worker_batcher.process(
+                        cast(int, job.workflow_id), cast(int, job.request_id)
                     )
 
-                    response = await client.post(f"{settings.ai_worker_url}/process", json=payload)
-                    response.raise_for_status()
-
-                    logger.info("AI worker response received", status_code=response.status_code)
+                if batched is not None:
+                    logger.info("AI worker batch result received", version=batched.get("version"))
+                else:
+                    await self._call_worker(job)
 
                 # Update job status to COMPLETED
                 await db.execute(
@@ -246,6 +374,7 @@ class JobService:
                     )
                 )
                 await db.commit()
+                await self._publish_status(db, job_id)
 
                 logger.info("Job completed successfully", job_id=job_id)
 
@@ -256,6 +385,15 @@ class JobService:
                 await self._cleanup_old_jobs(job.request_id, db)
 
         except Exception as e:
+            rejection = _circuit_rejection(e)
+            if (
+                rejection is not None
+                and job_queue_manager.deferrals.get(job_id, 0) < settings.max_job_deferrals
+            ):
+                # The worker failed fast on an open circuit; this is not the job's fault
+                await self._defer_job(job_id, str(e), rejection[1])
+                return
+
             logger.error("Job processing failed", job_id=job_id, error=str(e))
 
             # Handle retry logic
@@ -285,6 +423,7 @@ class JobService:
                         )
                     )
                     await db.commit()
+                    await self._publish_status(db, job_id)
 
                     # Calculate backoff delay
                     delay = min(2**job.retry_count, 60)  # Exponential backoff, max 60 seconds
@@ -295,7 +434,9 @@ class JobService:
 
                     # Re-queue the job with delay
                     await asyncio.sleep(delay)
-                    await job_queue_manager.add_job(str(job_id), self._process_job(str(job_id)))
+                    await job_queue_manager.add_job(
+                        str(job_id), self._process_job(str(job_id)), job.job_type
+                    )
                 else:
                     # Max retries exceeded or job status changed, mark as FAILED
                     # only if still RUNNING
@@ -314,6 +455,7 @@ class JobService:
                             )
                         )
                         await db.commit()
+                        await self._publish_status(db, job_id)
                         logger.error(f"Job {job_id} failed after {job.retry_count + 1} attempts")
                     else:
                         logger.warning(
@@ -321,6 +463,55 @@ class JobService:
                             f"not updating to FAILED"
                         )
 
+    async def _call_worker(self, job: ProcessingJob):
+        """Send a single job to the AI worker"""
+        async with httpx.AsyncClient(
+            timeout=600.0
+        ) as client:  # 10 minutes timeout for long-running jobs
+            payload = {
+                "request_id": job.request_id,
+                "job_type": job.job_type.value,
+                "custom_instructions": job.custom_instructions,
+                "workflow_id": job.workflow_id,
+            }
+
+            logger.info(
+                "Sending request to AI worker",
+                ai_worker_url=settings.ai_worker_url,
+                payload=payload,
+            )
+
+            response = await client.post(f"{settings.ai_worker_url}/process", json=payload)
+            response.raise_for_status()
+
+            logger.info("AI worker response received", status_code=response.status_code)
+
+    async def _defer_job(self, job_id: str, reason: str, retry_after: float):
+        """Put a running job back to PENDING and hold it for ``retry_after``, keeping its retries"""
+        from app.models.database import get_db_session
+
+        async with get_db_session() as db:
+            result = await db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == job_id, ProcessingJob.status == JobStatus.RUNNING)
+                .values(status=JobStatus.PENDING, started_at=None, error_message=reason)
+                .returning(ProcessingJob.job_type)
+            )
+            job_type = result.scalar_one_or_none()
+            await db.commit()
+            if job_type is not None:
+                await self._publish_status(db, job_id)
+
+        if job_type is None:
+            return
+        logger.warning("Deferring job until dependencies recover", job_id=job_id, reason=reason)
+        job_queue_manager.hold_job(
+            job_id,
+            self._process_job(job_id),
+            job_type,
+            max(retry_after, HELD_JOB_RECHECK_SECONDS),
+        )
+
     async def _generate_workflow_embedding(
         self, request_id: str, workflow_id: int, db: AsyncSession
     ):
@@ -358,6 +549,11 @@ class JobService:
             )
             ai_output = output_query.scalars().first()
 
+            template = compile_template(
+                cast(str, embedding_config.embedding_template) or "", MUSTACHE
+            )
+            needed = set(template.placeholders)
+
             # Build context dictionary for template replacement
             context = {"REQUEST_TEXT": request.text}
 
@@ -367,16 +563,19 @@ class JobService:
                     # Parse the summary JSON which contains all workflow outputs
                     summary_data = json.loads(cast(str, ai_output.summary))
 
-                    # Add each block's output to context
+                    # Add each block's output to context, as far as the template uses it
                     for block_name, block_data in summary_data.items():
                         if isinstance(block_data, dict):
                             # Add individual fields
                             for key, value in block_data.items():
-                                context[f"{block_name}.{key}"] = str(  # type: ignore[assignment]
-                                    value
-                                )
+                                field = f"{block_name}.{key}"
+                                if field in needed:
+                                    context[field] = str(value)  # type: ignore[assignment]
                             # Also add the full block data as JSON
-                            context[block_name] = json.dumps(block_data)  # type: ignore[assignment]
+                            if block_name in needed:
+                                context[block_name] = json.dumps(  # type: ignore[assignment]
+                                    block_data
+                                )
                         else:
                             # If not a dict, just add as string
                             context[block_name] = str(block_data)  # type: ignore[assignment]
@@ -387,19 +586,8 @@ class JobService:
                         error=str(e),
                     )
 
-            # Process the template
-            embedding_text = cast(str, embedding_config.embedding_template)
-
-            # Replace all variables in the template
-            for var_match in re.findall(r"\{\{([^}]+)\}\}", embedding_text):
-                var_name = var_match.strip()
-                if var_name in context:
-                    embedding_text = embedding_text.replace(
-                        f"{{{{{var_name}}}}}", str(context[var_name])
-                    )
-                else:
-                    # Handle nested field access (e.g., BlockName.field)
-                    embedding_text = embedding_text.replace(f"{{{{{var_name}}}}}", "")
+            # Fill in all variables in one pass; unknown ones render as empty text
+            embedding_text = template.render(context)
 
             # Generate embedding via embedding service
             if embedding_text.strip():
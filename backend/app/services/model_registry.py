@@ -0,0 +1,96 @@
+"""
+Shared, TTL-cached registry of the models available on the Ollama server
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import httpx
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+
+class ModelRegistry:
+    """Caches Ollama's ``/api/tags`` listing and triggers model preloads on the AI worker"""
+
+    def __init__(self, ollama_host: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        self.ollama_host = ollama_host or settings.ollama_host
+        self.ttl_seconds = (
+            settings.model_registry_ttl_seconds if ttl_seconds is None else ttl_seconds
+        )
+        self._models: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    async def list_models(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """Return available models in the API response format, cached for ``ttl_seconds``"""
+        try:
+            models = await self._get_models(force_refresh)
+        except Exception as e:
+            logger.error("Error fetching Ollama models", error=str(e))
+            return {"models": [], "total": 0, "error": str(e)}
+        return {"models": models, "total": len(models)}
+
+    def invalidate(self):
+        """Drop the cached listing so the next lookup hits Ollama"""
+        self._fetched_at = 0.0
+
+    def schedule_preload(self, model_names: Iterable[Optional[str]]):
+        """Ask the AI worker to load and pin models without blocking the caller"""
+        names = sorted({name for name in model_names if name})
+        if not names:
+            return
+        task = asyncio.create_task(self._preload(names))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _get_models(self, force_refresh: bool) -> List[Dict[str, Any]]:
+        if not force_refresh and self._is_fresh():
+            return self._models or []
+
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock
+            if not force_refresh and self._is_fresh():
+                return self._models or []
+
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"{self.ollama_host}/api/tags")
+            if response.status_code != 200:
+                raise RuntimeError("Failed to fetch models from Ollama")
+
+            self._models = [
+                {
+                    "name": model["name"],
+                    "size": model.get("size", 0),
+                    "modified_at": model.get("modified_at"),
+                    "digest": model.get("digest"),
+                    "details": model.get("details", {}),
+                }
+                for model in response.json().get("models", [])
+            ]
+            self._fetched_at = time.monotonic()
+            return self._models
+
+    async def _preload(self, model_names: List[str]):
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.post(
+                    f"{settings.ai_worker_url}/models/preload", json={"models": model_names}
+                )
+                response.raise_for_status()
+            logger.info("Requested model preload", models=model_names)
+        except Exception as e:
+            logger.warning("Failed to request model preload", models=model_names, error=str(e))
+
+    def _is_fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl_seconds
+
+
+# Global model registry instance
+model_registry = ModelRegistry()
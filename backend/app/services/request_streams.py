@@ -0,0 +1,154 @@
+"""
+Multiplexed SSE streams
+
+One stream carries the events of many requests, each tagged with its
+request_id, so a list view needs one connection instead of one per request.
+The set of requests is given as ids and/or an exercise, and can be changed
+while the stream stays open. A change that reaches a replica other than the one
+holding the stream is forwarded over Redis to the replica that has it.
+
+Open streams are registered in Redis under a key that expires unless the
+holding replica refreshes it, so a change for a closed or unknown stream is
+refused instead of published to no one.
+"""
+
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+import structlog
+from sqlalchemy import ColumnElement, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.database import get_db_session
+from app.models.schemas import Request
+from app.services.event_bus import event_bus
+from app.services.sse_manager import SSEClient, sse_manager
+
+logger = structlog.get_logger()
+
+# Redis channel for subscription changes of streams held by other replicas
+STREAM_CONTROL_CHANNEL = "taskflow.sse.control"
+
+# Registration of an open stream; refreshed well before it expires
+STREAM_KEY_PREFIX = "taskflow.sse.stream."
+STREAM_REGISTRATION_TTL_SECONDS = 90
+STREAM_REFRESH_SECONDS = 30.0
+
+
+class StreamSubscriptionError(ValueError):
+    """A subscription change that cannot be applied"""
+
+
+async def add_requests(
+    db: AsyncSession,
+    client: SSEClient,
+    request_ids: Iterable[int] = (),
+    exercise_id: Optional[int] = None,
+) -> List[int]:
+    """Watch existing requests by id and/or exercise; each new one starts with a status event"""
+    request_ids = list(request_ids)
+    conditions: List[ColumnElement[bool]] = []
+    if request_ids:
+        conditions.append(Request.id.in_(request_ids))
+    if exercise_id is not None:
+        conditions.append(Request.exercise_id == exercise_id)
+    if not conditions:
+        return []
+
+    limit = settings.sse_stream_max_requests
+    rows = (
+        await db.execute(
+            select(Request.id, Request.status, Request.embedding_status)
+            .where(or_(*conditions))
+            .order_by(Request.id)
+            .limit(limit + 1)
+        )
+    ).all()
+    if len(client.request_ids | {row.id for row in rows}) > limit:
+        raise StreamSubscriptionError(f"A stream can watch at most {limit} requests")
+
+    added = set(await sse_manager.watch(client, [row.id for row in rows]))
+    for row in rows:
+        if row.id in added:
+            await client.send_event(
+                "status",
+                {
+                    "request_id": row.id,
+                    "status": row.status.value,
+                    "embedding_status": row.embedding_status.value,
+                },
+            )
+    return sorted(added)
+
+
+async def update_stream(
+    db: AsyncSession,
+    client: SSEClient,
+    add: Iterable[int] = (),
+    remove: Iterable[int] = (),
+    exercise_id: Optional[int] = None,
+) -> List[int]:
+    """Change the requests a multiplexed client watches; returns the newly watched ids"""
+    await sse_manager.unwatch(client, remove)
+    return await add_requests(db, client, add, exercise_id)
+
+
+def get_stream_key(stream_id: str) -> str:
+    """Redis key registering an open multiplexed stream"""
+    return f"{STREAM_KEY_PREFIX}{stream_id}"
+
+
+async def register_stream(stream_id: str):
+    """Record (or refresh) that a stream is open on some replica"""
+    try:
+        redis_client = await event_bus.get_redis()
+        await redis_client.set(get_stream_key(stream_id), 1, ex=STREAM_REGISTRATION_TTL_SECONDS)
+    except Exception as e:
+        # Updates through other replicas are refused until the next refresh
+        logger.warning("Failed to register event stream", stream_id=stream_id, error=str(e))
+
+
+async def unregister_stream(stream_id: str):
+    """Forget a closed stream; without this its key expires after the TTL"""
+    try:
+        redis_client = await event_bus.get_redis()
+        await redis_client.delete(get_stream_key(stream_id))
+    except Exception as e:
+        logger.warning("Failed to unregister event stream", stream_id=stream_id, error=str(e))
+
+
+async def keep_stream_registered(stream_id: str):
+    """Refresh a stream's registration while it stays open; cancel when it closes"""
+    while True:
+        await asyncio.sleep(STREAM_REFRESH_SECONDS)
+        await register_stream(stream_id)
+
+
+async def forward_update(stream_id: str, update: Dict[str, Any]) -> bool:
+    """Send a change to the replica holding the stream; False when no open stream has the id"""
+    redis_client = await event_bus.get_redis()
+    if not await redis_client.exists(get_stream_key(stream_id)):
+        return False
+    await event_bus.publish_internal(STREAM_CONTROL_CHANNEL, {"stream_id": stream_id, **update})
+    return True
+
+
+async def apply_control_message(message: Dict[str, Any]):
+    """Apply a forwarded change if its stream is connected to this replica"""
+    client = sse_manager.get_stream(str(message.get("stream_id")))
+    if client is None:
+        return
+
+    try:
+        async with get_db_session() as db:
+            await update_stream(
+                db,
+                client,
+                add=message.get("add") or [],
+                remove=message.get("remove") or [],
+                exercise_id=message.get("exercise_id"),
+            )
+    except StreamSubscriptionError as e:
+        logger.warning("Rejected stream update", stream_id=client.stream_id, error=str(e))
+        await client.send_event("stream.error", {"stream_id": client.stream_id, "error": str(e)})
@@ -1,26 +1,184 @@
 """
 Server-Sent Events (SSE) manager for real-time client updates
+
+Each client has a bounded buffer (SSE_CLIENT_BUFFER_EVENTS / _BYTES), so a
+stalled browser tab cannot grow API memory without limit. What happens when
+the buffer is full is set by SSE_SLOW_CLIENT_POLICY:
+- latest: a newer progress event replaces the queued one of the same kind for
+  the same request, and the oldest event is dropped when still full;
+- drop_oldest: every event is queued, and the oldest is dropped when full;
+- disconnect: the buffer is discarded and the client gets a final ``resync``
+  event, after which the stream closes. The browser reconnects and receives a
+  fresh status snapshot.
+
+Request events carry their event log id, sent as the SSE ``id``. A client that
+reconnects with Last-Event-ID gets what it missed replayed from the log before
+live events, without duplicates.
 """
 
 import asyncio
 import json
-from typing import AsyncGenerator, Dict, Set
+import uuid
+from collections import OrderedDict
+from itertools import count
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
 
 import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import settings
+from app.services.event_bus import event_bus, parse_event_id
 
 logger = structlog.get_logger()
 
+POLICY_LATEST = "latest"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DISCONNECT = "disconnect"
+
+# Event types where only the latest event per request matters
+COALESCED_EVENT_TYPES = {"job.progress", "embedding.progress"}
+
+KEEPALIVE_SECONDS = 30.0
+
+SSE_BUFFERED_BYTES = Gauge(
+    "taskflow_sse_buffered_bytes", "Event bytes waiting in SSE client buffers"
+)
+SSE_CLIENT_BUFFERED_BYTES = Histogram(
+    "taskflow_sse_client_buffered_bytes",
+    "Bytes buffered for one SSE client, observed as events are queued",
+    buckets=(1024, 8192, 65536, 262144, 1048576, 4194304),
+)
+SSE_EVENTS_DROPPED = Counter(
+    "taskflow_sse_events_dropped_total",
+    "SSE events not delivered to a client, by reason "
+    "(coalesced, overflow, disconnect, replay_limit)",
+    ["reason"],
+)
+
 
 class SSEClient:
     """Represents a connected SSE client"""
 
-    def __init__(self, request_id: int):
+    def __init__(
+        self,
+        request_id: Optional[int],
+        max_events: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        policy: Optional[str] = None,
+    ):
+        # The request this client was opened for (None for a multiplexed stream)
         self.request_id = request_id
-        self.queue: asyncio.Queue = asyncio.Queue()
+        # Requests whose events this client receives
+        self.request_ids: Set[int] = set()
+        self.stream_id = uuid.uuid4().hex
+        self.max_events = max(1, max_events or settings.sse_client_buffer_events)
+        self.max_bytes = max(1, max_bytes or settings.sse_client_buffer_bytes)
+        self.policy = policy or settings.sse_slow_client_policy
+        # Queued events in delivery order; coalesced progress events are keyed by
+        # (request_id, type), everything else by a sequence number
+        self._events: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._sequence = count()
+        self._ready = asyncio.Event()
+        self.buffered_bytes = 0
+        # Set once the client was cut off; later events are ignored
+        self.closed = False
+        # Ids of replayed events, so their live copies are not delivered twice
+        self._replayed: Set[str] = set()
+
+    async def send_event(self, event_type: str, data: Dict, encoded: Optional[str] = None):
+        """Queue an event for this client (``encoded``: data already serialized as JSON)"""
+        if self.closed:
+            return
+        event_id = data.get("id")
+        if event_id is not None and event_id in self._replayed:
+            return
+        if encoded is None:
+            encoded = json.dumps(data)
+
+        key: Any
+        if self.policy != POLICY_DROP_OLDEST and event_type in COALESCED_EVENT_TYPES:
+            key = (data.get("request_id", self.request_id), event_type)
+            if key in self._events:
+                self._remove(key)
+                SSE_EVENTS_DROPPED.labels(reason="coalesced").inc()
+        else:
+            key = next(self._sequence)
+
+        size = len(encoded)
+        while self._events and (
+            len(self._events) >= self.max_events or self.buffered_bytes + size > self.max_bytes
+        ):
+            if self.policy == POLICY_DISCONNECT:
+                self._cut_off()
+                return
+            self._remove(next(iter(self._events)))
+            SSE_EVENTS_DROPPED.labels(reason="overflow").inc()
 
-    async def send_event(self, event_type: str, data: Dict):
-        """Queue an event for this client"""
-        await self.queue.put({"type": event_type, "data": data})
+        self._events[key] = {"type": event_type, "encoded": encoded, "id": event_id}
+        self.buffered_bytes += size
+        SSE_BUFFERED_BYTES.inc(size)
+        SSE_CLIENT_BUFFERED_BYTES.observe(self.buffered_bytes)
+        self._ready.set()
+
+    def replay(self, events: List[Dict[str, Any]]):
+        """Queue logged events ahead of the live ones, dropping live copies of them"""
+        self._replayed.update(event["id"] for event in events)
+        for key in [key for key, queued in self._events.items() if queued["id"] in self._replayed]:
+            self._remove(key)
+
+        live = list(self._events.items())
+        self._events.clear()
+        for event in events:
+            encoded = json.dumps(event)
+            self._events[next(self._sequence)] = {
+                "type": event.get("type", "update"),
+                "encoded": encoded,
+                "id": event["id"],
+            }
+            self.buffered_bytes += len(encoded)
+            SSE_BUFFERED_BYTES.inc(len(encoded))
+        self._events.update(live)
+        if self._events:
+            self._ready.set()
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The next queued event, or None when nothing arrives within ``timeout``"""
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+            if not self._events:
+                return None
+        return self._remove(next(iter(self._events)))
+
+    def release(self):
+        """Drop whatever is still buffered (the client went away)"""
+        SSE_BUFFERED_BYTES.dec(self.buffered_bytes)
+        self._events.clear()
+        self.buffered_bytes = 0
+        self.closed = True
+
+    def _remove(self, key: Any) -> Dict[str, Any]:
+        event = self._events.pop(key)
+        self.buffered_bytes -= len(event["encoded"])
+        SSE_BUFFERED_BYTES.dec(len(event["encoded"]))
+        return event
+
+    def _cut_off(self):
+        SSE_EVENTS_DROPPED.labels(reason="disconnect").inc(len(self._events))
+        logger.warning(
+            "Disconnecting slow SSE client",
+            request_id=self.request_id,
+            buffered_bytes=self.buffered_bytes,
+        )
+        self.release()
+        resync = json.dumps({"request_id": self.request_id, "reason": "slow_consumer"})
+        self._events[next(self._sequence)] = {"type": "resync", "encoded": resync, "id": None}
+        self.buffered_bytes = len(resync)
+        SSE_BUFFERED_BYTES.inc(len(resync))
+        self._ready.set()
 
 
 class SSEManager:
@@ -29,37 +187,124 @@ class SSEManager:
     def __init__(self):
         # Map of request_id to set of connected clients
         self._clients: Dict[int, Set[SSEClient]] = {}
+        # Multiplexed clients by stream id, so their request set can be changed
+        self._streams: Dict[str, SSEClient] = {}
         self._lock = asyncio.Lock()
+        # Called with a request_id when its first client connects or its last one leaves
+        self.on_clients_changed: Optional[Callable[[int], Awaitable[None]]] = None
+
+    def has_clients(self, request_id: int) -> bool:
+        """Whether any client on this replica watches the request"""
+        return bool(self._clients.get(request_id))
+
+    async def _clients_changed(self, request_id: int):
+        if self.on_clients_changed:
+            try:
+                await self.on_clients_changed(request_id)
+            except Exception as e:
+                logger.error(
+                    "Failed to update event subscription", request_id=request_id, error=str(e)
+                )
 
-    async def connect(self, request_id: int) -> SSEClient:
-        """Register a new SSE client for a request"""
+    def get_stream(self, stream_id: str) -> Optional[SSEClient]:
+        """The multiplexed client with this stream id, if it is connected to this replica"""
+        return self._streams.get(stream_id)
+
+    async def connect(self, request_id: Optional[int] = None) -> SSEClient:
+        """Register a new SSE client for a request, or a multiplexed client without one"""
         client = SSEClient(request_id)
 
-        async with self._lock:
-            if request_id not in self._clients:
-                self._clients[request_id] = set()
-            self._clients[request_id].add(client)
+        if request_id is None:
+            self._streams[client.stream_id] = client
+        else:
+            await self.watch(client, [request_id])
 
         logger.info(
             "SSE client connected",
             request_id=request_id,
-            total_clients=len(self._clients[request_id]),
+            stream_id=client.stream_id,
+            total_clients=(
+                len(self._clients.get(request_id, ())) if request_id is not None else None
+            ),
         )
 
         # Send initial connection event
-        await client.send_event("connected", {"request_id": request_id})
+        await client.send_event(
+            "connected", {"request_id": request_id, "stream_id": client.stream_id}
+        )
 
         return client
 
-    async def disconnect(self, request_id: int, client: SSEClient):
-        """Remove a client connection"""
+    async def watch(self, client: SSEClient, request_ids: Iterable[int]) -> List[int]:
+        """Deliver the events of more requests to a client; returns the newly watched ids"""
+        added: List[int] = []
+        first: List[int] = []
         async with self._lock:
-            if request_id in self._clients:
-                self._clients[request_id].discard(client)
-                if not self._clients[request_id]:
-                    del self._clients[request_id]
+            for request_id in request_ids:
+                if request_id in client.request_ids:
+                    continue
+                client.request_ids.add(request_id)
+                clients = self._clients.setdefault(request_id, set())
+                clients.add(client)
+                added.append(request_id)
+                if len(clients) == 1:
+                    first.append(request_id)
+
+        for request_id in first:
+            await self._clients_changed(request_id)
+        return added
+
+    async def unwatch(self, client: SSEClient, request_ids: Iterable[int]):
+        """Stop delivering the events of some requests to a client"""
+        emptied: List[int] = []
+        async with self._lock:
+            for request_id in request_ids:
+                if request_id not in client.request_ids:
+                    continue
+                client.request_ids.discard(request_id)
+                clients = self._clients.get(request_id)
+                if clients is not None:
+                    clients.discard(client)
+                    if not clients:
+                        del self._clients[request_id]
+                        emptied.append(request_id)
+
+        for request_id in emptied:
+            await self._clients_changed(request_id)
+
+    async def replay_missed(self, client: SSEClient, last_event_id: Optional[str]):
+        """Replay the client's requests' logged events after ``last_event_id`` (Last-Event-ID)
 
-        logger.info("SSE client disconnected", request_id=request_id)
+        When more were missed than EVENT_REPLAY_MAX, nothing is replayed and the
+        client gets a ``resync`` event to reload the requests' state instead.
+        """
+        if parse_event_id(last_event_id) is None or not client.request_ids:
+            return
+
+        limit = settings.event_replay_max
+        try:
+            events = await event_bus.read_log(
+                sorted(client.request_ids), str(last_event_id), limit + 1
+            )
+        except Exception as e:
+            # The status snapshot still tells the client where its requests stand
+            logger.warning("Failed to replay missed events", error=str(e))
+            return
+        if len(events) > limit:
+            SSE_EVENTS_DROPPED.labels(reason="replay_limit").inc(len(events))
+            await client.send_event(
+                "resync", {"request_id": client.request_id, "reason": "replay_limit"}
+            )
+            return
+        client.replay(events)
+
+    async def disconnect(self, request_id: Optional[int], client: SSEClient):
+        """Remove a client connection"""
+        await self.unwatch(client, list(client.request_ids))
+        self._streams.pop(client.stream_id, None)
+        client.release()
+
+        logger.info("SSE client disconnected", request_id=request_id, stream_id=client.stream_id)
 
     async def broadcast_to_request(self, request_id: int, event_type: str, data: Dict):
         """Broadcast an event to all clients watching a specific request"""
@@ -74,8 +319,9 @@ class SSEManager:
                 client_count=len(clients),
             )
 
-            # Send to all clients concurrently
-            tasks = [client.send_event(event_type, data) for client in clients]
+            # Serialize once for all clients, then send to them concurrently
+            encoded = json.dumps(data)
+            tasks = [client.send_event(event_type, data, encoded) for client in clients]
             await asyncio.gather(*tasks, return_exceptions=True)
 
     async def generate_events(self, client: SSEClient) -> AsyncGenerator[str, None]:
@@ -83,19 +329,17 @@ class SSEManager:
         try:
             while True:
                 # Wait for events with timeout for keepalive
-                try:
-                    event = await asyncio.wait_for(client.queue.get(), timeout=30.0)
-
-                    # Format as SSE
-                    if event["type"] == "keepalive":
-                        yield ": keepalive\\n\\n"
-                    else:
-                        yield f"event: {event['type']}\\n"
-                        yield f"data: {json.dumps(event['data'])}\\n\\n"
-
-                except asyncio.TimeoutError:
-                    # Send keepalive
-                    yield ": keepalive\\n\\n"
+                event = await client.next_event(timeout=KEEPALIVE_SECONDS)
+                if event is None or event["type"] == "keepalive":
+                    yield ": keepalive\n\n"
+                    continue
+
+                # Format as SSE
+                id_line = f"id: {event['id']}\n" if event["id"] is not None else ""
+                yield f"{id_line}event: {event['type']}\ndata: {event['encoded']}\n\n"
+                if event["type"] == "resync" and client.closed:
+                    # Slow client was cut off; end the stream so it reconnects
+                    return
 
         except asyncio.CancelledError:
             # Client disconnected
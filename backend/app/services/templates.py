@@ -0,0 +1,130 @@
+"""
+Compiled templates for prompts and embedding text
+
+A template is parsed once into a render plan: its placeholders and a
+positional format string for the literal text around them. Rendering looks up
+each placeholder once and fills the plan in a single str.format pass, instead
+of scanning the whole text once per context key. Compiled templates are cached
+by source, so each workflow's templates are parsed once per process.
+
+Three placeholder syntaxes are in use:
+- FORMAT: block prompts, ``{name}`` with str.format rules (``{{`` escapes,
+  format specs); a missing name is an error. These render with str.format,
+  which is already single-pass; compiling validates them and lists their names.
+- BRACES: worker embedding templates, ``{name}`` where the name may contain
+  spaces; unknown placeholders are left as written.
+- MUSTACHE: backend embedding templates, ``{{ name }}``; unknown placeholders
+  render as empty text.
+
+The AI worker has a copy of this module (ai_pipeline/templates.py); keep them in step.
+"""
+
+import re
+import string
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+FORMAT = "format"
+BRACES = "braces"
+MUSTACHE = "mustache"
+
+_PATTERNS = {
+    BRACES: re.compile(r"\{([^{}]+)\}"),
+    MUSTACHE: re.compile(r"\{\{([^}]+)\}\}"),
+}
+
+_FORMATTER = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """A template that cannot be parsed"""
+
+
+class Template:
+    """A parsed template, rendered with ``render(context)``"""
+
+    __slots__ = ("source", "syntax", "placeholders", "_plan", "_defaults")
+
+    def __init__(
+        self,
+        source: str,
+        syntax: str,
+        plan: Optional[str],
+        placeholders: Tuple[str, ...],
+        defaults: Tuple[Optional[str], ...],
+    ):
+        self.source = source
+        self.syntax = syntax
+        # Placeholder names in order of first use
+        self.placeholders = placeholders
+        # Positional format string, or None when the template is rendered with str.format itself
+        self._plan = plan
+        # Text for a missing placeholder, or None when a missing placeholder is an error
+        self._defaults = defaults
+
+    def missing(self, context: Mapping[str, Any]) -> List[str]:
+        """Placeholders that ``context`` does not provide and that have no default"""
+        return [
+            name
+            for name, default in zip(self.placeholders, self._defaults)
+            if default is None and name not in context
+        ]
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        """Fill in the placeholders from ``context`` (KeyError for a missing FORMAT placeholder)"""
+        if self._plan is None:
+            return self.source.format_map(context)
+        values = []
+        for name, default in zip(self.placeholders, self._defaults):
+            if name in context:
+                values.append(context[name])
+            elif default is not None:
+                values.append(default)
+            else:
+                raise KeyError(name)
+        return self._plan.format(*values)
+
+
+@lru_cache(maxsize=512)
+def compile_template(source: str, syntax: str = FORMAT) -> Template:
+    """Parse ``source`` once; later calls with the same template reuse the result"""
+    if syntax == FORMAT:
+        return _compile_format(source)
+    pattern = _PATTERNS[syntax]
+
+    plan = []
+    names: Dict[str, int] = {}
+    defaults: List[Optional[str]] = []
+    position = 0
+    for match in pattern.finditer(source):
+        start = match.start()
+        plan.append(_escape(source[position:start]))
+        name = match.group(1) if syntax == BRACES else match.group(1).strip()
+        if name not in names:
+            names[name] = len(names)
+            # BRACES keeps an unknown placeholder as written, MUSTACHE drops it
+            defaults.append(match.group(0) if syntax == BRACES else "")
+        plan.append(f"{{{names[name]}}}")
+        position = match.end()
+    plan.append(_escape(source[position:]))
+    return Template(source, syntax, "".join(plan), tuple(names), tuple(defaults))
+
+
+def _compile_format(source: str) -> Template:
+    try:
+        parsed = list(_FORMATTER.parse(source))
+    except ValueError as e:
+        raise TemplateError(f"Invalid template: {e}") from e
+
+    # str.format already renders in one pass, so the plan is the template itself;
+    # parsing up front validates it and lists the names it needs
+    names: Dict[str, None] = {}
+    for _, field_name, _, _ in parsed:
+        if field_name:
+            # "{item.name}" and "{items[0]}" look up "item" / "items"
+            names[field_name.split(".")[0].split("[")[0]] = None
+    return Template(source, FORMAT, None, tuple(names), tuple(None for _ in names))
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
@@ -0,0 +1,291 @@
+"""
+Webhook delivery worker
+
+Deliveries are rows of the webhook_deliveries outbox, written in one
+transaction when an event fires (WebhookService.trigger_webhooks), so they
+survive a restart. The worker claims due rows in batches with FOR UPDATE SKIP
+LOCKED, which lets every API replica drain the outbox without sending a
+delivery twice, and leases them while it sends.
+
+Sends share one pooled HTTP client. Each webhook gets at most
+WEBHOOK_ENDPOINT_CONCURRENCY sends at a time and its own circuit breaker, so a
+slow or failing receiver holds back only its own deliveries. The outcomes of a
+batch are written back in one statement. A failed attempt is retried with
+exponential backoff until the webhook's retry_count is used up; a delivery
+refused by an open circuit is rescheduled without using an attempt.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, cast
+
+import httpx
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import bindparam, or_, select, update
+
+from app.config import settings
+from app.models.database import get_db_session
+from app.models.schemas import Webhook, WebhookDelivery
+from app.models.webhook_models import WebhookDeliveryStatus
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.webhook_service import build_headers
+
+logger = structlog.get_logger()
+
+MAX_BACKOFF_SECONDS = 60
+
+WEBHOOK_DELIVERIES = Counter(
+    "taskflow_webhook_deliveries_total",
+    "Webhook delivery attempts by outcome (success, retry, failed, deferred)",
+    ["outcome"],
+)
+
+# Columns written back after an attempt, as one executemany per batch
+OUTCOME_COLUMNS = (
+    "status",
+    "attempts",
+    "response_status",
+    "response_body",
+    "error_message",
+    "delivered_at",
+    "next_attempt_at",
+    "locked_until",
+)
+_deliveries = WebhookDelivery.__table__
+RECORD_OUTCOME = (
+    update(_deliveries)
+    .where(_deliveries.c.id == bindparam("delivery_id"))
+    .values({column: bindparam(f"new_{column}") for column in OUTCOME_COLUMNS})
+)
+
+
+@dataclass
+class _Attempt:
+    """A claimed delivery, detached from the session that claimed it"""
+
+    delivery_id: int
+    webhook_id: int
+    attempts: int
+    retry_count: int
+    url: str
+    body: bytes
+    headers: Dict[str, str]
+    timeout_seconds: int
+
+
+class WebhookDeliveryWorker:
+    """Sends the deliveries queued in the webhook outbox"""
+
+    def __init__(self):
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._breakers: Dict[int, CircuitBreaker] = {}
+
+    async def start(self):
+        """Start the delivery worker"""
+        if self._running:
+            return
+
+        self._running = True
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self._task = asyncio.create_task(self._run())
+        logger.info("Webhook delivery worker started")
+
+    async def stop(self):
+        """Stop the delivery worker; claimed deliveries are retried when their lease expires"""
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        logger.info("Webhook delivery worker stopped")
+
+    def notify(self):
+        """Deliveries were queued; look for due ones without waiting for the next poll"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while self._running:
+            self._wakeup.clear()
+            try:
+                claimed = await self.deliver_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Webhook delivery failed", error=str(e))
+                claimed = 0
+
+            if claimed >= settings.webhook_delivery_batch_size:
+                # A full batch: more deliveries are probably due
+                continue
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.webhook_poll_interval_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def deliver_due(self) -> int:
+        """Claim one batch of due deliveries, send them and record the outcomes"""
+        attempts = await self._claim()
+        if not attempts:
+            return 0
+
+        outcomes = await asyncio.gather(*(self._send(attempt) for attempt in attempts))
+        async with get_db_session() as db:
+            await db.execute(RECORD_OUTCOME, list(outcomes))
+            await db.commit()
+        return len(attempts)
+
+    async def _claim(self) -> List[_Attempt]:
+        now = datetime.utcnow()
+        async with get_db_session() as db:
+            rows = (
+                await db.execute(
+                    select(WebhookDelivery, Webhook)
+                    .join(Webhook, Webhook.id == WebhookDelivery.webhook_id)
+                    .where(WebhookDelivery.status == WebhookDeliveryStatus.PENDING.value)
+                    # Deliveries to a deactivated webhook wait until it is reactivated
+                    .where(Webhook.is_active)
+                    .where(WebhookDelivery.next_attempt_at <= now)
+                    .where(
+                        or_(
+                            WebhookDelivery.locked_until.is_(None),
+                            WebhookDelivery.locked_until < now,
+                        )
+                    )
+                    .order_by(WebhookDelivery.next_attempt_at)
+                    .limit(settings.webhook_delivery_batch_size)
+                    .with_for_update(of=WebhookDelivery, skip_locked=True)
+                )
+            ).all()
+            if not rows:
+                return []
+
+            attempts = []
+            for delivery, webhook in rows:
+                body = json.dumps(delivery.event_data).encode()
+                headers = build_headers(
+                    webhook, cast(str, delivery.event_type), delivery.event_data
+                )
+                headers["X-TaskFlow-Delivery-ID"] = str(delivery.id)
+                attempts.append(
+                    _Attempt(
+                        delivery_id=cast(int, delivery.id),
+                        webhook_id=cast(int, webhook.id),
+                        attempts=cast(int, delivery.attempts) or 0,
+                        retry_count=cast(int, webhook.retry_count) or 0,
+                        url=cast(str, webhook.url),
+                        body=body,
+                        headers=headers,
+                        timeout_seconds=cast(int, webhook.timeout_seconds),
+                    )
+                )
+
+            lease = now + timedelta(seconds=settings.webhook_delivery_lease_seconds)
+            await db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_([attempt.delivery_id for attempt in attempts]))
+                .values(locked_until=lease)
+            )
+            await db.commit()
+        return attempts
+
+    async def _send(self, attempt: _Attempt) -> Dict[str, Any]:
+        """Send one delivery; returns the outcome as RECORD_OUTCOME parameters"""
+        assert self._client is not None
+        outcome: Dict[str, Any] = {
+            "status": WebhookDeliveryStatus.PENDING.value,
+            "attempts": attempt.attempts + 1,
+            "response_status": None,
+            "response_body": None,
+            "error_message": None,
+            "delivered_at": None,
+            "next_attempt_at": None,
+            "locked_until": None,
+        }
+
+        try:
+            # Queued sends re-check the circuit once they get a slot
+            async with self._semaphore(attempt.webhook_id):
+                async with self._breaker(attempt.webhook_id).guard():
+                    response = await self._client.post(
+                        attempt.url,
+                        content=attempt.body,
+                        headers=attempt.headers,
+                        timeout=attempt.timeout_seconds,
+                    )
+                    response.raise_for_status()
+        except CircuitOpenError as e:
+            WEBHOOK_DELIVERIES.labels(outcome="deferred").inc()
+            outcome["attempts"] = attempt.attempts
+            outcome["error_message"] = str(e)
+            # Not before the next poll, so a half-open probe in flight is not raced
+            delay = max(e.retry_after, settings.webhook_poll_interval_seconds)
+            outcome["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+            return self._as_parameters(attempt, outcome)
+        except httpx.HTTPStatusError as e:
+            outcome["response_status"] = e.response.status_code
+            outcome["response_body"] = e.response.text[:1000]
+            outcome["error_message"] = f"HTTP {e.response.status_code}: {e.response.text[:500]}"
+        except Exception as e:
+            outcome["error_message"] = str(e) or type(e).__name__
+        else:
+            WEBHOOK_DELIVERIES.labels(outcome="success").inc()
+            outcome["status"] = WebhookDeliveryStatus.SUCCESS.value
+            outcome["response_status"] = response.status_code
+            outcome["response_body"] = response.text[:1000]
+            outcome["delivered_at"] = datetime.utcnow()
+            return self._as_parameters(attempt, outcome)
+
+        if outcome["attempts"] > attempt.retry_count:
+            WEBHOOK_DELIVERIES.labels(outcome="failed").inc()
+            outcome["status"] = WebhookDeliveryStatus.FAILED.value
+            logger.error(
+                f"Failed to deliver webhook {attempt.webhook_id} after "
+                f"{outcome['attempts']} attempts",
+                error=outcome["error_message"],
+            )
+        else:
+            # Exponential backoff, max 60 seconds
+            WEBHOOK_DELIVERIES.labels(outcome="retry").inc()
+            delay = min(2 ** outcome["attempts"], MAX_BACKOFF_SECONDS)
+            outcome["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+        return self._as_parameters(attempt, outcome)
+
+    @staticmethod
+    def _as_parameters(attempt: _Attempt, outcome: Dict[str, Any]) -> Dict[str, Any]:
+        parameters = {f"new_{column}": outcome[column] for column in OUTCOME_COLUMNS}
+        parameters["delivery_id"] = attempt.delivery_id
+        return parameters
+
+    def _semaphore(self, webhook_id: int) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(webhook_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, settings.webhook_endpoint_concurrency))
+            self._semaphores[webhook_id] = semaphore
+        return semaphore
+
+    def _breaker(self, webhook_id: int) -> CircuitBreaker:
+        breaker = self._breakers.get(webhook_id)
+        if breaker is None:
+            breaker = CircuitBreaker(f"webhook_{webhook_id}")
+            self._breakers[webhook_id] = breaker
+        return breaker
+
+
+# Global webhook delivery worker instance
+webhook_delivery_worker = WebhookDeliveryWorker()
@@ -0,0 +1,89 @@
+"""
+Cached index of webhook subscriptions
+
+Every published event used to open a DB session and look for subscribed
+webhooks, even when none exist. The index keeps the ids of active webhooks by
+event type in memory, so an event nobody subscribed to costs a dict lookup.
+
+The webhooks API announces changes on a Redis channel; every replica's event
+bridge receives it and drops its index, which is reloaded on the next event.
+The index is also reloaded after WEBHOOK_INDEX_TTL_SECONDS, and when the bridge
+reconnects, in case an announcement was missed.
+"""
+
+import asyncio
+import time
+from typing import Dict, FrozenSet, Optional
+
+import structlog
+from sqlalchemy import select
+
+from app.config import settings
+from app.models.database import get_db_session
+from app.models.schemas import Webhook
+from app.services.event_bus import event_bus
+
+logger = structlog.get_logger()
+
+# Redis channel announcing webhook changes to every API replica
+WEBHOOK_CONTROL_CHANNEL = "taskflow.webhooks.changed"
+
+
+class WebhookIndex:
+    """Ids of active webhooks by the event types they subscribe to"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = (
+            ttl_seconds if ttl_seconds is not None else settings.webhook_index_ttl_seconds
+        )
+        self._by_event: Dict[str, FrozenSet[int]] = {}
+        self._loaded_at: Optional[float] = None
+        # Bumped by invalidate(), so a load that raced with a change is not kept
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def subscribers(self, event_type: str) -> FrozenSet[int]:
+        """Ids of the active webhooks subscribed to an event type"""
+        if not self._is_fresh():
+            async with self._lock:
+                if not self._is_fresh():
+                    await self._load()
+        return self._by_event.get(event_type, frozenset())
+
+    def invalidate(self):
+        """Drop the index; the next event reloads it"""
+        self._generation += 1
+        self._loaded_at = None
+
+    async def _load(self):
+        generation = self._generation
+        async with get_db_session() as db:
+            rows = (
+                await db.execute(select(Webhook.id, Webhook.events).where(Webhook.is_active))
+            ).all()
+
+        by_event: Dict[str, set] = {}
+        for row in rows:
+            for event_type in row.events or ():
+                by_event.setdefault(event_type, set()).add(row.id)
+        self._by_event = {event_type: frozenset(ids) for event_type, ids in by_event.items()}
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
+        logger.debug("Loaded webhook index", webhooks=len(rows), event_types=len(self._by_event))
+
+
+async def announce_webhooks_changed():
+    """Tell every replica (this one included) to reload its webhook index"""
+    webhook_index.invalidate()
+    try:
+        await event_bus.publish_internal(WEBHOOK_CONTROL_CHANNEL, {})
+    except Exception as e:
+        # Other replicas still pick the change up when their index expires
+        logger.warning("Failed to announce webhook change", error=str(e))
+
+
+# Global webhook index instance
+webhook_index = WebhookIndex()
@@ -1,9 +1,8 @@
-import asyncio
 import hashlib
 import hmac
 import json
 from datetime import datetime
-from typing import Any, Dict, Optional, cast
+from typing import Any, Dict, Iterable, Optional, cast
 
 import httpx
 import structlog
@@ -16,130 +15,71 @@ from app.models.webhook_models import WebhookDeliveryStatus
 logger = structlog.get_logger()
 
 
+def build_headers(webhook: Webhook, event_type: str, payload: Any) -> Dict[str, str]:
+    """Request headers for sending ``payload`` to a webhook, signed when it has a secret"""
+    headers: Dict[str, str] = dict(cast(dict, webhook.headers) or {})
+    headers["Content-Type"] = "application/json"
+    headers["X-TaskFlow-Event"] = event_type
+
+    # Add signature if secret token is configured
+    if webhook.secret_token:
+        payload_bytes = json.dumps(payload).encode()
+        signature = hmac.new(
+            cast(str, webhook.secret_token).encode(), payload_bytes, hashlib.sha256
+        ).hexdigest()
+        headers["X-TaskFlow-Signature"] = f"sha256={signature}"
+    return headers
+
+
 class WebhookService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def trigger_webhooks(self, event_type: str, event_data: Dict[str, Any]):
-        """Trigger all active webhooks subscribed to the given event type"""
+    async def trigger_webhooks(
+        self,
+        event_type: str,
+        event_data: Dict[str, Any],
+        webhook_ids: Optional[Iterable[int]] = None,
+    ):
+        """Queue a delivery of the event to every active webhook subscribed to its type
+
+        The deliveries are written to the webhook_deliveries outbox in one transaction
+        and sent by the webhook delivery worker. ``webhook_ids``: the subscribed
+        webhooks, when already known from the webhook index.
+        """
         # Find all active webhooks subscribed to this event
-        result = await self.db.execute(
-            select(Webhook).where(Webhook.is_active).where(Webhook.events.contains([event_type]))
-        )
-        webhooks = result.scalars().all()
-
-        # Create delivery records and trigger deliveries asynchronously
-        delivery_tasks = []
-        for webhook in webhooks:
-            delivery = WebhookDelivery(
-                webhook_id=webhook.id,
-                event_type=event_type,
-                event_data=event_data,
-                status=WebhookDeliveryStatus.PENDING,
-            )
-            self.db.add(delivery)
-            await self.db.commit()
-
-            # Update last_triggered_at
-            await self.db.execute(
-                update(Webhook)
-                .where(Webhook.id == webhook.id)
-                .values(last_triggered_at=datetime.utcnow())
-            )
-            await self.db.commit()
-
-            # Create async task for delivery
-            task = asyncio.create_task(self._deliver_webhook(webhook, delivery))
-            delivery_tasks.append(task)
-
-        # Don't wait for deliveries to complete
-        logger.info(f"Triggered {len(delivery_tasks)} webhooks for event {event_type}")
-
-    async def _deliver_webhook(self, webhook: Webhook, delivery: WebhookDelivery):
-        """Deliver a webhook with retry logic"""
-        for attempt in range(cast(int, webhook.retry_count) + 1):
-            try:
-                delivery.attempts = attempt + 1  # type: ignore[assignment]
-
-                # Prepare headers
-                headers = (  # type: ignore[union-attr]
-                    webhook.headers.copy() if webhook.headers else {}
+        query = select(Webhook.id).where(Webhook.is_active)
+        if webhook_ids is not None:
+            query = query.where(Webhook.id.in_(list(webhook_ids)))
+        else:
+            query = query.where(Webhook.events.contains([event_type]))
+        ids = list((await self.db.execute(query)).scalars().all())
+        if not ids:
+            return
+
+        now = datetime.utcnow()
+        self.db.add_all(
+            [
+                WebhookDelivery(
+                    webhook_id=webhook_id,
+                    event_type=event_type,
+                    event_data=event_data,
+                    status=WebhookDeliveryStatus.PENDING,
+                    next_attempt_at=now,
                 )
-                headers["Content-Type"] = "application/json"  # type: ignore[index]
-                headers["X-TaskFlow-Event"] = cast(str, delivery.event_type)  # type: ignore[index]
-                headers["X-TaskFlow-Delivery-ID"] = str(delivery.id)  # type: ignore[index]
-
-                # Add signature if secret token is configured
-                if webhook.secret_token:
-                    payload_bytes = json.dumps(delivery.event_data).encode()
-                    signature = hmac.new(
-                        cast(str, webhook.secret_token).encode(), payload_bytes, hashlib.sha256
-                    ).hexdigest()
-                    headers["X-TaskFlow-Signature"] = f"sha256={signature}"  # type: ignore[index]
-
-                # Send the webhook
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        cast(str, webhook.url),
-                        json=delivery.event_data,
-                        headers=headers,  # type: ignore[arg-type]
-                        timeout=cast(int, webhook.timeout_seconds),
-                    )
-
-                    delivery.response_status = response.status_code  # type: ignore[assignment]
-                    delivery.response_body = response.text[:1000]  # type: ignore[assignment]
-
-                    if response.is_success:
-                        delivery.status = WebhookDeliveryStatus.SUCCESS  # type: ignore[assignment]
-                        delivery.delivered_at = datetime.utcnow()  # type: ignore[assignment]
-
-                        # Update delivery in database
-                        await self._update_delivery(delivery)
-
-                        logger.info(
-                            f"Successfully delivered webhook {webhook.id} "
-                            f"for event {delivery.event_type}"
-                        )
-                        return
-                    else:
-                        error_msg = f"HTTP {response.status_code}: {response.text[:500]}"
-                        delivery.error_message = error_msg  # type: ignore[assignment]
-
-            except Exception as e:
-                delivery.error_message = str(e)  # type: ignore[assignment]
-                logger.error(f"Error delivering webhook {webhook.id}: {str(e)}")
-
-            # If not the last attempt, wait before retrying
-            if attempt < cast(int, webhook.retry_count):
-                wait_time = min(2**attempt, 60)  # Exponential backoff, max 60 seconds
-                await asyncio.sleep(wait_time)
-
-        # All attempts failed
-        delivery.status = WebhookDeliveryStatus.FAILED  # type: ignore[assignment]
-        await self._update_delivery(delivery)
-        logger.error(
-            f"Failed to deliver webhook {webhook.id} after "
-            f"{cast(int, webhook.retry_count) + 1} attempts"
+                for webhook_id in ids
+            ]
+        )
+        await self.db.execute(
+            update(Webhook).where(Webhook.id.in_(ids)).values(last_triggered_at=now)
         )
+        await self.db.commit()
 
-    async def _update_delivery(self, delivery: WebhookDelivery):
-        """Update delivery record in database"""
-        from app.models.database import get_db_session
-
-        async with get_db_session() as db:
-            await db.execute(
-                update(WebhookDelivery)
-                .where(WebhookDelivery.id == delivery.id)
-                .values(
-                    status=delivery.status,
-                    attempts=delivery.attempts,
-                    response_status=delivery.response_status,
-                    response_body=delivery.response_body,
-                    error_message=delivery.error_message,
-                    delivered_at=delivery.delivered_at,
-                )
-            )
-            await db.commit()
+        # Import here to avoid circular imports
+        from app.services.webhook_delivery import webhook_delivery_worker
+
+        webhook_delivery_worker.notify()
+        logger.info(f"Queued {len(ids)} webhook deliveries for event {event_type}")
 
     async def test_webhook(
         self,
@@ -160,19 +100,8 @@ class WebhookService:
                 "message": f"This is a test webhook for {event_type}",
             }
 
-        # Prepare headers
-        headers = webhook.headers.copy() if webhook.headers else {}  # type: ignore[union-attr]
-        headers["Content-Type"] = "application/json"  # type: ignore[index]
-        headers["X-TaskFlow-Event"] = event_type  # type: ignore[index]
-        headers["X-TaskFlow-Test"] = "true"  # type: ignore[index]
-
-        # Add signature if secret token is configured
-        if webhook.secret_token:
-            payload_bytes = json.dumps(sample_data).encode()
-            signature = hmac.new(
-                cast(str, webhook.secret_token).encode(), payload_bytes, hashlib.sha256
-            ).hexdigest()
-            headers["X-TaskFlow-Signature"] = f"sha256={signature}"  # type: ignore[index]
+        headers = build_headers(webhook, event_type, sample_data)
+        headers["X-TaskFlow-Test"] = "true"
 
         start_time = time.time()
 
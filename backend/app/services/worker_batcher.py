@@ -0,0 +1,143 @@
+"""
+Batched dispatch of workflow jobs to the AI worker
+
+Workflow jobs for the same workflow that start within a short window are sent
+to the worker's /process/batch endpoint together, so the worker can pipeline
+them through the model and save their outputs in one call. Each job still owns
+its status, retries and deferral: every caller gets the outcome for its own
+request back.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+import httpx
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+
+class BatchItemError(Exception):
+    """A single request in a worker batch did not complete"""
+
+    def __init__(
+        self,
+        request_id: int,
+        status_code: int,
+        detail: str,
+        circuit: Optional[str] = None,
+        retry_after: float = 0.0,
+    ):
+        super().__init__(f"Request {request_id} failed in batch ({status_code}): {detail}")
+        self.request_id = request_id
+        self.status_code = status_code
+        self.detail = detail
+        # The worker circuit that rejected the request, when it was rejected by one
+        self.circuit = circuit
+        self.retry_after = retry_after
+
+
+class _Batch:
+    def __init__(self):
+        self.futures: Dict[int, asyncio.Future] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class WorkerBatcher:
+    """Coalesces concurrent workflow jobs per workflow into /process/batch calls"""
+
+    def __init__(self, window: float = 0.25, max_size: int = 8):
+        self.window = window
+        self.max_size = max_size
+        self._open: Dict[int, _Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 1
+
+    async def process(self, workflow_id: int, request_id: int) -> Optional[Dict[str, Any]]:
+        """Run ``request_id`` as part of a batch; None means it should be sent on its own"""
+        loop = asyncio.get_running_loop()
+        batch = self._open.get(workflow_id)
+        if batch is not None and request_id in batch.futures:
+            # The same request twice in one batch would race on its output version
+            self._flush(workflow_id, batch)
+            batch = None
+        if batch is None:
+            batch = _Batch()
+            batch.timer = loop.call_later(self.window, self._flush, workflow_id, batch)
+            self._open[workflow_id] = batch
+
+        future = loop.create_future()
+        batch.futures[request_id] = future
+        if len(batch.futures) >= self.max_size:
+            self._flush(workflow_id, batch)
+        return await future
+
+    def _flush(self, workflow_id: int, batch: _Batch):
+        if self._open.get(workflow_id) is batch:
+            del self._open[workflow_id]
+        if batch.timer:
+            batch.timer.cancel()
+
+        if len(batch.futures) == 1:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_result(None)
+            return
+
+        task = asyncio.create_task(self._run(workflow_id, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, workflow_id: int, batch: _Batch):
+        request_ids = list(batch.futures)
+        logger.info(
+            "Sending workflow batch to AI worker", workflow_id=workflow_id, size=len(request_ids)
+        )
+        try:
+            # The batch holds several long-running jobs, so allow more than a single job's timeout
+            async with httpx.AsyncClient(timeout=1800.0) as client:
+                response = await client.post(
+                    f"{settings.ai_worker_url}/process/batch",
+                    json={"workflow_id": workflow_id, "request_ids": request_ids},
+                )
+                response.raise_for_status()
+                results = {item["request_id"]: item for item in response.json()["results"]}
+        except Exception as e:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for request_id, future in batch.futures.items():
+            if future.done():
+                continue
+            item = results.get(request_id)
+            if item is None:
+                future.set_exception(BatchItemError(request_id, 500, "missing from batch response"))
+            elif item["status"] == "completed":
+                future.set_result(item)
+            elif item["status"] == "unavailable":
+                future.set_exception(
+                    BatchItemError(
+                        request_id,
+                        503,
+                        item.get("error", ""),
+                        circuit=item.get("circuit"),
+                        retry_after=float(item.get("retry_after") or 0.0),
+                    )
+                )
+            else:
+                future.set_exception(BatchItemError(request_id, 500, item.get("error", "")))
+
+
+# A batch can only grow as large as the job slots its jobs hold; capping it there
+# sends a batch as soon as every slot has joined instead of waiting out the window
+worker_batcher = WorkerBatcher(
+    window=settings.worker_batch_window_seconds,
+    max_size=min(settings.worker_batch_max_size, settings.max_concurrent_jobs),
+)
@@ -0,0 +1,187 @@
+"""
+Save-time checks for workflow block definitions
+
+Catches references the AI worker could only discover while running a job, such
+as a block input that projects a field its source block never produces.
+"""
+
+import ast
+import re
+from typing import Any, Dict, List, Optional
+
+from app.models.pydantic_models import WorkflowBlockRequest
+
+# Dotted path into a block output, e.g. "summary" or "entities.0.name"
+SOURCE_FIELD_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)*$")
+
+# What a block condition may contain; mirrors the worker's expression engine
+# (ai_pipeline/conditions.py), so a condition saved here also runs there
+CONDITION_NAMES = {"true", "false", "null", "True", "False", "None", "request_text"}
+CONDITION_FUNCTIONS = {"len", "lower", "upper"}
+CONDITION_NODES = (
+    ast.Expression,
+    ast.BoolOp,
+    ast.And,
+    ast.Or,
+    ast.UnaryOp,
+    ast.Not,
+    ast.USub,
+    ast.Compare,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.In,
+    ast.NotIn,
+    ast.Name,
+    ast.Load,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Constant,
+    ast.List,
+    ast.Tuple,
+    ast.Call,
+)
+
+
+class WorkflowValidationError(ValueError):
+    """A workflow definition that cannot be executed as written"""
+
+
+def validate_blocks(blocks: List[WorkflowBlockRequest]) -> None:
+    """Check block inputs against the blocks they read from"""
+    for block in blocks:
+        # Schema of the value each BLOCK_OUTPUT input passes in (None when unknown)
+        input_schemas: Dict[str, Optional[Dict[str, Any]]] = {}
+        for block_input in block.inputs:
+            if block_input.input_type != "BLOCK_OUTPUT" or block_input.source_block_id is None:
+                continue
+            source_index = block_input.source_block_id
+            if not 0 <= source_index < len(blocks):
+                # Out-of-range references are skipped when the inputs are saved
+                continue
+            source = blocks[source_index]
+            schema = _output_schema(source)
+            if block_input.source_field is not None:
+                schema = _validate_source_field(
+                    block_input.source_field,
+                    schema,
+                    f"Block '{block.name}' input '{block_input.variable_name}'",
+                    source.name,
+                )
+            input_schemas[block_input.variable_name] = schema
+
+        if block.block_type == "MAP":
+            _validate_map_block(block, input_schemas)
+
+        condition = (block.execution_options or {}).get("condition")
+        if condition is not None:
+            earlier = [other.name for other in blocks if other.order < block.order]
+            _validate_condition(block.name, condition, earlier)
+
+
+def _output_schema(block: WorkflowBlockRequest) -> Optional[Dict[str, Any]]:
+    if block.block_type == "MAP":
+        # A map block's output_schema describes one item; the block returns {"items": [...]}
+        return {
+            "type": "object",
+            "properties": {"items": {"type": "array", "items": block.output_schema or {}}},
+        }
+    return block.output_schema
+
+
+def _validate_map_block(
+    block: WorkflowBlockRequest, input_schemas: Dict[str, Optional[Dict[str, Any]]]
+) -> None:
+    max_parallel = (block.execution_options or {}).get("max_parallel")
+    if max_parallel is not None and (
+        not isinstance(max_parallel, int) or isinstance(max_parallel, bool) or max_parallel < 1
+    ):
+        raise WorkflowValidationError(
+            f"Map block '{block.name}': max_parallel must be a positive integer"
+        )
+
+    map_over = (block.execution_options or {}).get("map_over")
+    if map_over is None:
+        map_over = next(iter(input_schemas), None)
+    if map_over is None or map_over not in input_schemas:
+        raise WorkflowValidationError(
+            f"Map block '{block.name}' needs a BLOCK_OUTPUT input to map over"
+        )
+    schema = input_schemas[map_over]
+    if isinstance(schema, dict) and schema.get("type") not in (None, "array"):
+        raise WorkflowValidationError(f"Map block '{block.name}': input '{map_over}' is not a list")
+
+
+def _validate_condition(block_name: str, condition: Any, earlier_blocks: List[str]) -> None:
+    if not isinstance(condition, str) or not condition.strip():
+        raise WorkflowValidationError(f"Block '{block_name}': condition must be an expression")
+    try:
+        tree = ast.parse(condition.strip(), mode="eval")
+    except SyntaxError as e:
+        raise WorkflowValidationError(f"Block '{block_name}': invalid condition: {e.msg}")
+
+    # Conditions name blocks the way the worker stores their outputs
+    known = CONDITION_NAMES | {name.lower().replace(" ", "_") for name in earlier_blocks}
+    functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, CONDITION_NODES):
+            raise WorkflowValidationError(
+                f"Block '{block_name}': '{type(node).__name__}' is not allowed in a condition"
+            )
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name)
+            or node.func.id not in CONDITION_FUNCTIONS
+            or node.keywords
+        ):
+            raise WorkflowValidationError(
+                f"Block '{block_name}': only {', '.join(sorted(CONDITION_FUNCTIONS))} "
+                "may be called in a condition"
+            )
+        if isinstance(node, ast.Subscript) and not isinstance(node.slice, ast.Constant):
+            raise WorkflowValidationError(
+                f"Block '{block_name}': only literal indexes are allowed in a condition"
+            )
+        if isinstance(node, ast.Constant) and not isinstance(
+            node.value, (str, int, float, bool, type(None))
+        ):
+            raise WorkflowValidationError(f"Block '{block_name}': unsupported literal in condition")
+        if (
+            isinstance(node, ast.Name)
+            and id(node) not in functions
+            and node.id not in known
+            and node.id.lower() not in known
+        ):
+            raise WorkflowValidationError(
+                f"Block '{block_name}': condition refers to '{node.id}', "
+                "which is not an earlier block"
+            )
+
+
+def _validate_source_field(
+    source_field: str, schema: Optional[Dict[str, Any]], where: str, source_name: str
+) -> Optional[Dict[str, Any]]:
+    if not SOURCE_FIELD_PATTERN.match(source_field):
+        raise WorkflowValidationError(f"{where}: invalid source_field '{source_field}'")
+
+    # Follow the path as far as the source block's schema describes it
+    for segment in source_field.split("."):
+        if not isinstance(schema, dict):
+            return None
+        if schema.get("type") == "object" and schema.get("properties"):
+            if segment not in schema["properties"]:
+                raise WorkflowValidationError(
+                    f"{where}: block '{source_name}' has no output field '{segment}'"
+                )
+            schema = schema["properties"][segment]
+        elif schema.get("type") == "array" and "items" in schema:
+            if not segment.isdigit():
+                raise WorkflowValidationError(
+                    f"{where}: '{segment}' is not a list index into block '{source_name}'"
+                )
+            schema = schema["items"]
+        else:
+            return None
+    return schema
@@ -0,0 +1,168 @@
+"""
+Unit tests for CircuitBreaker and breaker-aware job dispatch
+
+Tests cover:
+- Opening after consecutive dependency failures
+- Failing fast while open
+- A single half-open probe that closes the circuit on success
+- Ignoring errors that do not indicate an outage
+- Holding jobs whose dependencies are down
+- Holding deferred jobs without losing their type, and deferring only marked rejections
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.models.schemas import JobType
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.services.job_service import JobQueueManager, _circuit_rejection
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    """Keep breaker state local to the process."""
+    fake_redis = AsyncMock()
+    fake_redis.get.return_value = None
+    with patch("app.services.circuit_breaker._get_redis", return_value=fake_redis):
+        yield fake_redis
+
+
+async def _fail(breaker: CircuitBreaker):
+    with pytest.raises(httpx.ConnectError):
+        async with breaker.guard():
+            raise httpx.ConnectError("refused")
+
+
+class TestCircuitBreaker:
+    """Test the CircuitBreaker class."""
+
+    @pytest.mark.asyncio
+    async def test_opens_after_threshold(self):
+        """Test that consecutive failures open the circuit and calls fail fast."""
+        breaker = CircuitBreaker("test-open", failure_threshold=2, recovery_timeout=30)
+
+        await _fail(breaker)
+        assert await breaker.get_state() == CLOSED
+        await _fail(breaker)
+        assert await breaker.get_state() == OPEN
+
+        with pytest.raises(CircuitOpenError):
+            async with breaker.guard():
+                pass
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_closes_circuit(self):
+        """Test that one probe is let through after the recovery timeout."""
+        breaker = CircuitBreaker("test-probe", failure_threshold=1, recovery_timeout=30)
+        await _fail(breaker)
+        breaker._open_until = time.time() - 1
+
+        assert await breaker.get_state() == HALF_OPEN
+        await breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            await breaker.before_call()
+
+        await breaker.record_success()
+        assert await breaker.get_state() == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_failed_probe_reopens(self):
+        """Test that a failing probe opens the circuit again."""
+        breaker = CircuitBreaker("test-reopen", failure_threshold=3, recovery_timeout=30)
+        breaker._open_until = time.time() - 1
+
+        await _fail(breaker)
+
+        assert await breaker.get_state() == OPEN
+
+    @pytest.mark.asyncio
+    async def test_ignores_client_errors(self):
+        """Test that errors the dependency answered with do not count."""
+        breaker = CircuitBreaker("test-client", failure_threshold=1, recovery_timeout=30)
+
+        with pytest.raises(ValueError):
+            async with breaker.guard():
+                raise ValueError("bad input")
+
+        assert await breaker.get_state() == CLOSED
+
+
+class TestBreakerAwareDispatch:
+    """Test that JobQueueManager pauses job types whose dependencies are down."""
+
+    @pytest.mark.asyncio
+    async def test_holds_jobs_with_open_dependency(self):
+        """Test that embedding jobs wait while Qdrant is down but workflows still run."""
+        manager = JobQueueManager()
+        qdrant = CircuitBreaker("qdrant", failure_threshold=1, recovery_timeout=30)
+        ollama = CircuitBreaker("ollama", failure_threshold=1, recovery_timeout=30)
+        await _fail(qdrant)
+
+        with (
+            patch("app.services.job_service.breakers", {"qdrant": qdrant, "ollama": ollama}),
+            patch("app.services.job_service.HELD_JOB_RECHECK_SECONDS", 0.01),
+        ):
+            await manager.add_job("embed", None, JobType.EMBEDDING)
+            await manager.add_job("workflow", None, JobType.WORKFLOW)
+
+            job_id, _ = await manager._next_dispatchable_job()
+            assert job_id == "workflow"
+            assert manager.get_queue_position("embed") == 0
+
+            await qdrant.record_success()
+            job_id, _ = await asyncio.wait_for(manager._next_dispatchable_job(), timeout=1)
+            assert job_id == "embed"
+
+    @pytest.mark.asyncio
+    async def test_deferred_job_keeps_type_and_waits(self):
+        """Test that a job holding itself back from its own run is not dispatched early."""
+        manager = JobQueueManager()
+        ollama = CircuitBreaker("ollama", failure_threshold=1, recovery_timeout=30)
+        runs = []
+
+        async def job():
+            runs.append(1)
+            if len(runs) == 1:
+                manager.hold_job("wf", job(), JobType.WORKFLOW, retry_after=0.2)
+
+        with (
+            patch("app.services.job_service.breakers", {"ollama": ollama}),
+            patch("app.services.job_service.HELD_JOB_RECHECK_SECONDS", 0.01),
+        ):
+            await manager.add_job("wf", job(), JobType.WORKFLOW)
+            _, coro = await manager._next_dispatchable_job()
+            await manager._run_job("wf", coro)
+
+            assert manager.job_types == {"wf": JobType.WORKFLOW}
+            assert manager.deferrals == {"wf": 1}
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(manager._next_dispatchable_job(), timeout=0.1)
+
+            await _fail(ollama)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(manager._next_dispatchable_job(), timeout=0.2)
+
+            await ollama.record_success()
+            _, coro = await asyncio.wait_for(manager._next_dispatchable_job(), timeout=1)
+            await manager._run_job("wf", coro)
+
+        assert len(runs) == 2
+        assert manager.job_types == {} and manager.deferrals == {}
+
+    def test_only_marked_rejections_defer(self):
+        """Test that a 503 counts as a circuit rejection only when the worker names the circuit."""
+        request = httpx.Request("POST", "http://worker/process")
+
+        def error(headers):
+            response = httpx.Response(503, request=request, headers=headers)
+            return httpx.HTTPStatusError("unavailable", request=request, response=response)
+
+        assert _circuit_rejection(error({})) is None
+        assert _circuit_rejection(error({"X-TaskFlow-Circuit": "ollama", "Retry-After": "7"})) == (
+            "ollama",
+            7.0,
+        )
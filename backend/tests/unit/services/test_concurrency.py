@@ -0,0 +1,90 @@
+"""
+Unit tests for AdaptiveConcurrencyLimiter
+
+Tests cover:
+- Enforcing the current limit
+- Additive increase while saturated
+- Multiplicative decrease on overload errors
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.concurrency import AdaptiveConcurrencyLimiter, is_overload_error
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """Test the AdaptiveConcurrencyLimiter class."""
+
+    @pytest.mark.asyncio
+    async def test_enforces_limit(self):
+        """Test that no more than `limit` calls run at once."""
+        limiter = AdaptiveConcurrencyLimiter("test-enforce", initial_limit=2, max_limit=2)
+        current = 0
+        peak = 0
+
+        async def call():
+            nonlocal current, peak
+            async with limiter.acquire():
+                current += 1
+                peak = max(peak, current)
+                await asyncio.sleep(0.01)
+                current -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_increases_when_saturated(self):
+        """Test that successful calls at full utilisation raise the limit."""
+        limiter = AdaptiveConcurrencyLimiter("test-increase", initial_limit=1, max_limit=4)
+
+        for _ in range(3):
+            async with limiter.acquire():
+                pass
+
+        assert limiter.limit > 1
+        assert limiter.limit <= 4
+
+    @pytest.mark.asyncio
+    async def test_backs_off_on_timeout(self):
+        """Test that a timeout cuts the limit multiplicatively."""
+        limiter = AdaptiveConcurrencyLimiter(
+            "test-backoff", initial_limit=10, max_limit=10, backoff_ratio=0.5
+        )
+
+        with pytest.raises(httpx.ReadTimeout):
+            async with limiter.acquire():
+                raise httpx.ReadTimeout("timed out")
+
+        assert limiter.limit == 5
+
+    @pytest.mark.asyncio
+    async def test_ignores_client_errors(self):
+        """Test that non-overload errors leave the limit unchanged."""
+        limiter = AdaptiveConcurrencyLimiter("test-client-error", initial_limit=3, max_limit=3)
+
+        with pytest.raises(ValueError):
+            async with limiter.acquire():
+                raise ValueError("bad input")
+
+        assert limiter.limit == 3
+
+    def test_is_overload_error(self):
+        """Test classification of overload signals."""
+        request = httpx.Request("POST", "http://ollama/api/embeddings")
+        server_error = httpx.HTTPStatusError(
+            "boom", request=request, response=httpx.Response(503, request=request)
+        )
+        not_found = httpx.HTTPStatusError(
+            "missing", request=request, response=httpx.Response(404, request=request)
+        )
+
+        assert is_overload_error(asyncio.TimeoutError())
+        assert is_overload_error(server_error)
+        assert not is_overload_error(not_found)
+        assert not is_overload_error(ValueError("nope"))
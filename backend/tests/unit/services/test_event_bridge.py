@@ -0,0 +1,61 @@
+"""
+Unit tests for selective event subscriptions
+
+Tests cover:
+- Subscribing to a request's channel when its first SSE client connects
+- Keeping one subscription while more clients watch the same request
+- Unsubscribing when the last client leaves
+"""
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.event_bridge import EventBridge
+from app.services.sse_manager import sse_manager
+
+
+@pytest.fixture
+def bridge(monkeypatch):
+    watch = AsyncMock()
+    unwatch = AsyncMock()
+    monkeypatch.setattr("app.services.event_bridge.event_bus.watch", watch)
+    monkeypatch.setattr("app.services.event_bridge.event_bus.unwatch", unwatch)
+    bridge = EventBridge()
+    monkeypatch.setattr(sse_manager, "on_clients_changed", bridge.sync_request)
+    return bridge, watch, unwatch
+
+
+class TestEventBridgeSubscriptions:
+    """Test EventBridge.sync_request driven by SSEManager connects and disconnects."""
+
+    @pytest.mark.asyncio
+    async def test_subscribes_per_watched_request(self, bridge):
+        """Test that a channel is watched from the first client to the last."""
+        _, watch, unwatch = bridge
+
+        first = await sse_manager.connect(41)
+        second = await sse_manager.connect(41)
+        watch.assert_awaited_once_with("taskflow.request.41")
+
+        await sse_manager.disconnect(41, first)
+        unwatch.assert_not_awaited()
+
+        await sse_manager.disconnect(41, second)
+        unwatch.assert_awaited_once_with("taskflow.request.41")
+
+    @pytest.mark.asyncio
+    async def test_requests_are_independent(self, bridge):
+        """Test that each watched request has its own subscription."""
+        event_bridge, watch, unwatch = bridge
+
+        a = await sse_manager.connect(51)
+        b = await sse_manager.connect(52)
+        await sse_manager.disconnect(51, a)
+
+        assert watch.await_count == 2
+        unwatch.assert_awaited_once_with("taskflow.request.51")
+        assert event_bridge._watched == {52}
+
+        await sse_manager.disconnect(52, b)
+        assert event_bridge._watched == set()
@@ -0,0 +1,74 @@
+"""
+Unit tests for the event wire format
+
+Tests cover:
+- Round-tripping events through the msgpack envelope
+- Sending large results by reference
+- Accepting legacy JSON events
+- Attaching the event log id to an encoded event
+- Rejecting unknown envelope versions and garbage
+"""
+
+import json
+
+import msgpack
+import pytest
+
+from app.services.event_codec import EventDecodeError, attach_id, decode_event, encode_event
+
+
+def _event(result):
+    return {
+        "type": "workflow.step.completed",
+        "request_id": 7,
+        "timestamp": "2024-01-01T00:00:00",
+        "payload": {"step_name": "Extract", "result": result},
+    }
+
+
+class TestEventCodec:
+    """Test encode_event and decode_event."""
+
+    def test_round_trip(self):
+        """Test that an event decodes to what was encoded, without the version field."""
+        event = _event({"summary": "short", "entities": [{"name": "ACME"}]})
+
+        assert decode_event(encode_event(event, 16384)) == event
+
+    def test_large_result_is_sent_by_reference(self):
+        """Test that a result over the inline limit is replaced by result_ref."""
+        event = _event({"summary": "x" * 5000})
+
+        decoded = decode_event(encode_event(event, 1024))
+
+        assert "result" not in decoded["payload"]
+        assert decoded["payload"]["step_name"] == "Extract"
+        ref = decoded["payload"]["result_ref"]
+        assert ref["request_id"] == 7 and ref["step_name"] == "Extract"
+        assert ref["size_bytes"] > 5000
+        # The caller's event is left untouched
+        assert event["payload"]["result"] == {"summary": "x" * 5000}
+
+    def test_attach_id(self):
+        """Test that the log id is added to an encoded event and decoded with it."""
+        event = _event({"summary": "short"})
+
+        decoded = decode_event(attach_id(encode_event(event), "1700000000000-3"))
+
+        assert decoded == {**event, "id": "1700000000000-3"}
+
+    def test_legacy_json_is_accepted(self):
+        """Test that JSON events from older publishers still decode."""
+        event = _event(None)
+
+        assert decode_event(json.dumps(event).encode()) == event
+        assert decode_event(json.dumps(event)) == event
+
+    @pytest.mark.parametrize(
+        "data",
+        [msgpack.packb({"v": 2, "type": "job.progress"}), msgpack.packb([1, 2]), b"\xc1"],
+    )
+    def test_rejects_unknown_messages(self, data):
+        """Test that newer envelope versions and non-events are rejected."""
+        with pytest.raises(EventDecodeError):
+            decode_event(data)
@@ -0,0 +1,103 @@
+"""
+Unit tests for pushed job progress
+
+Tests cover:
+- Subscribing to a job's channel while streams watch it
+- Keeping only the latest status events for a slow stream
+- Streaming the snapshot and then pushed changes until the job finishes
+"""
+
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.models.pydantic_models import JobProgressResponse, JobStatus
+from app.routers import jobs
+from app.services.job_progress import WATCHER_QUEUE_SIZE, JobProgressHub
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    watch = AsyncMock()
+    unwatch = AsyncMock()
+    monkeypatch.setattr("app.services.job_progress.event_bus.watch", watch)
+    monkeypatch.setattr("app.services.job_progress.event_bus.unwatch", unwatch)
+    return watch, unwatch
+
+
+class TestJobProgressHub:
+    """Test JobProgressHub.watch and dispatch."""
+
+    @pytest.mark.asyncio
+    async def test_channel_watched_while_streams_watch(self, bus):
+        """Test that one subscription serves every stream watching a job."""
+        watch, unwatch = bus
+        hub = JobProgressHub()
+
+        async with hub.watch("j1") as first:
+            async with hub.watch("j1") as second:
+                hub.dispatch("j1", {"status": "RUNNING"})
+                assert first.get_nowait() == second.get_nowait() == {"status": "RUNNING"}
+            unwatch.assert_not_awaited()
+
+        watch.assert_awaited_once_with("taskflow.job.j1")
+        unwatch.assert_awaited_once_with("taskflow.job.j1")
+
+    @pytest.mark.asyncio
+    async def test_slow_stream_keeps_latest(self, bus):
+        """Test that a full queue drops the oldest status event."""
+        hub = JobProgressHub()
+
+        async with hub.watch("j2") as updates:
+            for index in range(WATCHER_QUEUE_SIZE + 3):
+                hub.dispatch("j2", {"index": index})
+
+            assert updates.qsize() == WATCHER_QUEUE_SIZE
+            assert updates.get_nowait() == {"index": 3}
+
+
+class TestStreamJobProgress:
+    """Test the /api/jobs/{job_id}/stream endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_then_pushed_changes(self, bus, monkeypatch):
+        """Test that the stream reads the job once and then follows pushed events."""
+        hub = JobProgressHub()
+        monkeypatch.setattr(jobs, "job_progress_hub", hub)
+
+        @asynccontextmanager
+        async def session():
+            yield None
+
+        get_job_status = AsyncMock(
+            return_value=JobProgressResponse(
+                job_id="j3",
+                request_id=9,
+                status=JobStatus.PENDING,
+                error_message=None,
+                started_at=None,
+                completed_at=None,
+                created_at=datetime(2024, 1, 1),
+            )
+        )
+        monkeypatch.setattr(jobs, "get_db_session", session)
+        monkeypatch.setattr(jobs.JobService, "get_job_status", get_job_status)
+
+        response = await jobs.stream_job_progress("j3")
+        frames = response.body_iterator
+
+        first = json.loads((await frames.__anext__()).removeprefix("data: "))
+        assert first["status"] == "PENDING" and first["request_id"] == 9
+
+        for status in ("RUNNING", "RUNNING", "COMPLETED"):
+            hub.dispatch("j3", {"type": "job.status", **first, "status": status})
+        remaining = [frame async for frame in frames]
+
+        assert [json.loads(frame.removeprefix("data: "))["status"] for frame in remaining] == [
+            "RUNNING",
+            "COMPLETED",
+        ]
+        get_job_status.assert_awaited_once()
@@ -0,0 +1,68 @@
+"""
+Unit tests for ModelRegistry
+
+Tests cover:
+- Caching the Ollama model listing for the TTL
+- Refreshing after invalidation
+- Error responses when Ollama is unreachable
+"""
+
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from app.services.model_registry import ModelRegistry
+
+
+def _mock_client(get):
+    client = AsyncMock()
+    client.get = get
+    client.__aenter__.return_value = client
+    return client
+
+
+class TestModelRegistry:
+    """Test the ModelRegistry class."""
+
+    @pytest.mark.asyncio
+    async def test_caches_listing_within_ttl(self):
+        """Test that repeated lookups reuse the cached listing."""
+        response = Mock(status_code=200)
+        response.json.return_value = {"models": [{"name": "gemma3:1b", "size": 10}]}
+        get = AsyncMock(return_value=response)
+        registry = ModelRegistry(ollama_host="http://ollama", ttl_seconds=60)
+
+        with patch("app.services.model_registry.httpx.AsyncClient", return_value=_mock_client(get)):
+            first = await registry.list_models()
+            second = await registry.list_models()
+
+        assert first == second
+        assert first["total"] == 1
+        assert first["models"][0]["name"] == "gemma3:1b"
+        assert get.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_forces_refresh(self):
+        """Test that invalidation makes the next lookup hit Ollama."""
+        response = Mock(status_code=200)
+        response.json.return_value = {"models": []}
+        get = AsyncMock(return_value=response)
+        registry = ModelRegistry(ollama_host="http://ollama", ttl_seconds=60)
+
+        with patch("app.services.model_registry.httpx.AsyncClient", return_value=_mock_client(get)):
+            await registry.list_models()
+            registry.invalidate()
+            await registry.list_models()
+
+        assert get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_returns_error_when_unreachable(self):
+        """Test that connection failures produce an empty listing with an error."""
+        get = AsyncMock(side_effect=ConnectionError("refused"))
+        registry = ModelRegistry(ollama_host="http://ollama", ttl_seconds=60)
+
+        with patch("app.services.model_registry.httpx.AsyncClient", return_value=_mock_client(get)):
+            result = await registry.list_models()
+
+        assert result == {"models": [], "total": 0, "error": "refused"}
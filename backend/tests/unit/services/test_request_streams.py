@@ -0,0 +1,78 @@
+"""
+Unit tests for multiplexed stream registration
+
+Tests cover:
+- Refusing to forward a change for a stream that is not registered
+- Forwarding a change once the stream is registered on some replica
+- Refusing again after the stream is unregistered
+"""
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.request_streams import (
+    STREAM_CONTROL_CHANNEL,
+    STREAM_REGISTRATION_TTL_SECONDS,
+    forward_update,
+    register_stream,
+    unregister_stream,
+)
+
+
+class FakeRedis:
+    """Just the key commands stream registration uses"""
+
+    def __init__(self):
+        self.keys = {}
+
+    async def set(self, key, value, ex=None):
+        self.keys[key] = ex
+
+    async def delete(self, key):
+        self.keys.pop(key, None)
+
+    async def exists(self, key):
+        return int(key in self.keys)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(
+        "app.services.request_streams.event_bus.get_redis", AsyncMock(return_value=fake)
+    )
+    return fake
+
+
+@pytest.fixture
+def publish(monkeypatch):
+    # A replica's own bridge always receives the message, whoever holds the stream
+    publish = AsyncMock(return_value=1)
+    monkeypatch.setattr("app.services.request_streams.event_bus.publish_internal", publish)
+    return publish
+
+
+class TestForwardUpdate:
+    """Test forward_update against the Redis stream registry."""
+
+    @pytest.mark.asyncio
+    async def test_unknown_stream_is_not_forwarded(self, redis, publish):
+        """Test that a change for an unregistered stream is refused without publishing."""
+        assert await forward_update("missing", {"add": [1]}) is False
+        publish.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_registered_stream_is_forwarded(self, redis, publish):
+        """Test that a registered stream gets the change, and is refused once unregistered."""
+        await register_stream("s1")
+        assert redis.keys == {"taskflow.sse.stream.s1": STREAM_REGISTRATION_TTL_SECONDS}
+
+        assert await forward_update("s1", {"add": [1], "remove": []}) is True
+        publish.assert_awaited_once_with(
+            STREAM_CONTROL_CHANNEL, {"stream_id": "s1", "add": [1], "remove": []}
+        )
+
+        await unregister_stream("s1")
+        assert await forward_update("s1", {"add": [2]}) is False
+        assert publish.await_count == 1
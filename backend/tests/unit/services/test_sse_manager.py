@@ -0,0 +1,188 @@
+"""
+Unit tests for bounded SSE client buffers
+
+Tests cover:
+- Replacing queued progress events with newer ones (latest policy)
+- Dropping the oldest events when the buffer is full
+- Cutting off a slow client with a resync event (disconnect policy)
+- Formatting events as SSE frames
+- Delivering events of several requests to one multiplexed client
+- Replaying missed events by event id (Last-Event-ID)
+"""
+
+import json
+
+import pytest
+
+from app.services.event_bus import event_bus
+from app.services.sse_manager import SSEClient, sse_manager
+
+
+async def _drain(client):
+    events = []
+    while True:
+        event = await client.next_event(timeout=0.01)
+        if event is None:
+            return events
+        events.append((event["type"], json.loads(event["encoded"])))
+
+
+class TestSSEClientBuffer:
+    """Test SSEClient.send_event under the slow-client policies."""
+
+    @pytest.mark.asyncio
+    async def test_latest_policy_coalesces_progress(self):
+        """Test that only the newest progress event per request stays queued."""
+        client = SSEClient(1, max_events=10, policy="latest")
+        await client.send_event("job.started", {"request_id": 1})
+        for progress in (0.1, 0.2, 0.3):
+            await client.send_event("job.progress", {"request_id": 1, "progress": progress})
+        await client.send_event("job.completed", {"request_id": 1})
+
+        events = await _drain(client)
+
+        assert [event_type for event_type, _ in events] == [
+            "job.started",
+            "job.progress",
+            "job.completed",
+        ]
+        assert events[1][1]["progress"] == 0.3
+        assert client.buffered_bytes == 0
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_when_full(self):
+        """Test that a full buffer keeps the newest events."""
+        client = SSEClient(1, max_events=3, policy="drop_oldest")
+        for step in range(5):
+            await client.send_event("workflow.step.completed", {"step": step})
+
+        events = await _drain(client)
+
+        assert [data["step"] for _, data in events] == [2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_byte_limit(self):
+        """Test that the byte limit bounds the buffer as well as the event count."""
+        client = SSEClient(1, max_events=100, max_bytes=250, policy="drop_oldest")
+        for step in range(5):
+            await client.send_event("workflow.step.completed", {"step": step, "text": "x" * 80})
+
+        assert client.buffered_bytes <= 250
+        assert len(await _drain(client)) == 2
+
+    @pytest.mark.asyncio
+    async def test_disconnect_policy_sends_resync(self):
+        """Test that an overflowing client gets a resync event and nothing after it."""
+        client = SSEClient(7, max_events=2, policy="disconnect")
+        for step in range(3):
+            await client.send_event("workflow.step.completed", {"step": step})
+        await client.send_event("job.completed", {})
+
+        events = await _drain(client)
+
+        assert events == [("resync", {"request_id": 7, "reason": "slow_consumer"})]
+        assert client.closed
+
+    @pytest.mark.asyncio
+    async def test_generate_events_frames(self):
+        """Test that events are written as SSE frames with real line breaks."""
+        client = SSEClient(3, policy="disconnect", max_events=1)
+        await client.send_event("status", {"request_id": 3})
+        await client.send_event("job.progress", {"request_id": 3})
+
+        frames = []
+        async for frame in sse_manager.generate_events(client):
+            frames.append(frame)
+
+        assert frames == ['event: resync\ndata: {"request_id": 3, "reason": "slow_consumer"}\n\n']
+
+
+class TestMultiplexedClients:
+    """Test SSEManager.watch and unwatch for multiplexed streams."""
+
+    @pytest.mark.asyncio
+    async def test_one_client_receives_several_requests(self):
+        """Test that a multiplexed client gets tagged events for the requests it watches."""
+        client = await sse_manager.connect()
+        assert sse_manager.get_stream(client.stream_id) is client
+
+        assert await sse_manager.watch(client, [61, 62, 61]) == [61, 62]
+        await sse_manager.broadcast_to_request(61, "job.progress", {"request_id": 61})
+        await sse_manager.broadcast_to_request(62, "job.progress", {"request_id": 62})
+        await sse_manager.broadcast_to_request(63, "job.progress", {"request_id": 63})
+
+        events = await _drain(client)
+        assert events[0] == ("connected", {"request_id": None, "stream_id": client.stream_id})
+        assert [data["request_id"] for _, data in events[1:]] == [61, 62]
+
+        await sse_manager.unwatch(client, [61])
+        await sse_manager.broadcast_to_request(61, "job.progress", {"request_id": 61})
+        assert await _drain(client) == []
+
+        await sse_manager.disconnect(None, client)
+        assert sse_manager.get_stream(client.stream_id) is None
+        assert not sse_manager.has_clients(62)
+
+
+class TestReplay:
+    """Test replaying logged events to a reconnecting client."""
+
+    @pytest.mark.asyncio
+    async def test_replay_precedes_live_events_without_duplicates(self):
+        """Test that replayed events come first and their live copies are skipped."""
+        client = SSEClient(5)
+        await client.send_event("job.progress", {"request_id": 5, "id": "100-1"})
+        await client.send_event("status", {"request_id": 5})
+
+        client.replay(
+            [
+                {"type": "job.started", "request_id": 5, "id": "100-0"},
+                {"type": "job.progress", "request_id": 5, "id": "100-1"},
+            ]
+        )
+        await client.send_event("job.progress", {"request_id": 5, "id": "100-1"})
+        await client.send_event("job.completed", {"request_id": 5, "id": "100-2"})
+
+        events = await _drain(client)
+        assert [(event_type, data.get("id")) for event_type, data in events] == [
+            ("job.started", "100-0"),
+            ("job.progress", "100-1"),
+            ("status", None),
+            ("job.completed", "100-2"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_generate_events_writes_ids(self):
+        """Test that logged events are framed with their id and other events without one."""
+        client = SSEClient(8)
+        await client.send_event("status", {"request_id": 8})
+        await client.send_event("job.started", {"request_id": 8, "id": "200-0"})
+
+        generator = sse_manager.generate_events(client)
+        frames = [await generator.__anext__(), await generator.__anext__()]
+        await generator.aclose()
+
+        assert frames == [
+            'event: status\ndata: {"request_id": 8}\n\n',
+            'id: 200-0\nevent: job.started\ndata: {"request_id": 8, "id": "200-0"}\n\n',
+        ]
+
+    @pytest.mark.asyncio
+    async def test_replay_limit_sends_resync(self, monkeypatch):
+        """Test that too many missed events are not replayed; the client is told to resync."""
+
+        async def read_log(request_ids, after_id, limit):
+            return [
+                {"type": "job.progress", "request_id": 9, "id": f"300-{n}"} for n in range(limit)
+            ]
+
+        monkeypatch.setattr(event_bus, "read_log", read_log)
+        monkeypatch.setattr("app.services.sse_manager.settings.event_replay_max", 2)
+        client = SSEClient(9)
+        client.request_ids.add(9)
+
+        await sse_manager.replay_missed(client, "not-an-id")
+        assert await _drain(client) == []
+
+        await sse_manager.replay_missed(client, "300-0")
+        assert await _drain(client) == [("resync", {"request_id": 9, "reason": "replay_limit"})]
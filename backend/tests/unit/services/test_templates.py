@@ -0,0 +1,50 @@
+"""
+Unit tests for compiled templates
+
+Tests cover:
+- Rendering {{ }} embedding templates in one pass
+- Leaving unknown placeholders as written for {} embedding templates
+- Validating str.format prompt templates up front
+"""
+
+import pytest
+
+from app.services.templates import BRACES, FORMAT, MUSTACHE, TemplateError, compile_template
+
+
+class TestCompiledTemplates:
+    """Test compile_template and Template.render."""
+
+    def test_mustache_renders_known_and_drops_unknown(self):
+        """Test that {{ }} placeholders are filled, with or without spaces."""
+        template = compile_template("{{REQUEST_TEXT}} | {{ Sum.summary }} | {{missing}}", MUSTACHE)
+
+        assert template.placeholders == ("REQUEST_TEXT", "Sum.summary", "missing")
+        assert template.render({"REQUEST_TEXT": "T", "Sum.summary": "S"}) == "T | S | "
+
+    def test_values_are_not_substituted_again(self):
+        """Test that placeholders inside inserted values are left alone."""
+        template = compile_template("{{a}} {{b}}", MUSTACHE)
+
+        assert template.render({"a": "{{b}}", "b": "x"}) == "{{b}} x"
+
+    def test_braces_keep_unknown_placeholders(self):
+        """Test that unknown {} placeholders and literal braces survive rendering."""
+        template = compile_template("{Block Name}: {unknown} {", BRACES)
+
+        assert template.render({"Block Name": "out"}) == "out: {unknown} {"
+
+    def test_format_templates_are_validated(self):
+        """Test that str.format templates report missing names and reject bad syntax."""
+        template = compile_template("{summary} {{literal}} {item.name}")
+
+        assert template.missing({"summary": "s"}) == ["item"]
+        assert template.render({"summary": "s", "item": type("I", (), {"name": "n"})}) == (
+            "s {literal} n"
+        )
+        with pytest.raises(TemplateError):
+            compile_template("unbalanced {", FORMAT)
+
+    def test_compiled_templates_are_cached(self):
+        """Test that the same template source is parsed once."""
+        assert compile_template("{{x}}", MUSTACHE) is compile_template("{{x}}", MUSTACHE)
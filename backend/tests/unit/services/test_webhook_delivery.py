@@ -0,0 +1,145 @@
+"""
+Unit tests for the webhook delivery worker
+
+Tests cover:
+- Recording a successful delivery with a signed body
+- Rescheduling failed attempts with backoff, then giving up
+- Deferring deliveries while the webhook's circuit is open
+- Limiting concurrent sends per webhook
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.services.webhook_delivery import WebhookDeliveryWorker, _Attempt
+from app.services.webhook_service import build_headers
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    """Keep breaker state local to the process."""
+    fake_redis = AsyncMock()
+    fake_redis.get.return_value = None
+    with patch("app.services.circuit_breaker._get_redis", return_value=fake_redis):
+        yield fake_redis
+
+
+def _worker(handler) -> WebhookDeliveryWorker:
+    worker = WebhookDeliveryWorker()
+    worker._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return worker
+
+
+def _attempt(webhook_id=1, attempts=0, retry_count=3, delivery_id=10) -> _Attempt:
+    webhook = SimpleNamespace(headers={"X-Custom": "1"}, secret_token="s3cret")
+    event = {"type": "job.completed", "request_id": 7}
+    return _Attempt(
+        delivery_id=delivery_id,
+        webhook_id=webhook_id,
+        attempts=attempts,
+        retry_count=retry_count,
+        url="https://hooks.example.com/taskflow",
+        body=json.dumps(event).encode(),
+        headers=build_headers(webhook, "job.completed", event),
+        timeout_seconds=5,
+    )
+
+
+class TestWebhookDeliveryWorker:
+    """Test WebhookDeliveryWorker._send outcomes."""
+
+    @pytest.mark.asyncio
+    async def test_success(self):
+        """Test that a delivered event is recorded as success with a verifiable signature."""
+        received = []
+
+        def handler(request):
+            received.append(request)
+            return httpx.Response(204)
+
+        outcome = await _worker(handler)._send(_attempt())
+
+        assert outcome["delivery_id"] == 10
+        assert outcome["new_status"] == "success"
+        assert outcome["new_attempts"] == 1
+        assert outcome["new_response_status"] == 204
+        assert outcome["new_delivered_at"] is not None
+        request = received[0]
+        expected = hmac.new(b"s3cret", request.content, hashlib.sha256).hexdigest()
+        assert request.headers["X-TaskFlow-Signature"] == f"sha256={expected}"
+        assert request.headers["X-Custom"] == "1"
+
+    @pytest.mark.asyncio
+    async def test_retry_then_fail(self):
+        """Test that failures are retried later until retry_count is used up."""
+        worker = _worker(lambda request: httpx.Response(400, text="bad"))
+
+        retry = await worker._send(_attempt(attempts=1, retry_count=3))
+        assert retry["new_status"] == "pending"
+        assert retry["new_attempts"] == 2
+        assert retry["new_next_attempt_at"] is not None
+        assert retry["new_error_message"] == "HTTP 400: bad"
+        assert retry["new_locked_until"] is None
+
+        failed = await worker._send(_attempt(attempts=3, retry_count=3))
+        assert failed["new_status"] == "failed"
+        assert failed["new_attempts"] == 4
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_defers(self):
+        """Test that an endpoint failing with 5xx stops receiving sends for a while."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503)
+
+        worker = _worker(handler)
+        for _ in range(5):
+            await worker._send(_attempt(webhook_id=2))
+
+        deferred = await worker._send(_attempt(webhook_id=2, attempts=1))
+        assert len(calls) == 5
+        assert deferred["new_status"] == "pending"
+        assert deferred["new_attempts"] == 1
+        assert "open" in deferred["new_error_message"]
+
+        # Other webhooks are unaffected
+        assert (await worker._send(_attempt(webhook_id=3)))["new_attempts"] == 1
+        assert len(calls) == 6
+
+    @pytest.mark.asyncio
+    async def test_concurrency_per_webhook(self, monkeypatch):
+        """Test that one webhook gets at most WEBHOOK_ENDPOINT_CONCURRENCY sends at a time."""
+        monkeypatch.setattr(
+            "app.services.webhook_delivery.settings.webhook_endpoint_concurrency", 2
+        )
+        in_flight = {1: 0, 2: 0}
+        peak = {1: 0, 2: 0}
+
+        async def handler(request):
+            webhook_id = int(request.url.params["w"])
+            in_flight[webhook_id] += 1
+            peak[webhook_id] = max(peak[webhook_id], in_flight[webhook_id])
+            await asyncio.sleep(0.01)
+            in_flight[webhook_id] -= 1
+            return httpx.Response(200)
+
+        worker = _worker(handler)
+        attempts = []
+        for index in range(6):
+            attempt = _attempt(webhook_id=1 + index % 2, delivery_id=index)
+            attempt.url += f"?w={attempt.webhook_id}"
+            attempts.append(attempt)
+
+        outcomes = await asyncio.gather(*(worker._send(attempt) for attempt in attempts))
+
+        assert [outcome["new_status"] for outcome in outcomes] == ["success"] * 6
+        assert peak == {1: 2, 2: 2}
@@ -0,0 +1,93 @@
+"""
+Unit tests for the cached webhook subscription index
+
+Tests cover:
+- Looking up subscribed webhooks by event type from one load
+- Reloading after an invalidation, and not keeping a load that raced with one
+- Publishing events without triggering webhooks when nobody subscribes
+"""
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.event_bus import EventBus
+from app.services.webhook_index import WebhookIndex
+
+
+@pytest.fixture
+def webhooks(monkeypatch):
+    """Active webhooks as (id, events) rows; counts how often they are loaded"""
+    state = SimpleNamespace(rows=[], loads=0, during_load=None)
+
+    @asynccontextmanager
+    async def get_db_session():
+        async def execute(query):
+            state.loads += 1
+            if state.during_load:
+                state.during_load()
+            return MagicMock(all=MagicMock(return_value=list(state.rows)))
+
+        yield SimpleNamespace(execute=execute)
+
+    monkeypatch.setattr("app.services.webhook_index.get_db_session", get_db_session)
+    return state
+
+
+class TestWebhookIndex:
+    """Test WebhookIndex.subscribers and invalidate."""
+
+    @pytest.mark.asyncio
+    async def test_subscribers_by_event_type(self, webhooks):
+        """Test that webhooks are indexed by each of their event types and loaded once."""
+        webhooks.rows = [
+            SimpleNamespace(id=1, events=["job.completed", "job.failed"]),
+            SimpleNamespace(id=2, events=["job.completed"]),
+        ]
+        index = WebhookIndex(ttl_seconds=60)
+
+        assert await index.subscribers("job.completed") == {1, 2}
+        assert await index.subscribers("job.failed") == {1}
+        assert await index.subscribers("job.progress") == frozenset()
+        assert webhooks.loads == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_reloads(self, webhooks):
+        """Test that an invalidated index is reloaded, and a racing load is not kept."""
+        index = WebhookIndex(ttl_seconds=60)
+        assert await index.subscribers("job.completed") == frozenset()
+
+        webhooks.rows = [SimpleNamespace(id=3, events=["job.completed"])]
+        webhooks.during_load = index.invalidate
+        index.invalidate()
+        assert await index.subscribers("job.completed") == {3}
+
+        webhooks.during_load = None
+        await index.subscribers("job.completed")
+        assert webhooks.loads == 3
+
+
+class TestPublishWebhooks:
+    """Test that EventBus.publish consults the index before triggering webhooks."""
+
+    @pytest.mark.asyncio
+    async def test_no_trigger_without_subscribers(self, monkeypatch):
+        """Test that an event nobody subscribes to spawns no webhook task."""
+        subscribers = AsyncMock(return_value=frozenset())
+        monkeypatch.setattr("app.services.webhook_index.webhook_index.subscribers", subscribers)
+        bus = EventBus()
+        bus._redis_client = MagicMock(publish=AsyncMock())
+        trigger = AsyncMock()
+        monkeypatch.setattr(bus, "_trigger_webhooks", trigger)
+
+        await bus.publish("taskflow.job.j1", {"type": "job.status"})
+        subscribers.return_value = frozenset({4})
+        await bus.publish("taskflow.job.j1", {"type": "job.completed"})
+
+        assert [call.args[0] for call in subscribers.await_args_list] == [
+            "job.status",
+            "job.completed",
+        ]
+        trigger.assert_called_once_with({"type": "job.completed"}, frozenset({4}))
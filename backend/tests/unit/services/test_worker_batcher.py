@@ -0,0 +1,86 @@
+"""
+Unit tests for WorkerBatcher
+
+Tests cover:
+- Coalescing concurrent jobs for one workflow into a single batch call
+- Sending a lone job on its own
+- Mapping per-request batch failures to job errors
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from app.services.job_service import _circuit_rejection
+from app.services.worker_batcher import BatchItemError, WorkerBatcher
+
+
+def _mock_worker(results):
+    response = Mock()
+    response.raise_for_status = Mock()
+    response.json.return_value = {"results": results}
+    client = AsyncMock()
+    client.post.return_value = response
+    client_cm = AsyncMock()
+    client_cm.__aenter__.return_value = client
+    return client, client_cm
+
+
+class TestWorkerBatcher:
+    """Test the WorkerBatcher class."""
+
+    @pytest.mark.asyncio
+    async def test_coalesces_jobs_for_same_workflow(self):
+        """Test that concurrent jobs share one /process/batch call."""
+        batcher = WorkerBatcher(window=0.05, max_size=8)
+        client, client_cm = _mock_worker(
+            [
+                {"request_id": 1, "status": "completed", "version": 2},
+                {"request_id": 2, "status": "completed", "version": 1},
+            ]
+        )
+
+        with patch("app.services.worker_batcher.httpx.AsyncClient", return_value=client_cm):
+            first, second = await asyncio.gather(batcher.process(7, 1), batcher.process(7, 2))
+
+        assert first["version"] == 2
+        assert second["version"] == 1
+        client.post.assert_called_once()
+        assert client.post.call_args.kwargs["json"] == {"workflow_id": 7, "request_ids": [1, 2]}
+
+    @pytest.mark.asyncio
+    async def test_lone_job_is_sent_on_its_own(self):
+        """Test that a batch of one tells the caller to use the single-job path."""
+        batcher = WorkerBatcher(window=0.01, max_size=8)
+
+        with patch("app.services.worker_batcher.httpx.AsyncClient") as client_class:
+            assert await batcher.process(7, 1) is None
+
+        client_class.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unavailable_item_is_deferred(self):
+        """Test that an item rejected by an open circuit maps to a deferrable error."""
+        batcher = WorkerBatcher(window=0.05, max_size=2)
+        _, client_cm = _mock_worker(
+            [
+                {"request_id": 1, "status": "completed", "version": 1},
+                {
+                    "request_id": 2,
+                    "status": "unavailable",
+                    "error": "circuit open",
+                    "circuit": "ollama",
+                    "retry_after": 12.0,
+                },
+            ]
+        )
+
+        with patch("app.services.worker_batcher.httpx.AsyncClient", return_value=client_cm):
+            first, second = await asyncio.gather(
+                batcher.process(7, 1), batcher.process(7, 2), return_exceptions=True
+            )
+
+        assert first["status"] == "completed"
+        assert isinstance(second, BatchItemError)
+        assert _circuit_rejection(second) == ("ollama", 12.0)
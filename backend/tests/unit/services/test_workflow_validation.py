@@ -0,0 +1,150 @@
+"""
+Unit tests for workflow save-time validation
+
+Tests cover:
+- Accepting source_field paths that the source block's schema describes
+- Rejecting fields the source block never produces
+- Rejecting malformed paths
+- Requiring map blocks to iterate over a list with a positive max_parallel
+- Checking block conditions against earlier blocks and the worker's allowed expressions
+"""
+
+import pytest
+
+from app.models.pydantic_models import WorkflowBlockInputRequest, WorkflowBlockRequest
+from app.services.workflow_validation import WorkflowValidationError, validate_blocks
+
+
+def _blocks(source_field, block_type="CUSTOM"):
+    extract = WorkflowBlockRequest(
+        name="Extract",
+        prompt="Extract from {text}",
+        order=0,
+        output_schema={
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "entities": {
+                    "type": "array",
+                    "items": {"type": "object", "properties": {"name": {"type": "string"}}},
+                },
+            },
+        },
+        inputs=[WorkflowBlockInputRequest(input_type="REQUEST_TEXT", variable_name="text")],
+    )
+    classify = WorkflowBlockRequest(
+        name="Classify",
+        prompt="Classify {summary}",
+        order=1,
+        block_type=block_type,
+        inputs=[
+            WorkflowBlockInputRequest(
+                input_type="BLOCK_OUTPUT",
+                source_block_id=0,
+                variable_name="summary",
+                source_field=source_field,
+            )
+        ],
+    )
+    return [extract, classify]
+
+
+class TestValidateBlocks:
+    """Test the validate_blocks function."""
+
+    @pytest.mark.parametrize("source_field", [None, "summary", "entities", "entities.0.name"])
+    def test_accepts_known_fields(self, source_field):
+        """Test that paths described by the source schema are accepted."""
+        validate_blocks(_blocks(source_field))
+
+    @pytest.mark.parametrize("source_field", ["sumary", "entities.0.role", "entities.first"])
+    def test_rejects_unknown_fields(self, source_field):
+        """Test that paths the source block cannot produce are rejected."""
+        with pytest.raises(WorkflowValidationError, match="Extract"):
+            validate_blocks(_blocks(source_field))
+
+    def test_rejects_malformed_path(self):
+        """Test that a path with empty segments is rejected."""
+        with pytest.raises(WorkflowValidationError, match="invalid source_field"):
+            validate_blocks(_blocks("summary..text"))
+
+    def test_map_block_over_list(self):
+        """Test that a map block may iterate over an array field."""
+        validate_blocks(_blocks("entities", block_type="MAP"))
+
+    def test_map_block_over_string_is_rejected(self):
+        """Test that a map block over a non-list field is rejected."""
+        with pytest.raises(WorkflowValidationError, match="not a list"):
+            validate_blocks(_blocks("summary", block_type="MAP"))
+
+    @pytest.mark.parametrize("max_parallel", [0, -2, 1.5, "4", True])
+    def test_map_block_max_parallel_must_be_positive(self, max_parallel):
+        """Test that a map block's max_parallel must be a positive integer."""
+        blocks = _blocks("entities", block_type="MAP")
+        blocks[1].execution_options = {"max_parallel": 3}
+        validate_blocks(blocks)
+
+        blocks[1].execution_options = {"max_parallel": max_parallel}
+        with pytest.raises(WorkflowValidationError, match="max_parallel must be a positive"):
+            validate_blocks(blocks)
+
+    def test_paths_into_map_block_output(self):
+        """Test that downstream inputs address a map block's output through items."""
+        blocks = _blocks("entities", block_type="MAP")
+        blocks[1].output_schema = {"type": "object", "properties": {"risk": {"type": "string"}}}
+        blocks.append(
+            WorkflowBlockRequest(
+                name="Report",
+                prompt="Report on {risks}",
+                order=2,
+                inputs=[
+                    WorkflowBlockInputRequest(
+                        input_type="BLOCK_OUTPUT",
+                        source_block_id=1,
+                        variable_name="risks",
+                        source_field="items.0.risk",
+                    )
+                ],
+            )
+        )
+        validate_blocks(blocks)
+
+        blocks[2].inputs[0].source_field = "risk"
+        with pytest.raises(WorkflowValidationError, match="no output field 'risk'"):
+            validate_blocks(blocks)
+
+    @pytest.mark.parametrize(
+        "condition",
+        [
+            "extract.summary != null",
+            "len(Extract.entities) > 0 and len(request_text) > 100",
+            "lower(extract.entities[0]['name']) in ['acme', 'globex'] or not -1 < 0",
+        ],
+    )
+    def test_accepts_conditions_on_earlier_blocks(self, condition):
+        """Test that conditions over earlier block outputs are accepted."""
+        blocks = _blocks(None)
+        blocks[1].execution_options = {"condition": condition}
+        validate_blocks(blocks)
+
+    @pytest.mark.parametrize(
+        "condition,message",
+        [
+            ("extract.summary ==", "invalid condition"),
+            ("classify.label == 'x'", "not an earlier block"),
+            ("", "must be an expression"),
+            ("extract.summary.__class__ if true else false", "'IfExp' is not allowed"),
+            ("extract.entities[len(extract.entities) - 1] != null", "literal indexes"),
+            ("open('x') == null", "only len, lower, upper"),
+            ("extract.summary.lower() == 'x'", "only len, lower, upper"),
+            ("len(extract.entities, key=1) > 0", "only len, lower, upper"),
+            ("[e for e in extract.entities] != []", "is not allowed"),
+            ("extract.score > 1j", "unsupported literal"),
+        ],
+    )
+    def test_rejects_bad_conditions(self, condition, message):
+        """Test that malformed, unsafe and forward-referencing conditions are rejected."""
+        blocks = _blocks(None)
+        blocks[1].execution_options = {"condition": condition}
+        with pytest.raises(WorkflowValidationError, match=message):
+            validate_blocks(blocks)
@@ -0,0 +1,10 @@
+-- Add batch packing option to workflows
+-- Single-block workflows with pack_size > 1 let the AI worker pack up to
+-- pack_size short requests into one LLM call
+
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS pack_size INT NULL;
+
+COMMENT ON COLUMN workflows.pack_size IS 'Max requests packed into one LLM call in batch execution mode; NULL disables packing';
+
+-- ROLLBACK:
+-- ALTER TABLE workflows DROP COLUMN IF EXISTS pack_size;
@@ -0,0 +1,10 @@
+-- Add per-block execution options for the AI worker
+-- Holds settings such as the prompt layout that do not belong in the Ollama
+-- model_parameters
+
+ALTER TABLE workflow_blocks ADD COLUMN IF NOT EXISTS execution_options JSONB NULL;
+
+COMMENT ON COLUMN workflow_blocks.execution_options IS 'AI worker execution settings for this block, e.g. {"prompt_layout": "shared_prefix"}';
+
+-- ROLLBACK:
+-- ALTER TABLE workflow_blocks DROP COLUMN IF EXISTS execution_options;
@@ -0,0 +1,10 @@
+-- Let a block input project one field of its source block's output
+-- Only the value at source_field (a dotted path such as "summary" or
+-- "entities.0.name") is rendered into the downstream prompt
+
+ALTER TABLE workflow_block_inputs ADD COLUMN IF NOT EXISTS source_field VARCHAR(256) NULL;
+
+COMMENT ON COLUMN workflow_block_inputs.source_field IS 'Dotted path into the source block output; NULL passes the whole output';
+
+-- ROLLBACK:
+-- ALTER TABLE workflow_block_inputs DROP COLUMN IF EXISTS source_field;
@@ -0,0 +1,10 @@
+-- Add the MAP block type
+-- A map block runs its prompt once per item of a list produced by an earlier
+-- block and returns the per-item results as {"items": [...]}
+
+ALTER TYPE block_type ADD VALUE IF NOT EXISTS 'MAP';
+
+-- ROLLBACK:
+-- PostgreSQL cannot drop an enum value. Convert MAP blocks first
+-- (UPDATE workflow_blocks SET block_type = 'CUSTOM' WHERE block_type = 'MAP'),
+-- then recreate the block_type type without 'MAP'.
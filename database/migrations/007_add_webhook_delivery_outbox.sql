@@ -0,0 +1,31 @@
+-- Deliver webhooks from the webhook_deliveries table (outbox)
+-- A delivery row is written when an event fires. The API's delivery worker
+-- claims due rows with FOR UPDATE SKIP LOCKED, sends them and records the
+-- outcome; a failed attempt is rescheduled through next_attempt_at
+--
+-- Rows still pending from the old in-process sender were abandoned by a restart.
+-- Those older than its longest retry window (11 attempts of up to 300s plus
+-- backoff, about an hour) are marked failed so they are not all sent on the
+-- first poll. Newer pending rows are kept and delivered by the worker; one whose
+-- old sender is still running may be delivered twice, which receivers can spot
+-- by X-TaskFlow-Delivery-ID.
+
+ALTER TABLE webhook_deliveries ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE webhook_deliveries ADD COLUMN IF NOT EXISTS locked_until TIMESTAMP NULL;
+
+UPDATE webhook_deliveries
+SET status = 'failed',
+    error_message = COALESCE(error_message, 'Abandoned before the delivery outbox was introduced')
+WHERE status = 'pending'
+  AND created_at < CURRENT_TIMESTAMP - INTERVAL '1 hour';
+
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due ON webhook_deliveries(next_attempt_at) WHERE status = 'pending';
+
+COMMENT ON COLUMN webhook_deliveries.next_attempt_at IS 'When a pending delivery is next attempted';
+COMMENT ON COLUMN webhook_deliveries.locked_until IS 'Lease of the delivery worker sending it; another worker may take the row after it expires';
+
+-- ROLLBACK:
+-- (abandoned deliveries marked failed above stay failed)
+-- DROP INDEX IF EXISTS idx_webhook_deliveries_due;
+-- ALTER TABLE webhook_deliveries DROP COLUMN IF EXISTS locked_until;
+-- ALTER TABLE webhook_deliveries DROP COLUMN IF EXISTS next_attempt_at;
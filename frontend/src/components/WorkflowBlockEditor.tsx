@@ -218,7 +218,8 @@ export const WorkflowBlockEditor: React.FC<WorkflowBlockEditorProps> = ({
                       onChange={(e) => updateInput(inputIndex, { 
                         ...input, 
                         input_type: e.target.value as 'REQUEST_TEXT' | 'BLOCK_OUTPUT',
-                        source_block_id: e.target.value === 'REQUEST_TEXT' ? undefined : input.source_block_id
+                        source_block_id: e.target.value === 'REQUEST_TEXT' ? undefined : input.source_block_id,
+                        source_field: e.target.value === 'REQUEST_TEXT' ? undefined : input.source_field
                       })}
                       className="border-gray-300 rounded-md shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm"
                     >
@@ -261,6 +262,17 @@ export const WorkflowBlockEditor: React.FC<WorkflowBlockEditorProps> = ({
                       </select>
                     )}
                     
+                    {input.input_type === 'BLOCK_OUTPUT' && (
+                      <input
+                        type="text"
+                        value={input.source_field || ''}
+                        onChange={(e) => updateInput(inputIndex, { ...input, source_field: e.target.value || undefined })}
+                        className="border-gray-300 rounded-md shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm"
+                        placeholder="Field (optional)"
+                        title="Dotted path into the source block output, e.g. summary or entities.0.name"
+                      />
+                    )}
+                    
                     <button
                       onClick={() => deleteInput(inputIndex)}
                       className="p-1 text-red-500 hover:text-red-700"
@@ -68,9 +68,11 @@ export const WorkflowEditor: React.FC<WorkflowEditorProps> = ({
         output_schema: block.output_schema,
         model_name: block.model_name,
         model_parameters: block.model_parameters,
+        execution_options: block.execution_options,
         inputs: block.inputs.map(input => ({
           input_type: input.input_type,
           source_block_id: input.source_block_id ? blockIdToIndex.get(input.source_block_id) : undefined,
+          source_field: input.source_field,
           variable_name: input.variable_name
         }))
       })))
@@ -90,8 +90,8 @@ export function useMultipleRequestEvents(
   useEffect(() => {
     if (!requestIds.length) return;
 
-    // Connect to all requests
-    eventStreamService.connectToRequests(requestIds);
+    // Watch all requests over one multiplexed connection
+    const stopWatching = eventStreamService.watchRequests(requestIds);
 
     // Subscribe to events
     const currentUnsubscribers: Array<() => void> = [];
@@ -115,8 +115,7 @@ export function useMultipleRequestEvents(
       unsubscribers.current.forEach(unsub => unsub());
       unsubscribers.current = [];
       
-      // Disconnect from all requests
-      requestIds.forEach(id => eventStreamService.disconnect(id));
+      stopWatching();
     };
   }, [JSON.stringify(requestIds)]); // Reconnect if request IDs change
 }
\ No newline at end of file
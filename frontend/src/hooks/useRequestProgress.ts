@@ -21,6 +21,9 @@ interface StepInfo {
   name: string;
   completedAt: Date;
   result?: any;
+  // Set instead of result when the result was too large to send inline;
+  // fetch it from the request once the workflow completes
+  resultRef?: { request_id: number; step_name: string; size_bytes: number };
 }
 
 const initialProgress: RequestProgress = {
@@ -92,7 +95,8 @@ export function useRequestProgress(requestId: number | null | undefined) {
       completedSteps: [...prev.completedSteps, {
         name: payload.step_name,
         completedAt: new Date(),
-        result: payload.result
+        result: payload.result,
+        resultRef: payload.result_ref
       }],
       currentStep: null
     }));
@@ -7,8 +7,30 @@ interface ConnectionInfo {
   eventSource: EventSource;
   reconnectAttempts: number;
   reconnectTimer?: number;
+  // Id of the last logged event received; a manual reconnect resumes after it
+  lastEventId?: string;
 }
 
+interface MultiplexedStream {
+  eventSource: EventSource;
+  // Assigned by the server in the 'connected' event; changes when the browser reconnects
+  streamId: string | null;
+  // Request ids in the URL the stream was opened with
+  openedWith: number[];
+}
+
+// List of event types we expect from the backend
+const EVENT_TYPES = [
+  'job.started', 'job.progress', 'job.completed', 'job.failed',
+  'embedding.started', 'embedding.progress', 'embedding.completed', 'embedding.failed',
+  'workflow.started', 'workflow.step.completed', 'workflow.completed', 'workflow.failed',
+  'status', 'connected',
+  // Sent before the server closes a stream that fell too far behind (the browser
+  // reconnects on its own), or when more events were missed than the server replays;
+  // either way a fresh status snapshot follows
+  'resync'
+];
+
 // Simple EventEmitter implementation for browser
 class SimpleEventEmitter {
   private events: Map<string, Set<EventCallback>> = new Map();
@@ -45,6 +67,9 @@ class EventStreamService extends SimpleEventEmitter {
   private maxReconnectAttempts = 5;
   private reconnectDelay = 1000; // Start with 1 second
   private baseUrl = '/api'; // Will be proxied by Vite in dev
+  // One multiplexed stream shared by every list view, and how many views watch each request
+  private stream: MultiplexedStream | null = null;
+  private streamRefs: Map<number, number> = new Map();
 
   constructor() {
     super();
@@ -55,7 +80,7 @@ class EventStreamService extends SimpleEventEmitter {
   /**
    * Connect to SSE endpoint for a specific request
    */
-  connect(requestId: number): EventSource | null {
+  connect(requestId: number, lastEventId?: string): EventSource | null {
     // Prevent duplicate connections
     const existing = this.connections.get(requestId);
     if (existing) {
@@ -64,7 +89,10 @@ class EventStreamService extends SimpleEventEmitter {
     }
 
     try {
-      const url = `${this.baseUrl}/requests/${requestId}/events`;
+      // The browser sends Last-Event-ID when it reconnects by itself; a new EventSource
+      // has to pass it in the URL to get the missed events replayed
+      const query = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : '';
+      const url = `${this.baseUrl}/requests/${requestId}/events${query}`;
       const eventSource = new EventSource(url);
       
       // Set up event handlers
@@ -73,7 +101,8 @@ class EventStreamService extends SimpleEventEmitter {
       // Store connection info
       this.connections.set(requestId, {
         eventSource,
-        reconnectAttempts: 0
+        reconnectAttempts: 0,
+        lastEventId
       });
       
       console.log(`Connected to SSE for request ${requestId}`);
@@ -110,6 +139,43 @@ class EventStreamService extends SimpleEventEmitter {
     requestIds.forEach(id => this.connect(id));
   }
 
+  /**
+   * Watch requests over the shared multiplexed stream (one connection for any number of
+   * requests). Returns a function that stops watching them.
+   */
+  watchRequests(requestIds: number[]): Unsubscribe {
+    const added = requestIds.filter(id => {
+      const count = this.streamRefs.get(id) || 0;
+      this.streamRefs.set(id, count + 1);
+      return count === 0;
+    });
+
+    if (!this.stream) {
+      this._openStream();
+    } else if (added.length) {
+      this._updateStream(added, []);
+    }
+
+    return () => {
+      const removed = requestIds.filter(id => {
+        const count = (this.streamRefs.get(id) || 1) - 1;
+        if (count <= 0) {
+          this.streamRefs.delete(id);
+          return true;
+        }
+        this.streamRefs.set(id, count);
+        return false;
+      });
+
+      if (!this.streamRefs.size) {
+        this.stream?.eventSource.close();
+        this.stream = null;
+      } else if (removed.length) {
+        this._updateStream([], removed);
+      }
+    };
+  }
+
   /**
    * Disconnect from all active connections
    */
@@ -156,19 +222,15 @@ class EventStreamService extends SimpleEventEmitter {
    * Set up event handlers for an EventSource
    */
   private _setupEventHandlers(eventSource: EventSource, requestId: number): void {
-    // List of event types we expect from the backend
-    const eventTypes = [
-      'job.started', 'job.progress', 'job.completed', 'job.failed',
-      'embedding.started', 'embedding.progress', 'embedding.completed', 'embedding.failed',
-      'workflow.started', 'workflow.step.completed', 'workflow.completed', 'workflow.failed',
-      'status', 'connected'
-    ];
-
     // Add listeners for each event type
-    eventTypes.forEach(eventType => {
+    EVENT_TYPES.forEach(eventType => {
       eventSource.addEventListener(eventType, (event) => {
         try {
           const data = JSON.parse(event.data);
+          const connection = this.connections.get(requestId);
+          if (connection && event.lastEventId) {
+            connection.lastEventId = event.lastEventId;
+          }
           this._notifyListeners(eventType, { requestId, ...data });
         } catch (error) {
           console.error(`Failed to parse event data for ${eventType}:`, error);
@@ -207,6 +269,63 @@ class EventStreamService extends SimpleEventEmitter {
     };
   }
 
+  /**
+   * Open the multiplexed stream for the currently watched requests
+   */
+  private _openStream(): void {
+    const openedWith = Array.from(this.streamRefs.keys());
+    const params = new URLSearchParams();
+    openedWith.forEach(id => params.append('request_ids', String(id)));
+
+    const eventSource = new EventSource(`${this.baseUrl}/requests/events/stream?${params}`);
+    const stream: MultiplexedStream = { eventSource, streamId: null, openedWith };
+    this.stream = stream;
+
+    eventSource.addEventListener('connected', (event) => {
+      const reconnected = stream.streamId !== null;
+      stream.streamId = JSON.parse((event as MessageEvent).data).stream_id;
+
+      // Requests added or removed before the stream was ready, or since it was opened
+      // when the browser reconnected with the original URL
+      const current = Array.from(this.streamRefs.keys());
+      const add = reconnected ? current : current.filter(id => !openedWith.includes(id));
+      const remove = openedWith.filter(id => !this.streamRefs.has(id));
+      if (add.length || remove.length) {
+        this._updateStream(add, remove);
+      }
+    });
+
+    EVENT_TYPES.filter(eventType => eventType !== 'connected').forEach(eventType => {
+      eventSource.addEventListener(eventType, (event) => {
+        try {
+          const data = JSON.parse((event as MessageEvent).data);
+          this._notifyListeners(eventType, { requestId: data.request_id, ...data });
+        } catch (error) {
+          console.error(`Failed to parse event data for ${eventType}:`, error);
+        }
+      });
+    });
+  }
+
+  /**
+   * Change the requests watched by the open multiplexed stream
+   */
+  private _updateStream(add: number[], remove: number[]): void {
+    const streamId = this.stream?.streamId;
+    if (!streamId) {
+      // Not connected yet; the 'connected' handler sends the current set
+      return;
+    }
+
+    fetch(`${this.baseUrl}/requests/events/stream/${streamId}`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ add, remove })
+    }).catch(error => {
+      console.error('Failed to update event stream:', error);
+    });
+  }
+
   /**
    * Handle connection errors and implement reconnection logic
    */
@@ -228,8 +347,8 @@ class EventStreamService extends SimpleEventEmitter {
         connection.eventSource.close();
         this.connections.delete(requestId);
         
-        // Try to reconnect
-        this.connect(requestId);
+        // Try to reconnect, resuming after the last event received
+        this.connect(requestId, connection.lastEventId);
       }, delay);
     } else {
       console.error(`Max reconnection attempts reached for request ${requestId}`);
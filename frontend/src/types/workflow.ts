@@ -2,6 +2,7 @@ export interface WorkflowBlockInput {
   id: number
   input_type: 'REQUEST_TEXT' | 'BLOCK_OUTPUT'
   source_block_id?: number
+  source_field?: string
   variable_name: string
 }
 
@@ -12,10 +13,11 @@ export interface WorkflowBlock {
   prompt: string
   system_prompt?: string
   order: number
-  block_type: 'CORE' | 'CUSTOM'
+  block_type: 'CORE' | 'CUSTOM' | 'MAP'
   output_schema?: Record<string, any>
   model_name?: string
   model_parameters?: Record<string, any>
+  execution_options?: Record<string, any>
   inputs: WorkflowBlockInput[]
   created_at: string
   updated_at: string
@@ -45,6 +47,7 @@ export interface WorkflowList {
 export interface CreateWorkflowBlockInputRequest {
   input_type: 'REQUEST_TEXT' | 'BLOCK_OUTPUT'
   source_block_id?: number
+  source_field?: string
   variable_name: string
 }
 
@@ -53,10 +56,11 @@ export interface CreateWorkflowBlockRequest {
   prompt: string
   system_prompt?: string
   order: number
-  block_type?: 'CORE' | 'CUSTOM'
+  block_type?: 'CORE' | 'CUSTOM' | 'MAP'
   output_schema?: Record<string, any>
   model_name?: string
   model_parameters?: Record<string, any>
+  execution_options?: Record<string, any>
   inputs: CreateWorkflowBlockInputRequest[]
 }
 
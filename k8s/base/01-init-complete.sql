@@ -17,7 +17,7 @@ CREATE TYPE request_status AS ENUM ('NEW', 'IN_REVIEW', 'PENDING', 'CLOSED');
 CREATE TYPE job_status AS ENUM ('PENDING', 'RUNNING', 'COMPLETED', 'FAILED');
 CREATE TYPE job_type AS ENUM ('STANDARD', 'CUSTOM', 'WORKFLOW', 'EMBEDDING', 'BULK_EMBEDDING');
 CREATE TYPE workflow_status AS ENUM ('DRAFT', 'ACTIVE', 'ARCHIVED');
-CREATE TYPE block_type AS ENUM ('CORE', 'CUSTOM');
+CREATE TYPE block_type AS ENUM ('CORE', 'CUSTOM', 'MAP');
 CREATE TYPE block_input_type AS ENUM ('REQUEST_TEXT', 'BLOCK_OUTPUT');
 CREATE TYPE embedding_status AS ENUM ('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED');
 CREATE TYPE dashboard_layout AS ENUM ('grid', 'list');
@@ -39,6 +39,7 @@ CREATE TABLE workflows (
   description TEXT,
   status workflow_status DEFAULT 'DRAFT',
   is_default BOOLEAN DEFAULT FALSE NOT NULL,
+  pack_size INT NULL,
   created_by BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
@@ -119,6 +120,7 @@ CREATE TABLE workflow_blocks (
   output_schema JSONB,
   model_name VARCHAR(128) DEFAULT 'gemma3:1b',
   model_parameters JSONB NULL,
+  execution_options JSONB NULL,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -137,6 +139,7 @@ CREATE TABLE workflow_block_inputs (
   input_type block_input_type NOT NULL,
   source_block_id BIGINT REFERENCES workflow_blocks(id) ON DELETE CASCADE,
   variable_name VARCHAR(64),
+  source_field VARCHAR(256),
   created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -424,6 +427,8 @@ CREATE TABLE IF NOT EXISTS webhook_deliveries (
     error_message TEXT,
     delivered_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP,
     
     -- Index for querying recent deliveries
     CONSTRAINT webhook_delivery_status_check CHECK (status IN ('pending', 'success', 'failed'))
@@ -432,6 +437,7 @@ CREATE TABLE IF NOT EXISTS webhook_deliveries (
 CREATE INDEX idx_webhook_deliveries_webhook_id ON webhook_deliveries(webhook_id);
 CREATE INDEX idx_webhook_deliveries_status ON webhook_deliveries(status);
 CREATE INDEX idx_webhook_deliveries_created_at ON webhook_deliveries(created_at DESC);
+CREATE INDEX idx_webhook_deliveries_due ON webhook_deliveries(next_attempt_at) WHERE status = 'pending';
 
 -- Function to update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_webhook_updated_at()
@@ -456,6 +462,8 @@ COMMENT ON COLUMN webhooks.secret_token IS 'Used to generate HMAC signatures for
 
 COMMENT ON TABLE webhook_deliveries IS 'Tracks webhook delivery attempts and their results';
 COMMENT ON COLUMN webhook_deliveries.event_data IS 'The actual event payload that was/will be sent';
+COMMENT ON COLUMN webhook_deliveries.next_attempt_at IS 'When a pending delivery is next attempted';
+COMMENT ON COLUMN webhook_deliveries.locked_until IS 'Lease of the delivery worker sending it; another worker may take the row after it expires';
 -- ============================================
 -- Migration: Add pgvector support for embeddings
 -- Date: 2024-08-03